@@ -1,7 +1,12 @@
 '''applib -- main application library
 
+Setting `APPLIB_HEADLESS` in the environment loads only the game model, which
+can then be imported and ticked without pyglet, a window or any audio.
+
 '''
 
+from applib.constants import HEADLESS
+
 
 class app(object):
     animation = None
@@ -24,10 +29,48 @@ def set_pyglet_options():
         'shadow_window': False,
     })
 
-set_pyglet_options()
+if not HEADLESS:
+    set_pyglet_options()
 del set_pyglet_options
 
 
+def get_data_directory():
+    '''Return the absolute path of the data directory.
+
+    '''
+
+    import os
+
+    applib_directory = os.path.abspath(os.path.dirname(__file__))
+    return os.path.abspath(os.path.join(applib_directory, '..', 'data'))
+
+
+_resource_names = None
+
+def list_resources():
+    '''Return the names of all the resources in the data directory.
+
+    The names match the keys of the `pyglet.resource` index, so the model can
+    discover its assets without loading pyglet.
+
+    '''
+
+    import os
+
+    global _resource_names
+    if _resource_names is None:
+        data_directory = get_data_directory()
+        _resource_names = []
+        for root, directory_names, file_names in os.walk(data_directory):
+            relative_root = os.path.relpath(root, data_directory).replace(os.sep, '/')
+            for file_name in file_names:
+                if relative_root == '.':
+                    _resource_names.append(file_name)
+                else:
+                    _resource_names.append(f'{relative_root}/{file_name}')
+    return list(_resource_names)
+
+
 def prepare_resources():
     '''Set the appropriate resource paths.
 
@@ -35,12 +78,10 @@ def prepare_resources():
 
     import os
 
-    import applib 
     import pyglet
 
     # Set resource paths.
-    applib_directory = os.path.abspath(os.path.dirname(applib.__file__))
-    data_directory = os.path.abspath(os.path.join(applib_directory, '..', 'data'))
+    data_directory = get_data_directory()
     pyglet.resource.path = [data_directory]
     pyglet.resource.reindex()
 
@@ -52,12 +93,16 @@ def prepare_resources():
                 file_path = os.path.join(root, file_name)
                 pyglet.font.add_file(file_path)
 
-prepare_resources()
+if not HEADLESS:
+    prepare_resources()
+del prepare_resources
 
 
 from . import constants
 from . import engine
-from . import main
 from . import model
-from . import scenes
-from . import tools
+
+if not HEADLESS:
+    from . import main
+    from . import scenes
+    from . import tools
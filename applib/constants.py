@@ -8,6 +8,11 @@
 DEBUG = bool(__import__('os').environ.get('APPLIB_DEBUG', '').strip())
 
 
+## Headless
+
+HEADLESS = bool(__import__('os').environ.get('APPLIB_HEADLESS', '').strip())
+
+
 ## Application
 
 APPLICATION_NAME = 'Copcake Caper'
@@ -23,6 +28,17 @@ TICK_RATE = 60.0
 
 TICK_LENGTH = 1.0 / TICK_RATE
 
+# The most ticks run to catch up in one update; any time still owed after
+# them is dropped, so a long hitch slows the game down instead of stalling it.
+MAX_CATCH_UP_TICKS = 5
+
+# The rate of updates, and so of frames, whatever the tick rate; each update
+# runs the ticks due, and sprites are interpolated between them.
+FRAME_RATE = 60.0
+
+# The rate of updates while the window is in the background or minimised.
+BACKGROUND_FRAME_RATE = 10.0
+
 
 ## Music
 
@@ -42,6 +58,8 @@ SETTINGS_DEFAULTS = {
     'music_volume': 0.6,
     'sound_volume': 1.0,
     'volume': 0.7,
+    'tick_rate': TICK_RATE,
+    'remote_level': False,
 }
 
 
@@ -60,6 +78,10 @@ SCENERY_SCALE = 1.0
 
 ANIMATION_ZOOM_RATE = 0.15
 
+# Sprites moving further than this (relative to the view height) in a tick jump
+# rather than being interpolated.
+INTERPOLATION_SNAP_DISTANCE = 0.05
+
 
 ## Customers
 
@@ -2,8 +2,12 @@
 
 '''
 
-from . import animation
-from . import controller
-from . import music
-from . import panel
+from applib.constants import HEADLESS
+
 from . import sound
+
+if not HEADLESS:
+    from . import animation
+    from . import controller
+    from . import music
+    from . import panel
@@ -2,13 +2,13 @@
 
 '''
 
+import collections
 import math
 
 import applib
 import pyglet
 
 from applib import app
-from applib.constants import TICK_LENGTH
 
 
 class Animation(object):
@@ -17,13 +17,17 @@ class Animation(object):
     '''
 
     next_animation = None
+
+    #: The functions to call with the animation the next time it stops, such
+    #: as those of the animations running it (see `add_stop_callback`).
+    stop_callbacks = None
     
     def start(self):
         '''Ensure that the animation is active.
 
         '''
         if self not in app.animation:
-            app.animation.append(self)
+            app.animation.add(self)
             self.start_state()
         return self
 
@@ -32,10 +36,27 @@ class Animation(object):
 
         '''
         if self in app.animation:
-            app.animation.remove(self)
+            app.animation.discard(self)
             self.stop_state()
             if self.next_animation:
                 self.next_animation.start()
+            stop_callbacks = self.stop_callbacks
+            if stop_callbacks is not None:
+                self.stop_callbacks = None
+                for stop_callback in stop_callbacks:
+                    stop_callback(self)
+        return self
+
+    def add_stop_callback(self, stop_callback):
+        '''Call a function with the animation the next time it stops.
+
+        Every function added is called, so that an animation can be run by
+        more than one `QueuedAnimation` or `ParallelAnimation` at once.
+
+        '''
+        if self.stop_callbacks is None:
+            self.stop_callbacks = []
+        self.stop_callbacks.append(stop_callback)
         return self
 
     def queue(self, animation):
@@ -64,6 +85,12 @@ class Animation(object):
         '''
         self.stop()
 
+    def is_idle(self):
+        '''Return whether ticking the animation would change nothing visible.
+
+        '''
+        return False
+
 
 class AttributeAnimation(Animation):
     '''Animation class to update a single numerical attribute.
@@ -108,7 +135,7 @@ class AttributeAnimation(Animation):
         self.elapsed = None
 
     def tick(self):
-        self.elapsed += TICK_LENGTH
+        self.elapsed += app.controller.tick_length
         if self.elapsed >= self.duration:
             self.stop()
         else:
@@ -139,7 +166,7 @@ class BounceAnimation(Animation):
         self.elapsed = None
 
     def tick(self):
-        self.elapsed += TICK_LENGTH
+        self.elapsed += app.controller.tick_length
         cycles_elapsed = self.speed * self.elapsed
         if (self.cycles is not None) and (cycles_elapsed >= self.cycles):
             self.stop()
@@ -170,7 +197,7 @@ class WaitAnimation(Animation):
             self.callback(*self.args, **self.kwargs)
 
     def tick(self):
-        self.remaining -= TICK_LENGTH
+        self.remaining -= app.controller.tick_length
         if self.remaining <= 0.0:
             self.stop()
 
@@ -186,7 +213,7 @@ class QueuedAnimation(Animation):
         self.current = None
 
     def start_state(self):
-        self.remaining = list(self.animations)
+        self.remaining = collections.deque(self.animations)
         self.current = None
 
     def stop_state(self):
@@ -198,11 +225,16 @@ class QueuedAnimation(Animation):
         self.remaining = None
         self.current = None
 
-    def tick(self):
-        if self.current not in app.animation:
+    def _current_stopped(self, animation):
+        if animation is self.current:
             self.current = None
+
+    def tick(self):
+        # The current animation clears `current` when it stops.
+        if self.current is None:
             if len(self.remaining) > 0:
-                self.current = self.remaining.pop(0)
+                self.current = self.remaining.popleft()
+                self.current.add_stop_callback(self._current_stopped)
                 self.current.start()
                 self.current.tick()
             else:
@@ -219,28 +251,72 @@ class ParallelAnimation(Animation):
         self.remaining = None
 
     def start_state(self):
-        self.remaining = list(self.animations)
-        for animation in self.remaining:
+        # The animations still running, removed as they stop.
+        self.remaining = dict.fromkeys(self.animations)
+        for animation in self.animations:
+            animation.add_stop_callback(self._animation_stopped)
             animation.start()
 
     def stop_state(self):
-        for animation in self.remaining:
+        for animation in list(self.remaining):
             animation.stop()
         self.remaining = None
 
+    def _animation_stopped(self, animation):
+        if self.remaining is not None:
+            self.remaining.pop(animation, None)
+
     def tick(self):
-        for animation in list(self.remaining):
-            if animation not in app.animation:
-                self.remaining.remove(animation)
         if len(self.remaining) == 0:
             self.stop()
 
 
-class AnimationManager(list):
+class AnimationManager(object):
+    '''The active animations, in the order they were started.
+
+    The animations are kept as the keys of a dictionary, so that checking,
+    adding and removing an animation take constant time.
+
+    '''
+
+    def __init__(self):
+        self._animations = {}
+
+    def __contains__(self, animation):
+        return animation in self._animations
+
+    def __iter__(self):
+        return iter(self._animations)
+
+    def __len__(self):
+        return len(self._animations)
+
+    def add(self, animation):
+        '''Add an animation, if it is not already active.
+
+        '''
+        self._animations[animation] = None
+
+    def discard(self, animation):
+        '''Remove an animation, if it is active.
+
+        '''
+        self._animations.pop(animation, None)
 
     def on_tick(self):
         '''Advance all current animations.
 
+        Animations started during the tick wait for the next one, and those
+        stopped during it are not ticked again.
+
+        '''
+        animations = self._animations
+        for animation in tuple(animations):
+            if animation in animations:
+                animation.tick()
+
+    def is_idle(self):
+        '''Return whether every current animation is idle.
+
         '''
-        for animation in list(self):
-            animation.tick()
+        return all(animation.is_idle() for animation in self._animations)
@@ -3,6 +3,7 @@
 '''
 
 import importlib
+import math
 
 import applib
 import pyglet
@@ -10,8 +11,10 @@ import pyglet
 from applib import app
 from applib.constants import APPLICATION_NAME
 from applib.constants import APPLICATION_VERSION
+from applib.constants import BACKGROUND_FRAME_RATE
 from applib.constants import DEFAULT_SCREEN_SIZE
-from applib.constants import TICK_LENGTH
+from applib.constants import FRAME_RATE
+from applib.constants import MAX_CATCH_UP_TICKS
 from applib.engine import animation
 from applib.engine import music
 
@@ -27,7 +30,7 @@ class Controller(pyglet.event.EventDispatcher):
     )
 
     event_graph = (
-        ('window', ('scene', 'keystate')),
+        ('window', ('scene', 'keystate', 'controller')),
         ('controller', ('animation', 'scene', 'music')),
         ('settings', ('scene', 'music')),
     )
@@ -55,9 +58,126 @@ class Controller(pyglet.event.EventDispatcher):
         #: The global animation manager.
         app.animation = animation.AnimationManager()
 
-        # Install the main update function.
+        #: The number of ticks in each second.
+        self.tick_rate = app.settings.tick_rate
+        #: The time (in seconds) of a single tick.
+        self.tick_length = 1.0 / self.tick_rate
+
+        #: The time (in seconds) until the next tick is due.
         self.next_tick = 0.0
-        pyglet.clock.schedule_interval(self.update, TICK_LENGTH)
+        #: The number of ticks run so far.
+        self.ticks_run = 0
+        #: The number of ticks dropped to avoid falling further behind.
+        self.ticks_dropped = 0
+        #: How far (from 0 to 1) the present is from the last tick to the next.
+        self.tick_fraction = 1.0
+
+        #: Whether the window has the focus, and whether it is shown rather than minimised.
+        self.active = True
+        self.shown = True
+        #: Whether updates are stopped until the next input because the scene is idle.
+        self.sleeping = False
+        #: Whether a frame should be drawn (see `EventLoop`).
+        self.frame_pending = True
+
+        # Install the main update function.
+        self.max_catch_up_ticks = MAX_CATCH_UP_TICKS
+        self.schedule_update()
+
+    ## Scheduling
+    ## ----------
+
+    def schedule_update(self):
+        '''Schedule `update` at the rate suiting the window's state.
+
+        Updates run, and frames are drawn, at `FRAME_RATE` while the window has
+        the focus, and at `BACKGROUND_FRAME_RATE` otherwise, with enough ticks
+        allowed in each update to keep the game on time at any tick rate.
+
+        '''
+        pyglet.clock.unschedule(self.update)
+        update_rate = FRAME_RATE if (self.active and self.shown) else BACKGROUND_FRAME_RATE
+        self.max_catch_up_ticks = max(MAX_CATCH_UP_TICKS, math.ceil(self.tick_rate / update_rate) + 1)
+        pyglet.clock.schedule_interval(self.update, 1.0 / update_rate)
+        self.sleeping = False
+
+    def is_idle(self):
+        '''Return whether nothing will change on screen until the next input.
+
+        A scene which moves anything other than through its animations says
+        when it is idle with an `is_idle` method. Any other scene is idle
+        whenever the animations and the music are.
+
+        '''
+        scene_is_idle = getattr(app.scene, 'is_idle', None)
+        return (
+            ((scene_is_idle is None) or scene_is_idle()) and
+            app.animation.is_idle() and app.music.is_idle()
+        )
+
+    def wake(self):
+        '''Resume updates stopped while the scene was idle, and draw a frame.
+
+        Input while updates are running leaves the drawing to them, so that
+        frames stay at the update rate however often the mouse moves.
+
+        '''
+        if self.sleeping:
+            self.frame_pending = True
+            self.schedule_update()
+
+    ## Window events
+    ## -------------
+
+    def on_activate(self):
+        self.active = True
+        self.schedule_update()
+
+    def on_deactivate(self):
+        self.active = False
+        self.schedule_update()
+
+    def on_show(self):
+        self.shown = True
+        self.schedule_update()
+        self.frame_pending = True
+
+    def on_hide(self):
+        self.shown = False
+        self.schedule_update()
+
+    def on_key_press(self, symbol, modifiers):
+        self.wake()
+
+    def on_key_release(self, symbol, modifiers):
+        self.wake()
+
+    def on_mouse_motion(self, x, y, dx, dy):
+        self.wake()
+
+    def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
+        self.wake()
+
+    def on_mouse_press(self, x, y, button, modifiers):
+        self.wake()
+
+    def on_mouse_release(self, x, y, button, modifiers):
+        self.wake()
+
+    def on_mouse_scroll(self, x, y, scroll_x, scroll_y):
+        self.wake()
+
+    def on_mouse_enter(self, x, y):
+        self.wake()
+
+    def on_mouse_leave(self, x, y):
+        self.wake()
+
+    def on_resize(self, width, height):
+        self.wake()
+
+    ## Scenes
+    ## ------
 
     def switch_scene(self, scene, *args, **kwargs):
         '''Construct and switch to the given scene.
@@ -101,18 +221,63 @@ class Controller(pyglet.event.EventDispatcher):
                 app.settings.start_scene = 'applib.scenes.level.LevelScene'
             app.controller.switch_scene(app.settings.start_scene)
 
-        # Process enough ticks to catch up to the present.
+        # Process enough ticks to catch up to the present, up to a limit.
         self.next_tick -= delta
+        ticks = 0
         while self.next_tick <= 0.0:
-            self.next_tick += TICK_LENGTH
+            if ticks == self.max_catch_up_ticks:
+                # Drop the ticks still owed, keeping the time into the next one.
+                dropped_ticks = math.ceil(-self.next_tick / self.tick_length)
+                self.next_tick += dropped_ticks * self.tick_length
+                self.ticks_dropped += dropped_ticks
+                break
+            self.next_tick += self.tick_length
+            self.ticks_run += 1
+            ticks += 1
             self.dispatch_event('on_tick')
+        self.tick_fraction = max(0.0, min(1.0, 1.0 - self.next_tick / self.tick_length))
+        self.frame_pending = self.shown
+
+        # Stop updating until the next input once nothing is changing.
+        if self.is_idle():
+            pyglet.clock.unschedule(self.update)
+            self.sleeping = True
+            self.tick_fraction = 1.0
 
         if not app.window.visible:
             app.window.set_visible(True)
 
 
+class EventLoop(pyglet.app.EventLoop):
+    '''Event loop drawing frames only when the controller asks for them.
+
+    The default loop redraws every window whenever any scheduled function
+    runs, which would draw frames for a minimised window and for functions
+    other than `Controller.update`.
+
+    '''
+
+    def idle(self):
+        delta = self.clock.update_time()
+        self.clock.call_scheduled_functions(delta)
+
+        # Redraw the windows if needed.
+        frame_pending = app.controller.frame_pending
+        app.controller.frame_pending = False
+        for window in pyglet.app.windows:
+            if frame_pending or (window._legacy_invalid and window.invalid):
+                window.switch_to()
+                window.dispatch_event('on_draw')
+                window.flip()
+                window._legacy_invalid = False
+
+        # Sleep until the next scheduled function, or the next input when none are.
+        return self.clock.get_sleep_time(True)
+
+
 def prepare_controller():
-    '''Create the controller.
+    '''Create the controller and install its event loop.
 
     '''
     app.controller = Controller()
+    pyglet.app.event_loop = EventLoop()
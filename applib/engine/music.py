@@ -8,7 +8,6 @@ import pyglet
 from applib import app
 from applib.constants import MUSIC_FADE_GRACE
 from applib.constants import MUSIC_FADE_RATE
-from applib.constants import TICK_LENGTH
 
 
 class MusicManager(object):
@@ -42,7 +41,7 @@ class MusicManager(object):
         '''
         # While in 'fadeout', adjust the volume down each tick...
         if self.state == 'fadeout':
-            self.player.volume = max(0.0, self.player.volume - (self.frate or MUSIC_FADE_RATE) * TICK_LENGTH)
+            self.player.volume = max(0.0, self.player.volume - (self.frate or MUSIC_FADE_RATE) * app.controller.tick_length)
             # Until we reach the target volume, then move to 'fadegrace'.
             if self.player.volume == 0.0:
                 self.state = 'fadegrace'
@@ -50,7 +49,7 @@ class MusicManager(object):
 
         # While in 'fadegrace', adjust the grace down each tick...
         elif self.state == 'fadegrace':
-            self.grace = max(0.0, self.grace - TICK_LENGTH)
+            self.grace = max(0.0, self.grace - app.controller.tick_length)
             # Until we reach zero, then move to 'normal' and remove the player.
             if self.grace == 0.0:
                 self.state = 'normal'
@@ -63,6 +62,12 @@ class MusicManager(object):
                 self.player.volume = self.volume
                 self.next = None
 
+    def is_idle(self):
+        '''Return whether the manager has nothing to do until the music is switched.
+
+        '''
+        return (self.state == 'normal') and (self.next is None)
+
     def on_setting_change(self, name, value):
         if name == 'volume':
             self.volume = app.settings.music_volume * value
@@ -7,17 +7,24 @@ import random
 import re
 
 import applib
-import pyglet
 
 from applib import app
+from applib.constants import HEADLESS
+
+if not HEADLESS:
+    import pyglet
 
 
 class Sound(object):
 
     sounds = []
 
-    def __init__(self):
+    #: Called with each sound instead of playing it, if set (see `applib.model.remote`).
+    redirect = None
+
+    def __init__(self, name=None):
         self.sounds.append(self)
+        self.name = name
         self.sources = []
 
     @classmethod
@@ -33,6 +40,9 @@ class Sound(object):
         self.sources.append(source)
 
     def __call__(self):
+        if Sound.redirect is not None:
+            return Sound.redirect(self)
+        if HEADLESS: return
         if len(os.environ.get('PYTEST_CURRENT_TEST', '')) > 0: return
         source = random.choice(self.sources)
         source = pyglet.resource.media(source, streaming=True)
@@ -42,13 +52,13 @@ class Sound(object):
 
 
 def load_sounds():
-    indexed_resources = list(pyglet.resource._default_loader._index)
+    indexed_resources = applib.list_resources()
     for resource_name in indexed_resources:
         if match := re.match(rf'sounds/((?:[a-z_/]*/)?([a-z_]+)(?:_[0-9]+)?)\.mp3', resource_name):
             asset_name, sound_name = match.groups()
             #print(asset_name, sound_name)
             assert re.match(r'__', asset_name) is None
-            globals().setdefault(sound_name, Sound()).add(asset_name)
+            globals().setdefault(sound_name, Sound(sound_name)).add(asset_name)
 
 load_sounds()
 del load_sounds
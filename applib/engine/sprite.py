@@ -11,7 +11,7 @@ import pyglet
 from applib import app
 from applib.engine import animation
 from applib.constants import ANIMATION_ZOOM_RATE
-from applib.constants import TICK_LENGTH
+from applib.constants import TICK_RATE
 
 
 class ZoomAnimation(animation.Animation):
@@ -23,9 +23,14 @@ class ZoomAnimation(animation.Animation):
     def tick(self):
         current_zoom = self.sprite._animation_zoom
         target_zoom = self.sprite._target_zoom
-        new_zoom = current_zoom + ANIMATION_ZOOM_RATE * (target_zoom - current_zoom)
+        # The zoom rate is the fraction covered per tick at `TICK_RATE`.
+        zoom_rate = min(1.0, ANIMATION_ZOOM_RATE * TICK_RATE * app.controller.tick_length)
+        new_zoom = current_zoom + zoom_rate * (target_zoom - current_zoom)
         setattr(self.sprite, 'animation_zoom', new_zoom)
 
+    def is_idle(self):
+        return abs(self.sprite._target_zoom - self.sprite._animation_zoom) < 1e-4
+
 
 class WalkAnimation(animation.Animation):
 
@@ -46,17 +51,17 @@ class WalkAnimation(animation.Animation):
         self.elapsed_time = None
 
     def tick(self):
-        self.elapsed_time += TICK_LENGTH
+        self.elapsed_time += app.controller.tick_length
 
         # Compute the horizontal offset.
         current_x = self.sprite._animation_offset_x
         target_x = self.sprite._target_offset_x
         if target_x > current_x:
-            current_x += self.walk_speed * TICK_LENGTH
+            current_x += self.walk_speed * app.controller.tick_length
             if target_x <= current_x:
                 current_x = target_x
         elif target_x < current_x:
-            current_x -= self.walk_speed * TICK_LENGTH
+            current_x -= self.walk_speed * app.controller.tick_length
             if target_x >= current_x:
                 current_x = target_x
         setattr(self.sprite, 'animation_offset_x', current_x)
@@ -76,6 +81,15 @@ class WalkAnimation(animation.Animation):
                 self.bounce_cycles = None
         setattr(self.sprite, 'animation_offset_y', linear_distance)
 
+    def is_idle(self):
+        # Standing still once the last bounce has finished.
+        return (
+            (self.sprite._target_offset_x == self.sprite._animation_offset_x) and
+            (self.sprite._animation_offset_y == 0.0) and
+            (self.bounce_cycles is not None) and
+            (self.bounce_cycles <= self.bounce_speed * self.elapsed_time)
+        )
+
 
 class EntitySprite(pyglet.sprite.Sprite):
 
@@ -217,9 +231,57 @@ class EntitySprite(pyglet.sprite.Sprite):
             self.current_animation.stop()
             self.current_animation = None
 
+    # Interpolation
+
+    _lag_x = 0.0
+
+    _lag_y = 0.0
+
+    _position = None
+
+    _previous_position = None
+
+    _position_tick = None
+
+    def _track_position(self):
+        # Remember where the sprite was at the end of the last tick the first
+        # time it changes in a new one.
+        ticks_run = app.controller.ticks_run
+        if self._position_tick != ticks_run:
+            self._position_tick = ticks_run
+            self._previous_position = self._position
+        if self._visible:
+            self._position = (self._x + self._animation_offset_x, self._y + self._animation_offset_y)
+        else:
+            self._position = None
+
+    def interpolate(self, fraction, snap_distance):
+        '''Draw the sprite the given fraction of a tick along its last move.
+
+        The fraction is of the time from the tick which moved the sprite to the
+        next one. Sprites which were hidden or moved further than
+        `snap_distance` are drawn where they are.
+
+        '''
+        lag_x = lag_y = 0.0
+        previous_position = self._previous_position
+        if (self._position_tick == app.controller.ticks_run) and (previous_position is not None) and (self._position is not None):
+            distance_x = previous_position[0] - self._position[0]
+            distance_y = previous_position[1] - self._position[1]
+            if (abs(distance_x) <= snap_distance) and (abs(distance_y) <= snap_distance):
+                lag_x = distance_x * (1.0 - fraction)
+                lag_y = distance_y * (1.0 - fraction)
+        if (lag_x != self._lag_x) or (lag_y != self._lag_y):
+            self._lag_x = lag_x
+            self._lag_y = lag_y
+            self._update_position()
+        if self.background_sprite is not None:
+            self.background_sprite.interpolate(fraction, snap_distance)
+
     # Update Position Method
 
     def _update_position(self):
+        self._track_position()
         img = self._texture
         scale_x = self._scale * self._scale_x * self._animation_zoom
         scale_y = self._scale * self._scale_y * self._animation_zoom
@@ -230,8 +292,8 @@ class EntitySprite(pyglet.sprite.Sprite):
             y1 = -img.anchor_y * scale_y
             x2 = x1 + img.width * scale_x
             y2 = y1 + img.height * scale_y
-            x = self._x + self._animation_offset_x
-            y = self._y + self._animation_offset_y
+            x = self._x + self._animation_offset_x + self._lag_x
+            y = self._y + self._animation_offset_y + self._lag_y
             r = -math.radians(self._rotation)
             cr = math.cos(r)
             sr = math.sin(r)
@@ -245,14 +307,14 @@ class EntitySprite(pyglet.sprite.Sprite):
             dy = x1 * sr + y2 * cr + y
             vertices = (ax, ay, bx, by, cx, cy, dx, dy)
         elif scale_x != 1.0 or scale_y != 1.0:
-            x1 = self._x + self._animation_offset_x - img.anchor_x * scale_x
-            y1 = self._y + self._animation_offset_y - img.anchor_y * scale_y
+            x1 = self._x + self._animation_offset_x + self._lag_x - img.anchor_x * scale_x
+            y1 = self._y + self._animation_offset_y + self._lag_y - img.anchor_y * scale_y
             x2 = x1 + img.width * scale_x
             y2 = y1 + img.height * scale_y
             vertices = (x1, y1, x2, y1, x2, y2, x1, y2)
         else:
-            x1 = self._x + self._animation_offset_x - img.anchor_x
-            y1 = self._y + self._animation_offset_y - img.anchor_y
+            x1 = self._x + self._animation_offset_x + self._lag_x - img.anchor_x
+            y1 = self._y + self._animation_offset_y + self._lag_y - img.anchor_y
             x2 = x1 + img.width
             y2 = y1 + img.height
             vertices = (x1, y1, x2, y1, x2, y2, x1, y2)
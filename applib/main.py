@@ -1,3 +1,4 @@
+import multiprocessing
 import time
 
 import applib
@@ -5,6 +6,8 @@ import pyglet
 
 
 def main():
+    # Let frozen builds start the worker processes of `applib.model.remote`.
+    multiprocessing.freeze_support()
     applib.tools.command.parse_arguments()
     applib.tools.settings.load_settings()
     applib.engine.controller.prepare_controller()
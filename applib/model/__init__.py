@@ -4,4 +4,8 @@
 
 from . import device
 from . import item
+from . import journal
 from . import level
+from . import remote
+from . import replay
+from . import snapshot
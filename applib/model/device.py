@@ -4,11 +4,101 @@
 
 
 import applib
-import pyglet
 
-from applib.constants import TICK_LENGTH
 from applib.model import entity
 from applib.model import item
+from applib.model import journal
+
+
+## Transitions
+
+#: Where an item produced by a transition comes from.
+SOURCE_NONE = 0
+SOURCE_INPUT = 1
+SOURCE_CURRENT = 2
+SOURCE_NEW = 3
+
+#: What a transition does to the device timer.
+TIMER_KEEP = 0
+TIMER_START = 1
+TIMER_STOP = 2
+
+
+def _is_instance(item_class, other_class):
+    # Mirrors `isinstance(item, other_class or type(None))` for an item of the given class.
+    if item_class is None:
+        return other_class is None
+    elif item_class is item.Time:
+        return False
+    else:
+        return (other_class is not None) and issubclass(item_class, other_class)
+
+
+def _is_real_item(item_class):
+    return (item_class is not None) and (item_class is not item.Time)
+
+
+class Transition(object):
+    '''Precompiled result of adding one item class to a device holding another.
+
+    '''
+
+    __slots__ = (
+        'input_class', 'current_class', 'output_class', 'new_class', 'sound',
+        'timer', 'output_source', 'new_source', 'destroy_input', 'destroy_current',
+        'plate_holds',
+    )
+
+    def __init__(self, input_class, current_class, output_class, new_class, sound):
+        '''Compile a `Transition` from the result of `Device.compute_transition`.
+
+        '''
+        self.input_class = input_class
+        self.current_class = current_class
+        self.output_class = output_class
+        self.new_class = new_class
+
+        # Sounds and timers only happen when something has changed.
+        changed_input = not _is_instance(input_class, output_class)
+        changed_current = not _is_instance(current_class, new_class)
+        self.sound = sound if (changed_input or changed_current) else None
+        if not changed_current:
+            self.timer = TIMER_KEEP
+        elif (input_class is item.Time) or (new_class is not None):
+            self.timer = TIMER_START
+        else:
+            self.timer = TIMER_STOP
+
+        # Empty plates take hold of the input item.
+        self.plate_holds = (current_class is new_class is item.Plate) and (output_class is None)
+
+        # Work out where the output and new items come from.
+        if output_class is None:
+            self.output_source = SOURCE_NONE
+        elif output_class is input_class:
+            self.output_source = SOURCE_INPUT
+        elif output_class is current_class:
+            self.output_source = SOURCE_CURRENT
+        else:
+            self.output_source = SOURCE_NEW
+        if new_class is None:
+            self.new_source = SOURCE_NONE
+        elif (new_class is input_class) and (self.output_source != SOURCE_INPUT):
+            self.new_source = SOURCE_INPUT
+        elif (new_class is current_class) and (self.output_source != SOURCE_CURRENT):
+            self.new_source = SOURCE_CURRENT
+        else:
+            self.new_source = SOURCE_NEW
+
+        # Destroy whichever items are not used on either side.
+        sources = (self.output_source, self.new_source)
+        self.destroy_input = _is_real_item(input_class) and (SOURCE_INPUT not in sources)
+        self.destroy_current = _is_real_item(current_class) and (SOURCE_CURRENT not in sources)
+
+    def __repr__(self):
+        names = [getattr(cls, '__name__', None) for cls in
+            (self.input_class, self.current_class, self.output_class, self.new_class)]
+        return '<Transition {}, {} -> {}, {}>'.format(*names)
 
 
 class Device(entity.Entity):
@@ -18,7 +108,7 @@ class Device(entity.Entity):
     # The time after complete where the contents become ruined - default 0.0, does not ruin
     ruined_time = 0.0
 
-    # The time (in ticks) for the contents of the machine to be ruined (computed automatically).
+    # The time (in ticks) for the contents of the machine to be ruined (computed by `retime`).
     ruined_ticks = None
 
     ruined_item = None
@@ -26,29 +116,85 @@ class Device(entity.Entity):
     #: The duration (in seconds) of one cycle of this device.
     duration = 10.0
 
-    #: The duration (in ticks) of one cycle of this device (computed automatically).
+    #: The duration (in ticks) of one cycle of this device (computed by `retime`).
     duration_ticks = None
 
     # input-item, current-item : held-item, new-current-item
     recipes = {}
 
+    #: The compiled recipes, indexed by input and current `Item.item_id` (computed automatically).
+    transitions = None
+
     alt_sprites = {}
 
     item_position = (0.0, 0.0)
 
+    #: The device this is part of, such as the `MultiPlating` holding a `Plating`.
+    parent = None
+
     default_sound = applib.engine.sound.pop
 
     _sound_player = None
 
     def __init_subclass__(cls):
         super().__init_subclass__()
-        cls.duration_ticks = int(cls.duration // TICK_LENGTH)
-        cls.ruined_ticks = int(cls.ruined_time // TICK_LENGTH)
+        cls.compile_transitions()
 
     def __init__(self, level):
         super().__init__(level)
         self.current_item = None
-        self.ticks_remaining = None
+
+        #: The tick at which `ticks_remaining` reaches zero, or `None` if the timer is stopped.
+        self.timer_end_tick = None
+        self.retime()
+
+    def retime(self):
+        '''Compute `duration_ticks` and `ruined_ticks` at the level's tick rate.
+
+        This must be called again after changing `duration` or `ruined_time`.
+
+        '''
+        self.duration_ticks = self.level.get_ticks(self.duration)
+        self.ruined_ticks = self.level.get_ticks(self.ruined_time)
+
+    @property
+    def ticks_remaining(self):
+        '''The ticks left on the timer, which go negative once it finishes, or `None`.
+
+        '''
+        if self.timer_end_tick is None:
+            return None
+        return self.timer_end_tick - self.level.tick_running
+
+    @ticks_remaining.setter
+    def ticks_remaining(self, ticks):
+        self.timer_end_tick = None if ticks is None else self.level.tick_running + ticks
+        self.update_schedule()
+        if self.level.journal is not None:
+            if ticks is None:
+                self.level.record_change(journal.TIMER_STOPPED, self)
+            else:
+                self.level.record_change(journal.TIMER_STARTED, self, self.timer_end_tick)
+
+    def get_next_tick(self):
+        '''Return the next tick at which the timer does something, or `None`.
+
+        '''
+        end_tick = self.timer_end_tick
+        if end_tick is None:
+            return None
+        elif end_tick > self.level.tick_running:
+            return end_tick
+        elif self.ruined_ticks > 0:
+            return end_tick + self.ruined_ticks
+        else:
+            return None
+
+    def update_schedule(self):
+        '''Schedule the next tick at which the timer does something.
+
+        '''
+        self.level.schedule(self, self.get_next_tick())
 
     @property
     def is_running(self):
@@ -58,13 +204,19 @@ class Device(entity.Entity):
     def is_finished(self):
         return (self.ticks_remaining is not None) and (self.ticks_remaining <= 0)
 
-    def compute_transition(self, first_item_class, second_item_class):
+    @classmethod
+    def compute_transition(cls, first_item_class, second_item_class):
+        '''Return the output class, new class and sound for adding an item class.
+
+        This is the reference for the compiled `transitions` table.
+
+        '''
         # Case 1: We have a recipe for the input item and current item; use it.
-        if (first_item_class, second_item_class) in self.recipes:
-            recipe = self.recipes[first_item_class, second_item_class]
+        if (first_item_class, second_item_class) in cls.recipes:
+            recipe = cls.recipes[first_item_class, second_item_class]
             if len(recipe) == 2:
                 new_first_item_class, new_second_item_class = recipe
-                transition_sound = self.default_sound
+                transition_sound = cls.default_sound
             else:
                 new_first_item_class, new_second_item_class, transition_sound = recipe
         # Case 2: There was no input item; pick up the current item.
@@ -76,90 +228,108 @@ class Device(entity.Entity):
         # Return the results of the transition.
         return new_first_item_class, new_second_item_class, transition_sound
 
+    @classmethod
+    def compile_transition(cls, input_item_class, current_item_class):
+        '''Return the `Transition` for adding an item class to this device class.
+
+        '''
+        return Transition(input_item_class, current_item_class,
+            *cls.compute_transition(input_item_class, current_item_class))
+
+    @classmethod
+    def compile_transitions(cls):
+        '''Compile the recipes into the `transitions` table.
+
+        This must be called again if the recipes are changed.
+
+        '''
+        cls.transitions = [
+            [cls.compile_transition(input_item_class, current_item_class)
+                for current_item_class in item.Item.item_classes]
+            for input_item_class in item.Item.item_classes
+        ]
+
     def add_item(self, input_item):
-        
+
         # Apply the input to the contents of a plate.
-        if (input_item is not None) and isinstance(self.current_item, item.Plate) and (self.current_item.holds is not None):
-            current_item = self.current_item.holds
+        current_item = self.current_item
+        if (input_item is not None) and isinstance(current_item, item.Plate) and (current_item.holds is not None):
+            current_item = current_item.holds
             modifying_holds = True
         else:
-            current_item = self.current_item
             modifying_holds = False
 
-        # Compute the results of the transition.
-        input_item_class = type(input_item) if isinstance(input_item, item.Item) else input_item
-        current_item_class = type(current_item) if isinstance(current_item, item.Item) else current_item
-        output_item_class, new_item_class, transition_sound = self.compute_transition(input_item_class, current_item_class)
-
-        # Determine which sides of the transition have changed.
-        changed_input = not isinstance(input_item, output_item_class or type(None))
-        changed_current = not isinstance(current_item, new_item_class or type(None))
+        # Look up the precompiled transition.
+        input_item_id = 0 if input_item is None else input_item.item_id
+        current_item_id = 0 if current_item is None else current_item.item_id
+        try:
+            transition = self.transitions[input_item_id][current_item_id]
+        except IndexError:
+            # Item classes created after this device class have no table entry.
+            input_item_class = input_item if input_item in (None, item.Time) else type(input_item)
+            current_item_class = None if current_item is None else type(current_item)
+            transition = self.compile_transition(input_item_class, current_item_class)
 
         # Trigger sound when anything has changed.
-        if changed_input or changed_current:
-            if transition_sound is not None:
-                if self._sound_player:
-                    self._sound_player.next_source()
-                if isinstance(transition_sound, tuple):
-                    transition_sound = transition_sound[modifying_holds]
-                self._sound_player = transition_sound()
+        transition_sound = transition.sound
+        if transition_sound is not None:
+            if self._sound_player:
+                self._sound_player.next_source()
+            if isinstance(transition_sound, tuple):
+                transition_sound = transition_sound[modifying_holds]
+            self._sound_player = transition_sound()
 
         # Trigger timed behaviour when the current item has changed.
-        if changed_current:
-            # If we changed over time then the device starts a new cycle.
-            if input_item_class is item.Time:
-                self.ticks_remaining = self.duration_ticks
-            # If we added an item then the device needs to be started.
-            elif new_item_class is not None:
-                self.ticks_remaining = self.duration_ticks
-            # If we removed the current item then device needs to be stopped.
-            else:
-                self.ticks_remaining = None
+        if transition.timer == TIMER_START:
+            self.ticks_remaining = self.duration_ticks
+        elif transition.timer == TIMER_STOP:
+            self.ticks_remaining = None
 
         # Check for special plate behaviour.
-        if current_item_class is new_item_class is item.Plate:
-            if (current_item.holds is None) and (output_item_class is None):
-                current_item.holds = input_item
+        destroy_input = transition.destroy_input
+        if transition.plate_holds and (current_item.holds is None):
+            current_item.holds = input_item
+            destroy_input = False
+            self.level.move_item(input_item, item.LOCATION_PLATE, current_item)
 
         # Work out where the output item came from.
-        if output_item_class is None:
+        output_source = transition.output_source
+        if output_source == SOURCE_NONE:
             output_item = None
-        elif output_item_class is input_item_class:
+        elif output_source == SOURCE_INPUT:
             output_item = input_item
-        elif output_item_class is current_item_class:
+        elif output_source == SOURCE_CURRENT:
             output_item = current_item
         else:
-            output_item = output_item_class(self.level)
+            output_item = transition.output_class(self.level)
 
         # Work out where the new item came from.
-        if new_item_class is None:
+        new_source = transition.new_source
+        if new_source == SOURCE_NONE:
             new_item = None
-        elif (new_item_class is input_item_class) and (output_item is not input_item):
+        elif new_source == SOURCE_INPUT:
             new_item = input_item
-        elif (new_item_class is current_item_class) and (output_item is not current_item):
+        elif new_source == SOURCE_CURRENT:
             new_item = current_item
         else:
-            new_item = new_item_class(self.level)
+            new_item = transition.new_class(self.level)
 
         # Make sure that unused items are destroyed.
-        remaining_items = []
-        for root_item in (output_item, new_item):
-            if isinstance(root_item, item.Item):
-                remaining_items.append(root_item)
-                if isinstance(root_item.holds, item.Item):
-                    remaining_items.append(root_item.holds)
-        if input_item not in remaining_items:
-            if isinstance(input_item, item.Item):
-                input_item.destroy()
-        if current_item not in remaining_items:
-            if isinstance(current_item, item.Item):
-                current_item.destroy()
+        if destroy_input:
+            input_item.destroy()
+        if transition.destroy_current:
+            current_item.destroy()
 
         # Store the new item and return the output item.
         if modifying_holds:
             self.current_item.holds = new_item
         else:
             self.current_item = new_item
+        if (new_item is not None) and (new_item is not current_item):
+            if modifying_holds:
+                self.level.move_item(new_item, item.LOCATION_PLATE, self.current_item)
+            else:
+                self.level.move_item(new_item, item.LOCATION_DEVICE, self)
         return output_item
 
     def interact(self, held_item):
@@ -167,15 +337,15 @@ class Device(entity.Entity):
 
     def tick(self):
         super().tick()
-        if self.ticks_remaining is not None:
-            self.ticks_remaining -= 1
-            if self.ticks_remaining == 0:
-                self.add_item(item.Time)
+        if self.ticks_remaining == 0:
+            if self.level.journal is not None:
+                self.level.record_change(journal.TIMER_FINISHED, self)
+            self.add_item(item.Time)
         if self.ticks_remaining is not None:
             if self.ticks_remaining <= -self.ruined_ticks < 0:
                 self.add_item(item.Time)
                 self.ticks_remaining = None
-
+        self.update_schedule()
 
 
 class AutomaticDevice(Device):
@@ -252,6 +422,7 @@ def _populate_plating_recipes():
     for item_name, item_class in entity.Entity.index['items'].items():
         if item_name.startswith('doughnut_'):
             Plating.recipes[item_class, None] = (None, item_class)
+    Plating.compile_transitions()
 
 _populate_plating_recipes()
 del _populate_plating_recipes
@@ -286,6 +457,7 @@ class MultiPlating(Device):
         for x, y in self.subpositions:
             self.subdevices.append(Plating(self.level))
             self.subdevices[-1].item_position = (x, y)
+            self.subdevices[-1].parent = self
         
 
     def destroy(self):
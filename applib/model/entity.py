@@ -5,9 +5,13 @@
 import re
 
 import applib
-import pyglet
 
-from applib.engine import sprite
+from applib.constants import HEADLESS
+
+if not HEADLESS:
+    import pyglet
+
+    from applib.engine import sprite
 
 
 def _normalise(string):
@@ -22,6 +26,8 @@ def _normalise(string):
 
 class Entity(object):
 
+    __slots__ = ('level', 'entity_id', '_sprite')
+
     #: The asset group to which the entity class belongs.
     group = None
 
@@ -48,6 +54,8 @@ class Entity(object):
 
         '''
         self.level = level
+        self.entity_id = None
+        self._sprite = None
         if self.level is not None:
             self.level.add_entity(self)
 
@@ -59,6 +67,11 @@ class Entity(object):
             self.level.remove_entity(self)
         self.level = None
 
+    ## Rendering
+    ## ---------
+
+    # These are only used by the view layer, and are unavailable in headless mode.
+
     #: The texture used to render entities of this class.
     _texture = None
 
@@ -68,9 +81,6 @@ class Entity(object):
             type(self)._texture = pyglet.resource.texture(f'{self.group}/{self.name}.png')
         return self._texture
 
-    #: The sprite used to render entities of this class (default value).
-    _sprite = None
-
     @property
     def sprite(self):
         if (self._sprite is None) and (self.texture is not None):
@@ -78,4 +88,100 @@ class Entity(object):
         return self._sprite
 
     def tick(self):
+        '''Update the entity at a tick requested with `Level.schedule`.
+
+        '''
         pass
+
+
+class EntityList(object):
+    '''Insertion ordered collection of entities with constant time removal.
+
+    Removed entities leave a gap in the underlying slots, which is closed up
+    once nothing is iterating over the list. Iteration therefore stays stable
+    while entities are added and removed: removed entities are skipped and
+    added entities are included.
+
+    '''
+
+    def __init__(self, entities=()):
+        '''Create an `EntityList` object.
+
+        '''
+        self._slots = list(entities)
+        self._positions = {entity: position for position, entity in enumerate(self._slots)}
+        self._iterating = 0
+        if len(self._positions) != len(self._slots):
+            raise ValueError('entities must be unique')
+
+    def add(self, entity):
+        '''Add an entity to the end of the list.
+
+        '''
+        if entity in self._positions:
+            raise ValueError(f'entity already in list: {entity!r}')
+        self._positions[entity] = len(self._slots)
+        self._slots.append(entity)
+
+    def remove(self, entity):
+        '''Remove an entity from the list.
+
+        '''
+        try:
+            position = self._positions.pop(entity)
+        except KeyError:
+            raise ValueError(f'entity not in list: {entity!r}') from None
+        self._slots[position] = None
+        if len(self._slots) > 2 * len(self._positions) + 8:
+            self._compact()
+
+    def _compact(self):
+        '''Close up the gaps left by removed entities, unless iterating.
+
+        '''
+        if (self._iterating == 0) and (len(self._slots) != len(self._positions)):
+            self._slots = [entity for entity in self._slots if entity is not None]
+            for position, entity in enumerate(self._slots):
+                self._positions[entity] = position
+
+    def index(self, entity):
+        '''Return the position of an entity in the list.
+
+        '''
+        if entity not in self._positions:
+            raise ValueError(f'entity not in list: {entity!r}')
+        self._compact()
+        position = self._positions[entity]
+        if len(self._slots) == len(self._positions):
+            return position
+        return sum(1 for other in self._slots[:position] if other is not None)
+
+    def __getitem__(self, index):
+        self._compact()
+        if len(self._slots) == len(self._positions):
+            return self._slots[index]
+        return [entity for entity in self._slots if entity is not None][index]
+
+    def __iter__(self):
+        self._iterating += 1
+        try:
+            slots = self._slots
+            position = 0
+            while position < len(slots):
+                entity = slots[position]
+                position += 1
+                if entity is not None:
+                    yield entity
+        finally:
+            self._iterating -= 1
+            if len(self._slots) > 2 * len(self._positions) + 8:
+                self._compact()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, entity):
+        return entity in self._positions
+
+    def __repr__(self):
+        return f'{type(self).__name__}({list(self)!r})'
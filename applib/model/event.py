@@ -0,0 +1,93 @@
+'''applib.model.event -- model event dispatching
+
+In headless mode the model cannot use `pyglet.event.EventDispatcher`, so a
+minimal dispatcher with the same interface is provided instead.
+
+'''
+
+from applib.constants import HEADLESS
+
+if not HEADLESS:
+    import pyglet
+
+
+class _HeadlessEventDispatcher(object):
+    '''Pure Python stand-in for `pyglet.event.EventDispatcher`.
+
+    '''
+
+    event_types = ()
+
+    _event_stack = ()
+
+    def push_handlers(self, *args, **kwargs):
+        '''Push a new level of handlers onto the stack.
+
+        '''
+        if type(self)._event_stack is self._event_stack:
+            self._event_stack = []
+        self._event_stack.insert(0, {})
+        self.set_handlers(*args, **kwargs)
+
+    def set_handlers(self, *args, **kwargs):
+        '''Attach handlers to the top level of the stack.
+
+        '''
+        if type(self)._event_stack is self._event_stack:
+            self._event_stack = [{}]
+        for obj in args:
+            for name in self.event_types:
+                handler = getattr(obj, name, None)
+                if handler is not None:
+                    self._event_stack[0][name] = handler
+        for name, handler in kwargs.items():
+            self._event_stack[0][name] = handler
+
+    def set_handler(self, name, handler):
+        '''Attach a single handler to the top level of the stack.
+
+        '''
+        self.set_handlers(**{name: handler})
+
+    def pop_handlers(self):
+        '''Pop the top level of handlers off the stack.
+
+        '''
+        del self._event_stack[0]
+
+    def remove_handlers(self, *args, **kwargs):
+        '''Remove the first level of the stack holding the given handlers.
+
+        '''
+        handlers = {}
+        for obj in args:
+            for name in self.event_types:
+                handler = getattr(obj, name, None)
+                if handler is not None:
+                    handlers[name] = handler
+        handlers.update(kwargs)
+        for frame in self._event_stack:
+            if all(frame.get(name) == handler for name, handler in handlers.items()):
+                for name in handlers:
+                    del frame[name]
+                break
+
+    def dispatch_event(self, event_type, *args):
+        '''Dispatch an event to the attached handlers.
+
+        '''
+        assert event_type in self.event_types, event_type
+        for frame in list(self._event_stack):
+            handler = frame.get(event_type)
+            if (handler is not None) and handler(*args):
+                return True
+        handler = getattr(self, event_type, None)
+        if handler is not None:
+            return bool(handler(*args))
+        return False
+
+
+if HEADLESS:
+    EventDispatcher = _HeadlessEventDispatcher
+else:
+    EventDispatcher = pyglet.event.EventDispatcher
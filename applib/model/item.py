@@ -5,36 +5,75 @@
 import re
 
 import applib
-import pyglet
 
 from applib.model import entity
 
 
+#: The places an item can be in its level (see `Level.location_of`).
+LOCATION_LOOSE = 'loose'
+LOCATION_HAND = 'hand'
+LOCATION_DEVICE = 'device'
+LOCATION_PLATE = 'plate'
+LOCATION_CUSTOMER = 'customer'
+
+
 class Item(entity.Entity):
 
+    __slots__ = ('holds',)
+
     group = 'items'
 
-    holds = None
+    #: The index of this item class in `item_classes` (assigned automatically).
+    item_id = None
+
+    #: Every item class, indexed by `item_id`, where index 0 stands for no item.
+    item_classes = [None]
 
     holds_position = None
 
     center_position = (0.0, 0.0)
 
+    #: Whether items of this class may lie loose in the level, rather than
+    #: being orphaned when nothing holds them.
+    can_be_loose = False
+
+    def __init_subclass__(cls):
+        '''Create an `Item` subclass and give it an `item_id`.
+
+        '''
+        super().__init_subclass__()
+        cls.item_id = len(Item.item_classes)
+        Item.item_classes.append(cls)
+
+    def __init__(self, level):
+        '''Create an `Item` object.
+
+        '''
+        self.holds = None
+        super().__init__(level)
+
     def destroy(self):
+        '''Remove the item, and anything it holds, from its level.
+
+        '''
         if self.holds is not None:
             self.holds.destroy()
+            self.holds = None
         super().destroy()
-    
+
     def matches(self, other):
         return type(self) is type(other)
 
 
 class Time(Item):
-    pass
+
+    __slots__ = ()
 
 
 class Plate(Item):
 
+    __slots__ = ()
+
     name = 'plate'
 
     holds_position = (0.0, 0.2)
@@ -42,18 +81,26 @@ class Plate(Item):
 
 class LadlePurple(Item):
 
+    __slots__ = ()
+
     name = 'ladle_purple'
     center_position = (-0.1, -0.3)
 
 class LadleYellow(Item):
 
+    __slots__ = ()
+
     name = 'ladle_yellow'
     center_position = (-0.1, -0.3)
 
 class Apple(Item):
 
+    __slots__ = ()
+
     name = 'apple'
 
+    can_be_loose = True
+
     def interact(self, held_item):
         if held_item is None:
             return type(self)(self.level)
@@ -62,14 +109,14 @@ class Apple(Item):
 
 
 def load_items():
-    indexed_resources = list(pyglet.resource._default_loader._index)
+    indexed_resources = applib.list_resources()
     for resource_name in indexed_resources:
         if match := re.match(rf'{Item.group}/([A-Za-z_]+)\.png', resource_name):
             asset_name = match.group(1)
             if asset_name not in entity.Entity.index[Item.group]:
                 class_name = ''.join(part.title() for part in re.split(r'_+', asset_name))
                 if class_name not in globals():
-                    item_class = type(class_name, (Item,), {'name': asset_name})
+                    item_class = type(class_name, (Item,), {'__slots__': (), 'name': asset_name})
                     globals()[class_name] = item_class
 
 load_items()
@@ -0,0 +1,113 @@
+'''applib.model.journal -- record of the changes made to a level
+
+A `Level` keeps a `Journal` only while something is reading it, so that a
+level nobody watches pays no more than a check of `Level.journal` for each
+change. Readers are given by `Level.subscribe` and drain the changes made
+since they last looked, such as once a tick, rather than scanning the whole
+level for differences.
+
+Each change is a `(tick, kind, subject, detail)` tuple, where `subject` is
+the entity that changed and `detail` depends on the kind:
+
+    ENTITY_CREATED      the new entity, None
+    ENTITY_DESTROYED    the removed entity, None
+    ITEM_TO_HAND        the item now held, None
+    ITEM_TO_DEVICE      the item, the device now holding it
+    ITEM_TO_PLATE       the item, the plate item now holding it
+    ITEM_TO_CUSTOMER    the item, the customer ordering or being given it
+    ITEM_LOOSE          the item, None
+    TIMER_STARTED       the device, the tick at which its timer ends
+    TIMER_FINISHED      the device, None
+    TIMER_STOPPED       the device, None
+    SCORE_CHANGED       the level, the new score
+    LEVEL_RESTORED      the level, None
+
+Items are where their last move put them until they are destroyed, and are
+loose until their first move (see `Level.location_of`). The
+suspicion added to the score every tick is not journalled, only the changes
+made when customers leave and when the level ends. After `LEVEL_RESTORED` the
+whole level may differ, and readers should look at it afresh.
+
+'''
+
+
+ENTITY_CREATED = 1
+ENTITY_DESTROYED = 2
+ITEM_TO_HAND = 3
+ITEM_TO_DEVICE = 4
+ITEM_TO_PLATE = 5
+ITEM_TO_CUSTOMER = 6
+TIMER_STARTED = 7
+TIMER_FINISHED = 8
+TIMER_STOPPED = 9
+SCORE_CHANGED = 10
+LEVEL_RESTORED = 11
+ITEM_LOOSE = 12
+
+#: The name of each kind of change.
+KIND_NAMES = {value: name for name, value in list(globals().items()) if name.isupper()}
+
+
+class Journal(object):
+    '''Append only list of changes shared by its readers.
+
+    Changes are dropped once every reader has drained them.
+
+    '''
+
+    def __init__(self):
+        #: The changes not yet drained by every reader.
+        self.changes = []
+        #: The number of changes dropped from the front of `changes`.
+        self.start = 0
+        self.readers = []
+
+    def open(self):
+        '''Return a new `JournalReader` for the changes appended from now on.
+
+        '''
+        reader = JournalReader(self)
+        self.readers.append(reader)
+        return reader
+
+    def close(self, reader):
+        '''Stop keeping changes for the given reader.
+
+        '''
+        self.readers.remove(reader)
+        self.trim()
+
+    def trim(self):
+        '''Drop the changes drained by every reader.
+
+        '''
+        end = self.start + len(self.changes)
+        position = min((reader.position for reader in self.readers), default=end)
+        if position > self.start:
+            del self.changes[:position - self.start]
+            self.start = position
+
+
+class JournalReader(object):
+    '''One reader's position in a `Journal`.
+
+    '''
+
+    def __init__(self, journal):
+        self.journal = journal
+        #: The number of changes appended to the journal before the next one to drain.
+        self.position = journal.start + len(journal.changes)
+
+    def drain(self):
+        '''Return the changes appended since the last drain, oldest first.
+
+        '''
+        journal = self.journal
+        changes = journal.changes[self.position - journal.start:]
+        self.position = journal.start + len(journal.changes)
+        if len(journal.readers) == 1:
+            journal.changes.clear()
+            journal.start = self.position
+        else:
+            journal.trim()
+        return changes
@@ -6,9 +6,9 @@ import math
 import random
 
 import applib
-import pyglet
 
-from applib.constants import TICK_LENGTH
+from applib.constants import DEBUG
+from applib.constants import HEADLESS
 from applib.constants import TICK_RATE
 from applib.constants import MAX_SCORE_FROM_CUSTOMER
 from applib.constants import PLATE_EFFICIENCY
@@ -16,24 +16,117 @@ from applib.constants import ENDLESS_SAD_GROWTH_RATE
 from applib.constants import ENDLESS_HAPPY_GROWTH_RATE
 from applib.model import device
 from applib.model import entity
+from applib.model import event
 from applib.model import item
+from applib.model import journal
+from applib.model import leveldata
 from applib.model import scenery
+from applib.model import schedule
+from applib.model import snapshot
+
+if not HEADLESS:
+    import pyglet
+
+
+def seconds_to_ticks(seconds, tick_rate):
+    '''Return the number of whole ticks in the given time at the given tick rate.
+
+    '''
+    # Multiply rather than floor divide by the tick length, since `60 // 0.1`
+    # is 599; the allowance absorbs the rounding of rates such as 30 Hz.
+    return int(math.floor(seconds * tick_rate + 1e-9))
+
+
+class LevelRandom(random.Random):
+    '''Random number stream which counts the changes to its state.
+
+    The count lets snapshots reuse the encoded state while no numbers have
+    been drawn, since encoding the state is slow.
+
+    '''
+
+    #: Changed whenever the state of the stream changes.
+    state_version = 0
+
+    #: The last `(state_version, encoded state)` pair, kept by `applib.model.snapshot`.
+    encoded_state = None
+
+    def seed(self, *args, **kwargs):
+        self.state_version += 1
+        super().seed(*args, **kwargs)
+
+    def setstate(self, state):
+        self.state_version += 1
+        super().setstate(state)
+
+    def random(self):
+        self.state_version += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        self.state_version += 1
+        return super().getrandbits(k)
 
 
 class Order(object):
+    '''The items wanted by a customer.
+
+    The items are also kept in buckets by class, so that matching an item
+    against the order does not scan every ordered item.
+
+    '''
 
     def __init__(self, *items):
         self.items = list(items)
 
+        #: The ordered items of each class, in order.
+        self.items_by_class = {}
+        for order_item in self.items:
+            self.items_by_class.setdefault(type(order_item), []).append(order_item)
+
+    @property
+    def is_complete(self):
+        return len(self.items) == 0
+
+    def count(self, item_class):
+        '''Return the number of items of the given class still wanted.
+
+        '''
+        return len(self.items_by_class.get(item_class, ()))
+
+    def find(self, match_item):
+        '''Return the first ordered item filled by `match_item` or the item it holds.
+
+        Returns `None` if neither is wanted.
+
+        '''
+        if match_item is None:
+            return None
+        bucket = self.items_by_class.get(type(match_item))
+        found_item = bucket[0] if bucket else None
+        if match_item.holds is not None:
+            bucket = self.items_by_class.get(type(match_item.holds))
+            if bucket and ((found_item is None) or (self.items.index(bucket[0]) < self.items.index(found_item))):
+                found_item = bucket[0]
+        return found_item
+
     def remove(self, match_item):
-        for index, item in enumerate(self.items):
-            if item.matches(match_item):
-                self.items.pop(index).destroy()
-                return True
-            if match_item and match_item.holds and item.matches(match_item.holds):
-                self.items.pop(index).destroy()
-                return True
-        return False
+        '''Remove and destroy the ordered item filled by `match_item`.
+
+        Returns the class of the removed item, or `None` if nothing matched.
+
+        '''
+        found_item = self.find(match_item)
+        if found_item is None:
+            return None
+        item_class = type(found_item)
+        bucket = self.items_by_class[item_class]
+        del bucket[0]
+        if len(bucket) == 0:
+            del self.items_by_class[item_class]
+        self.items.remove(found_item)
+        found_item.destroy()
+        return item_class
 
 
 class Customer(entity.Entity):
@@ -87,11 +180,20 @@ class Customer(entity.Entity):
 
     def __init__(self, level, order, customer_type=None):
         if customer_type is None:
-            self.name = random.choice(list(self.customer_patience))
+            self.name = (level.random if level is not None else random).choice(list(self.customer_patience))
         else:
             self.name = customer_type
         super().__init__(level)
         self.order = order
+        if level is not None:
+            level.add_order(self)
+            for order_item in order.items:
+                level.move_item(order_item, item.LOCATION_CUSTOMER, self)
+
+        #: The tick at which `patience_ticks` reaches zero.
+        self.patience_end_tick = None
+        #: The ticks of patience left while the customer is not in a level.
+        self.detached_patience_ticks = None
         self.patience_ticks = self.compute_patience()
 
     @property
@@ -101,6 +203,9 @@ class Customer(entity.Entity):
         return self._texture
 
     def destroy(self):
+        if self.level is not None:
+            self.level.remove_order(self)
+            self.detached_patience_ticks = self.patience_ticks
         super().destroy()
         for item in self.order.items:
             item.destroy()
@@ -109,19 +214,68 @@ class Customer(entity.Entity):
         '''Return the patience in ticks
 
         '''
-        self.start_patience = self.customer_patience[self.name]
-        self.start_patience_ticks = int(math.ceil(self.start_patience // TICK_LENGTH))
+        if self.level is None:
+            self.start_patience = self.customer_patience[self.name]
+            self.start_patience_ticks = seconds_to_ticks(self.start_patience, TICK_RATE)
+        else:
+            self.start_patience = self.level.customer_patience[self.name]
+            self.start_patience_ticks = self.level.get_ticks(self.start_patience)
         return self.start_patience_ticks
 
+    @property
+    def patience_ticks(self):
+        '''The ticks left before the customer runs out of patience.
+
+        A customer outside any level keeps the patience it had when it left.
+
+        '''
+        if self.level is None:
+            return self.detached_patience_ticks
+        return self.patience_end_tick - self.level.tick_running
+
+    @patience_ticks.setter
+    def patience_ticks(self, ticks):
+        if self.level is None:
+            self.detached_patience_ticks = ticks
+            return
+        self.patience_end_tick = self.level.tick_running + ticks
+        self.update_schedule()
+
+    def get_next_tick(self):
+        '''Return the tick at which the customer may next leave.
+
+        '''
+        next_tick = self.level.tick_running + 1
+        if len(self.order.items) > 0:
+            next_tick = max(next_tick, math.ceil(self.patience_end_tick))
+        return next_tick
+
+    def update_schedule(self):
+        '''Schedule the tick at which the customer next leaves.
+
+        '''
+        self.level.schedule(self, self.get_next_tick())
+
     def get_patience_ratio(self):
         return (self.patience_ticks / self.start_patience_ticks)
 
+    def wants(self, held_item):
+        '''Return whether giving the customer `held_item` would fill their order.
+
+        '''
+        return self.order.find(held_item) is not None
+
     def interact(self, held_item):
-        if self.order.remove(held_item):
+        item_class = self.order.remove(held_item)
+        if item_class is not None:
+            if self.order.count(item_class) == 0:
+                self.level.remove_order(self, item_class)
             if isinstance(held_item, item.Plate):
                 self.patience_ticks = min(self.start_patience_ticks, self.patience_ticks + PLATE_EFFICIENCY * self.start_patience_ticks)
+            self.level.move_item(held_item, item.LOCATION_CUSTOMER, self)
             held_item.destroy()
             self.level.sold_cakes += 1
+            self.update_schedule()
             self.sound_yes()
         else:
             self.sound_no()
@@ -179,16 +333,18 @@ class Customer(entity.Entity):
 
     def tick(self):
         if len(self.order.items) == 0:
+            # Patience stops counting down once the order is complete.
+            self.patience_end_tick += 1
             score = self.compute_score()
             self.level.remove_customer(self, True, score)
+        elif self.patience_ticks <= 0:
+            score = 0 if self.level.alt_suspicion_mode else MAX_SCORE_FROM_CUSTOMER
+            self.level.remove_customer(self, False, score)
         else:
-            self.patience_ticks -= 1
-            if self.patience_ticks <= 0:
-                score = 0 if self.level.alt_suspicion_mode else MAX_SCORE_FROM_CUSTOMER
-                self.level.remove_customer(self, False, score)
+            self.update_schedule()
 
 
-class Level(pyglet.event.EventDispatcher):
+class Level(event.EventDispatcher):
 
     event_types = (
         'on_customer_arrives',
@@ -207,6 +363,8 @@ class Level(pyglet.event.EventDispatcher):
     opening_scene = None
     victory_scene = None
     failure_scene = None
+
+    #: The name of the level which follows this one (see `get_level_class`).
     next_level = None
     alt_suspicion_mode = True
     alt_suspicion_rate = 0.04
@@ -216,61 +374,311 @@ class Level(pyglet.event.EventDispatcher):
     #seconds
     duration = 60
 
+    #: The patience (in seconds) of each customer type in this level.
+    customer_patience = Customer.customer_patience
+
     #: The duration (in ticks) (computed automatically).
     duration_ticks = None
 
-    def __init__(self):
+    #: The number of ticks in each second of level time, unless given when constructed.
+    tick_rate = TICK_RATE
+
+    #: The journal of changes, kept only while it has readers (see `subscribe`).
+    journal = None
+
+    def __init__(self, seed=None, populate=True, tick_rate=None):
         '''Construct a `Level` object.
 
+        The `seed` fixes everything random in the level; by default one is
+        chosen at random. If `populate` is false then no devices or scenery
+        are created, which is only useful before a `restore`. The `tick_rate`
+        sets the number of ticks in each second, from which every duration
+        counted in ticks is derived.
+
         '''
-        self.duration_ticks = int(self.duration // TICK_LENGTH)
+        if tick_rate is not None:
+            self.tick_rate = float(tick_rate)
+
+        #: The time (in seconds) of a single tick.
+        self.tick_length = 1.0 / self.tick_rate
+
+        #: The ratio of `TICK_RATE`, at which per-tick rates are given, to the tick rate.
+        self.tick_scale = TICK_RATE / self.tick_rate
+
+        self.duration_ticks = self.get_ticks(self.duration)
+
+        #: The seed of the level's random number stream.
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+
+        #: The random number stream used for everything random in the level.
+        self.random = LevelRandom(self.seed)
+
+        #: The recorder given every interaction, if any (see `applib.model.replay`).
+        self.recorder = None
 
-        self.entities = []
+        #: The ticks at which entities have asked to be ticked (see `schedule`).
+        self.scheduler = schedule.Scheduler()
 
-        self.customers = []
-        self.devices = []
-        self.items = []
-        self.scenery = []
+        self.entities = entity.EntityList()
+        self.entities_by_id = {}
+        self.next_entity_id = 0
+
+        self.customers = entity.EntityList()
+        self.devices = entity.EntityList()
+        self.items = entity.EntityList()
+        self.scenery = entity.EntityList()
+
+        #: The devices with each name and of each class, in order (see `get_device`).
+        self.devices_by_name = {}
+        self.devices_by_class = {}
+
+        #: The customers wanting each item class, in order of arrival (see `add_order`).
+        self.customers_by_order_class = {}
+
+        #: The `(location, holder)` of each item, and the items with each holder (see `location_of`).
+        self.item_locations = {}
+        self.items_by_holder = {}
         self.score = 0
         self.tick_running = 0
         self.customer_specification = list(self.customer_specification)
-        self.held_item = None
+        self._customer_arrival = (None, None)
+        self._held_item = None
         
 
+        self.happy_customer = 0
+        self.sad_customer = 0
+
         # Create devices.
         self.device_locations = {}
+        if not populate:
+            return
         for device, location_x, location_y in self.device_specification:
             new_device = device(self)
             self.device_locations[new_device] = (location_x, location_y)
             for subdevice in getattr(new_device, 'subdevices', []):
                 self.device_locations[subdevice] = (location_x, location_y)
 
-        self.happy_customer = 0
-        self.sad_customer = 0
+        # Create scenery.
+        scenery.Counter(self)
+        self.background_scenery(self)
+
+    def get_ticks(self, seconds):
+        '''Return the number of whole ticks in the given time.
+
+        '''
+        return seconds_to_ticks(seconds, self.tick_rate)
 
     def add_entity(self, entity):
-        self.entities.append(entity)
-        if isinstance(entity, Customer):
-            self.customers.append(entity)
+        entity.entity_id = self.next_entity_id
+        self.next_entity_id += 1
+        self.entities_by_id[entity.entity_id] = entity
+        self.entities.add(entity)
+        getattr(self, entity.group).add(entity)
+        if entity.group == item.Item.group:
+            self._set_item_location(entity, item.LOCATION_LOOSE, None)
+        if self.journal is not None:
+            self.record_change(journal.ENTITY_CREATED, entity)
+        if entity.group == device.Device.group:
+            self.add_device_index(entity)
+        if entity.group == Customer.group:
             self.dispatch_event('on_customer_arrives', entity)
-        if isinstance(entity, device.Device):
-            self.devices.append(entity)
-        if isinstance(entity, item.Item):
-            self.items.append(entity)
-        if isinstance(entity, scenery.Scenery):
-            self.scenery.append(entity)
 
     def remove_entity(self, entity):
+        self.scheduler.cancel(entity)
+        del self.entities_by_id[entity.entity_id]
         self.entities.remove(entity)
-        if isinstance(entity, Customer):
-            self.customers.remove(entity)
+        getattr(self, entity.group).remove(entity)
+        if entity.group == item.Item.group:
+            self._clear_item_location(entity)
+        if self.journal is not None:
+            self.record_change(journal.ENTITY_DESTROYED, entity)
+        if entity.group == device.Device.group:
+            self.devices_by_name[entity.name].remove(entity)
+            self.devices_by_class[type(entity)].remove(entity)
+        if entity.group == Customer.group:
             self.dispatch_event('on_customer_leaves', entity)
-        if isinstance(entity, device.Device):
-            self.devices.remove(entity)
-        if isinstance(entity, item.Item):
-            self.items.remove(entity)
-        if isinstance(entity, scenery.Scenery):
-            self.scenery.remove(entity)
+
+    def add_device_index(self, level_device):
+        '''Add a device to `devices_by_name` and `devices_by_class`.
+
+        '''
+        if level_device.name not in self.devices_by_name:
+            self.devices_by_name[level_device.name] = entity.EntityList()
+        self.devices_by_name[level_device.name].add(level_device)
+        if type(level_device) not in self.devices_by_class:
+            self.devices_by_class[type(level_device)] = entity.EntityList()
+        self.devices_by_class[type(level_device)].add(level_device)
+
+    def add_order(self, customer):
+        '''Add the order of a customer to `customers_by_order_class`.
+
+        '''
+        for item_class in customer.order.items_by_class:
+            self.customers_by_order_class.setdefault(item_class, {})[customer] = None
+
+    def remove_order(self, customer, item_class=None):
+        '''Remove the order of a customer, or one class of it, from `customers_by_order_class`.
+
+        '''
+        item_classes = list(customer.order.items_by_class) if item_class is None else [item_class]
+        for item_class in item_classes:
+            customers = self.customers_by_order_class.get(item_class)
+            if customers is not None:
+                customers.pop(customer, None)
+                if len(customers) == 0:
+                    del self.customers_by_order_class[item_class]
+
+    def get_customers_wanting(self, item_class):
+        '''Return the customers whose order includes the given item class.
+
+        '''
+        return list(self.customers_by_order_class.get(item_class, ()))
+
+    ## Item locations
+    ## --------------
+
+    def _set_item_location(self, level_item, location, holder):
+        self.item_locations[level_item] = (location, holder)
+        holder_items = self.items_by_holder.get(holder)
+        if holder_items is None:
+            holder_items = self.items_by_holder[holder] = {}
+        holder_items[level_item] = None
+
+    def _clear_item_location(self, level_item):
+        _, holder = self.item_locations.pop(level_item)
+        holder_items = self.items_by_holder[holder]
+        del holder_items[level_item]
+        if len(holder_items) == 0:
+            del self.items_by_holder[holder]
+
+    def move_item(self, level_item, location, holder=None):
+        '''Record that an item has moved to the given location.
+
+        The `holder` is the device, plate item or customer holding the item,
+        and is ignored for the hand, which is held by the level itself. The
+        model calls this whenever it moves an item; anything else which places
+        items directly must call it too.
+
+        '''
+        if location == item.LOCATION_HAND:
+            holder = self
+        elif location == item.LOCATION_LOOSE:
+            holder = None
+        self._clear_item_location(level_item)
+        self._set_item_location(level_item, location, holder)
+        if self.journal is not None:
+            self.record_change(_LOCATION_CHANGES[location], level_item, None if holder is self else holder)
+
+    @property
+    def held_item(self):
+        '''The item in the player's hand, or `None`.
+
+        Setting it moves the item to the hand, and leaves the item it replaces
+        loose if nothing else has taken it.
+
+        '''
+        return self._held_item
+
+    @held_item.setter
+    def held_item(self, held_item):
+        previous_item = self._held_item
+        self._held_item = held_item
+        if held_item is previous_item:
+            return
+        if (previous_item is not None) and (self.item_locations.get(previous_item) == (item.LOCATION_HAND, self)):
+            self.move_item(previous_item, item.LOCATION_LOOSE)
+        if (held_item is not None) and (held_item in self.item_locations):
+            self.move_item(held_item, item.LOCATION_HAND)
+
+    def location_of(self, level_item):
+        '''Return the `(location, holder)` of an item in the level.
+
+        The location is one of the `LOCATION_*` constants of `applib.model.item`,
+        and the holder is the device, plate item or customer holding the item,
+        the level for the hand, or `None` for a loose item.
+
+        '''
+        try:
+            return self.item_locations[level_item]
+        except KeyError:
+            raise ValueError(f'item not in level: {level_item!r}') from None
+
+    def items_at(self, holder):
+        '''Return the items held by a device, plate item or customer.
+
+        The items in the hand are held by the level itself, and loose items by `None`.
+
+        '''
+        return list(self.items_by_holder.get(holder, ()))
+
+    def get_orphaned_items(self):
+        '''Return the items which nothing holds, other than those which may lie loose.
+
+        '''
+        return [level_item for level_item in self.items_by_holder.get(None, ()) if not level_item.can_be_loose]
+
+    def find_item_locations(self):
+        '''Return the location of every item, worked out afresh from the level's state.
+
+        Like `move_item`, this leaves out items which are not in the level,
+        such as one put in the hand after being created without a level.
+
+        '''
+        locations = {level_item: (item.LOCATION_LOOSE, None) for level_item in self.items}
+        def place(level_item, location, holder):
+            if level_item in locations:
+                locations[level_item] = (location, holder)
+                if (level_item.holds is not None) and (level_item.holds in locations):
+                    locations[level_item.holds] = (item.LOCATION_PLATE, level_item)
+        for level_device in self.devices:
+            if level_device.current_item is not None:
+                place(level_device.current_item, item.LOCATION_DEVICE, level_device)
+        for customer in self.customers:
+            for order_item in customer.order.items:
+                place(order_item, item.LOCATION_CUSTOMER, customer)
+        if self.held_item is not None:
+            place(self.held_item, item.LOCATION_HAND, self)
+        return locations
+
+    def index_item_locations(self):
+        '''Rebuild the item location index from the level's state.
+
+        '''
+        self.item_locations = {}
+        self.items_by_holder = {}
+        for level_item, (location, holder) in self.find_item_locations().items():
+            self._set_item_location(level_item, location, holder)
+
+    def check_item_locations(self):
+        '''Raise `RuntimeError` if the item location index is wrong or any item is orphaned.
+
+        '''
+        if self.item_locations != self.find_item_locations():
+            raise RuntimeError('item locations out of date')
+        orphaned_items = self.get_orphaned_items()
+        if orphaned_items:
+            raise RuntimeError(f'orphaned items: {orphaned_items!r}')
+
+    #: The last problem printed by `debug_item_locations`.
+    _item_location_problem = None
+
+    def debug_item_locations(self):
+        '''Print any problem `check_item_locations` finds, and the level, once.
+
+        This is called after every tick and interaction when `DEBUG` is set,
+        and only warns, so that a bad index never stops the game.
+
+        '''
+        try:
+            self.check_item_locations()
+        except RuntimeError as error:
+            problem = str(error)
+        else:
+            problem = None
+        if (problem is not None) and (problem != self._item_location_problem):
+            print(f'warning: {problem}')
+            self.debug_print()
+        self._item_location_problem = problem
 
     def debug_print(self):
         print(f'level:')
@@ -294,35 +702,99 @@ class Level(pyglet.event.EventDispatcher):
         for scenery in self.scenery:
             print(f'  scenery: {scenery.name}')
 
+    def snapshot(self):
+        '''Return the full running state of the level as bytes.
+
+        '''
+        return snapshot.dump(self)
+
+    def restore(self, data):
+        '''Return the level to a state returned by `snapshot`.
+
+        '''
+        snapshot.load(self, data)
+        self.index_item_locations()
+        if self.journal is not None:
+            self.record_change(journal.LEVEL_RESTORED, self)
+
+    def subscribe(self):
+        '''Return a `JournalReader` for the changes made to the level from now on.
+
+        The level keeps a journal while it has any readers (see `applib.model.journal`).
+
+        '''
+        if self.journal is None:
+            self.journal = journal.Journal()
+        return self.journal.open()
+
+    def unsubscribe(self, reader):
+        '''Close a reader returned by `subscribe`.
+
+        '''
+        self.journal.close(reader)
+        if len(self.journal.readers) == 0:
+            self.journal = None
+
+    def record_change(self, kind, subject, detail=None):
+        '''Add a change to the journal, if the level is keeping one.
+
+        '''
+        if self.journal is not None:
+            self.journal.changes.append((self.tick_running, kind, subject, detail))
+
+    def schedule(self, entity, tick):
+        '''Have the entity's `tick` method called at the given tick.
+
+        This replaces any earlier request for the entity, and a `tick` of
+        `None` cancels it.
+
+        '''
+        self.scheduler.schedule(entity, tick)
+
+    def get_entity(self, entity_id):
+        '''Return the entity with the given id.
+
+        '''
+        try:
+            return self.entities_by_id[entity_id]
+        except KeyError:
+            raise ValueError(f'entity not found: {entity_id!r}') from None
+
     def get_device(self, name):
         '''Return the first device with the given name.
 
         '''
-        for device in self.devices:
-            if device.name == name:
-                return device
-        raise ValueError(f'device not found: {name!r}')
+        devices = self.devices_by_name.get(name)
+        if not devices:
+            raise ValueError(f'device not found: {name!r}')
+        return devices[0]
 
     def get_devices(self, name):
         '''Return all devices with the given name.
 
         '''
-        devices = []
-        for device in self.devices:
-            if device.name == name:
-                devices.append(device)
-        return devices
+        return list(self.devices_by_name.get(name, ()))
+
+    def get_devices_of_class(self, device_class):
+        '''Return all devices of exactly the given class.
+
+        '''
+        return list(self.devices_by_class.get(device_class, ()))
 
     def interact(self, interactable):
         '''Interact with the given object, possibly changing the held item.
 
         '''
+        if self.recorder is not None:
+            self.recorder.record(self.tick_running, interactable)
         if isinstance(interactable, device.Device):
             self.held_item = interactable.interact(self.held_item)
         elif isinstance(interactable, Customer):
             self.held_item = interactable.interact(self.held_item)
         elif isinstance(interactable, item.Apple):
             self.held_item = interactable.interact(self.held_item)
+        if DEBUG:
+            self.debug_item_locations()
 
     def remove_customer(self, customer, success, score):
         '''Remove a customer from level
@@ -337,6 +809,15 @@ class Level(pyglet.event.EventDispatcher):
             self.score -= score
         else:
             self.score += score
+        if self.journal is not None:
+            self.record_change(journal.SCORE_CHANGED, self, self.score)
+
+    @property
+    def suspicion_per_tick(self):
+        '''The score added by each tick in suspicion mode.
+
+        '''
+        return self.alt_suspicion_rate * self.tick_scale
 
     @property
     def fail_score(self):
@@ -360,6 +841,7 @@ class Level(pyglet.event.EventDispatcher):
             # we have run out of time
             # any reminaing customers in queue or at counter show score max sus (and we should probably fail?)
             self.score += (len(self.customers) + len(self.customer_specification)) * MAX_SCORE_FROM_CUSTOMER
+            self.record_change(journal.SCORE_CHANGED, self, self.score)
             self.end_level(False)
             return True
         elif len(self.customers) + len(self.customer_specification) == 0:
@@ -369,6 +851,34 @@ class Level(pyglet.event.EventDispatcher):
         else:
             return False
 
+    def get_ticks_until_level_end(self, limit=None):
+        '''Return the number of ticks until `has_level_ended` will be true.
+
+        If something else is known to happen after `limit` ticks then a lower
+        bound may be returned instead of the exact value beyond that limit.
+
+        '''
+        if self.score >= self.fail_score:
+            return 1
+        elif len(self.customers) + len(self.customer_specification) == 0:
+            return 1
+        elif not self.alt_suspicion_mode:
+            return max(1, self.duration_ticks - self.tick_running)
+        elif self.alt_suspicion_rate > 0.0:
+            suspicion_per_tick = self.suspicion_per_tick
+            # Rounding can only be out by a fraction of a tick, so estimate first.
+            ticks = max(1, int((self.fail_score - self.score) / suspicion_per_tick))
+            if (limit is not None) and (ticks >= limit):
+                return ticks
+            # Repeat the additions made by `tick` so that the rounding matches exactly.
+            score, ticks = self.score, 1
+            while score < self.fail_score:
+                score = max(0.0, score + suspicion_per_tick)
+                ticks += 1
+            return ticks
+        else:
+            return None
+
     def end_level(self, success):
         if success is True:
             #end level with success!
@@ -389,362 +899,173 @@ class Level(pyglet.event.EventDispatcher):
         if self.has_level_ended():
             return
 
-        for entity in self.entities:
+        # Tick the entities which are due, in the order the level holds them.
+        scheduler = self.scheduler
+        entity = scheduler.pop(self.tick_running)
+        while entity is not None:
             entity.tick()
+            entity = scheduler.pop(self.tick_running)
 
         if self.alt_suspicion_mode:
-            self.score = max(0.0, self.score + self.alt_suspicion_rate)
+            self.score = max(0.0, self.score + self.suspicion_per_tick)
 
         self.check_and_add_customer()
-                
-    def check_and_add_customer(self):
-        if len(self.customer_specification) > 0 and len(self.customers) < self.customer_spaces_specification:
-            # we have the space to spawn a customer, if one is waiting
-            # we assume customers are in a queue in the right order!
-            time, customer_type, order = self.customer_specification[0]
-            if (int(time / TICK_LENGTH) <= self.tick_running):
-                order = Order(*[item_class(self) for item_class in order])
-                new_customer = Customer(self, order, customer_type)
-                self.customer_specification.pop(0)
-
-class TestLevel(Level):
-
-    device_specification = [
-        (device.Dough, -0.5, -0.1),
-        (device.Cooking, 0.0, -0.1),
-        (device.IcingBlue, 0.5, -0.1),
-        (device.Bin, -0.8, -0.4),
-        (device.MultiPlating, -0.5, -0.3),
-        (device.Plate, 0.0, -0.3),
-        (device.SprinklesPurple, 0.5, -0.3),
-    ]
-
-    customer_specification = [
-        (0, 'cop_rabbit', [item.DoughnutUncooked] * 1),
-        (50, 'friend_patches', [item.DoughnutUncooked] * 2),
-        (100, 'cop_rabbit', [item.DoughnutUncooked] * 3),
-        (150, 'friend_patches', [item.DoughnutUncooked] * 3),
-    ]
-
-    customer_spaces_specification = 4
-
-    background_scenery = scenery.BackgroundHill
-
-class LevelOne(Level):
-
-    background_scenery = scenery.BackgroundVillage
-
-    opening_scene = 'level_1_opening'
-    victory_scene = 'level_1_victory'
-    failure_scene = 'level_1_failure'
-
-    serve_style = 'fast'
-    fail_ratio = 0.75 
-    duration = 33
-    alt_suspicion_rate = 0.05
-    alt_suspicion_time = 31
-
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.3, -0.18),
-        (device.Bin, 0.65, -0.44),
-    ]
-
-    customer_specification = [
-        (2, 'cop_rabbit', [item.DoughnutCooked] * 3),
-    ]
-
-class LevelOneBee(LevelOne):
-    failure_scene = 'level_1B_failure'
-
-class LevelTwo(Level):
-
-    background_scenery = scenery.BackgroundVillage
-    customer_spaces_specification = 2
-
-    opening_scene = 'level_2_opening'
-    victory_scene = 'level_2_victory'
-    failure_scene = 'level_2_failure'
+        if DEBUG:
+            self.debug_item_locations()
 
-    serve_style = 'fast'
-    fail_ratio = 0.4
-    duration = 50
-    alt_suspicion_rate = 0.05
-    alt_suspicion_time = 21
-
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.3, -0.18),
-        (device.IcingPink, 0.5, -0.05),
-        (device.Bin, 0.65, -0.44),
-    ]
-
-    customer_specification = [
-        (2, 'cop_dog', [item.DoughnutIcedPink]),
-        (10, 'slacker_patches', [item.DoughnutUncooked]),
-        (15, 'cop_rabbit', [item.DoughnutCooked]),
-        (17, 'cop_dog', [item.DoughnutIcedPink]),
-    ]
-
-class LevelTwoBee(LevelTwo):
-    failure_scene = 'level_2B_failure'
-
-class LevelThree(Level):
-
-    background_scenery = scenery.BackgroundVillage
-    customer_spaces_specification = 2
-
-    opening_scene = 'level_3_opening'
-    victory_scene = 'level_3_victory'
-    failure_scene = 'level_3_failure'
-
-    serve_style = 'fast'
-    fail_ratio = 0.55
-    duration = 65
-    alt_suspicion_rate = 0.04
-    alt_suspicion_time = 36
-
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.3, -0.18),
-        (device.IcingPink, 0.5, -0.05),
-        (device.IcingBlue, 0.6, -0.15),
-        (device.MultiPlating, 0.0, -0.1),
-        (device.Plate, 0.0, -0.28),
-        (device.Bin, 0.65, -0.44),
-    ]
-
-    customer_specification = [
-        (2, 'cop_dog', [item.DoughnutIcedBlue]),
-        (8, 'cop_rabbit', [item.DoughnutIcedBlue, item.DoughnutCooked]),
-        (12, 'cop_dog', [item.DoughnutIcedPink]),
-        (25, 'cop_rabbit', [item.DoughnutIcedPink, item.DoughnutIcedBlue]),
-    ]
-
-class LevelThreeBee(LevelThree):
-    failure_scene = 'level_3B_failure'
-
-class LevelFour(Level):
-
-    background_scenery = scenery.BackgroundHill
-    customer_spaces_specification = 3
-
-    duration = 90
-
-    opening_scene = 'level_4_opening'
-    victory_scene = 'level_4_victory'
-    failure_scene = 'level_4_failure'
-
-    serve_style = 'fast'
-    fail_ratio = 0.8
-    alt_suspicion_rate = 0.04
-    alt_suspicion_time = 40
-
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.25, -0.11),
-        (device.Cooking, 0.35, -0.275),
-        (device.IcingPink, 0.5, -0.05),
-        (device.IcingBlue, 0.6, -0.15),
-        (device.MultiPlating, 0.0, -0.1),
-        (device.Plate, 0.0, -0.28),
-        (device.Bin, 0.65, -0.44),
-        (device.SprinklesPurple, -0.22, -0.17),
-        (device.SprinklesYellow, -0.35, -0.27),
-    ]
-
-    customer_specification = [
-        (1, 'cop_elephant', [item.DoughnutFinalBluePurple]),
-        (7, 'cop_rabbit', [item.DoughnutCooked, item.DoughnutIcedBlue]),
-        (17, 'cop_dog', [item.DoughnutIcedPink]),
-        (18, 'cop_rabbit', [item.DoughnutCooked]),
-        (25, 'cop_elephant', [item.DoughnutFinalPinkYellow, item.DoughnutFinalPinkPurple, item.DoughnutCooked]),
-    ]
-
-class LevelFourBee(LevelFour):
-    failure_scene = 'level_4B_failure'
-
-class LevelOneTutorial(Level):
-
-    background_scenery = scenery.BackgroundVillage
-
-    opening_scene = 'tutorial_level_1_opening'
-    victory_scene = 'tutorial_level_1_complete'
-    failure_scene = 'tutorial_level_1_complete'
-
-    serve_style = 'fast'
-    fail_ratio = 1 
-    duration = 120
-
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.3, -0.18),
-        (device.Bin, 0.65, -0.44),
-    ]
-
-    customer_specification = [
-        (0, 'friend_patches' ,[item.DoughnutCooked]),
-    ]
-
-class LevelTwoTutorial(Level):
-
-    background_scenery = scenery.BackgroundVillage
-
-    opening_scene = 'tutorial_level_2_opening'
-    victory_scene = 'tutorial_level_2_complete'
-    failure_scene = 'tutorial_level_2_complete'
-
-    serve_style = 'fast'
-    fail_ratio = 1
-    duration = 120
-
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.3, -0.18),
-        (device.IcingPink, 0.5, -0.05),
-        (device.Bin, 0.65, -0.44),
-    ]
+    def get_next_event_tick(self):
+        '''Return the next tick at which more than timers counting down will happen.
 
-    customer_specification = [
-        (0, 'friend_patches' ,[item.DoughnutIcedPink]),
-    ]
+        Returns `None` if nothing will ever happen.
 
-class LevelThreeTutorial(Level):
-
-    background_scenery = scenery.BackgroundVillage
-
-    opening_scene = 'tutorial_level_3_opening'
-    victory_scene = 'tutorial_level_3_complete'
-    failure_scene = 'tutorial_level_3_complete'
+        '''
+        next_ticks = [self.get_ticks_until_customer()]
+        scheduled_tick = self.scheduler.peek()
+        if scheduled_tick is not None:
+            next_ticks.append(max(1, scheduled_tick - self.tick_running))
+        next_ticks = [ticks for ticks in next_ticks if ticks is not None]
+        limit = min(next_ticks) if len(next_ticks) > 0 else None
+        level_end_ticks = self.get_ticks_until_level_end(limit)
+        if level_end_ticks is not None:
+            next_ticks.append(level_end_ticks)
+        if len(next_ticks) > 0:
+            return self.tick_running + min(next_ticks)
+        return None
+
+    def _skip_ticks(self, ticks):
+        '''Apply the given number of uneventful ticks at once.
 
-    serve_style = 'fast'
-    fail_ratio = 1
-    duration = 120
+        '''
+        self.tick_running += ticks
+        if self.alt_suspicion_mode:
+            suspicion_per_tick = self.suspicion_per_tick
+            for _ in range(ticks):
+                self.score = max(0.0, self.score + suspicion_per_tick)
 
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.3, -0.18),
-        (device.IcingPink, 0.5, -0.05),
-        (device.IcingBlue, 0.6, -0.15),
-        (device.MultiPlating, 0.0, -0.1),
-        (device.Plate, 0.0, -0.28),
-        (device.Bin, 0.65, -0.44),
-    ]
+    def advance_to(self, tick):
+        '''Advance the level state until it reaches the given tick.
 
-    customer_specification = [
-        (0, 'friend_patches' ,[item.DoughnutIcedPink]),
-    ]
+        This gives exactly the same results as calling `tick` repeatedly, but
+        jumps straight over the uneventful ticks in between.
 
-class LevelFourTutorial(Level):
+        '''
+        while self.tick_running < tick:
+            next_event_tick = self.get_next_event_tick()
+            if (next_event_tick is None) or (next_event_tick > tick):
+                self._skip_ticks(tick - self.tick_running)
+            else:
+                self._skip_ticks(next_event_tick - self.tick_running - 1)
+                self.tick()
 
-    background_scenery = scenery.BackgroundHill
+    def run_until_event(self):
+        '''Advance the level state up to and including the next eventful tick.
 
-    opening_scene = 'tutorial_level_4_opening'
-    victory_scene = 'tutorial_level_4_complete'
-    failure_scene = 'tutorial_level_4_complete'
+        Returns the tick that was reached, or `None` if nothing will ever happen.
 
-    serve_style = 'fast'
-    fail_ratio = 1
-    duration = 120
+        '''
+        next_event_tick = self.get_next_event_tick()
+        if next_event_tick is not None:
+            self.advance_to(next_event_tick)
+        return next_event_tick
 
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.25, -0.11),
-        (device.Cooking, 0.35, -0.275),
-        (device.IcingPink, 0.5, -0.05),
-        (device.IcingBlue, 0.6, -0.15),
-        (device.MultiPlating, 0.0, -0.1),
-        (device.Plate, 0.0, -0.28),
-        (device.Bin, 0.65, -0.44),
-        (device.SprinklesPurple, -0.22, -0.17),
-        (device.SprinklesYellow, -0.35, -0.27),
-    ]
+    def get_ticks_until_customer(self):
+        '''Return the number of ticks until `check_and_add_customer` may add a customer.
 
-    customer_specification = [
-        (0, 'friend_patches', [item.DoughnutFinalBluePurple]),
-    ]
+        '''
+        if len(self.customer_specification) > 0 and len(self.customers) < self.customer_spaces_specification:
+            return max(1, self.get_customer_arrival_tick() - self.tick_running)
+        return None
 
+    def get_customer_arrival_tick(self):
+        '''Return the tick at which the next specified customer may arrive.
 
-default_level = LevelOne
-LevelOne.next_level = LevelTwo
-LevelTwo.next_level = LevelThree
-LevelThree.next_level = LevelFour
+        '''
+        specification = self.customer_specification[0]
+        if specification is not self._customer_arrival[0]:
+            self._customer_arrival = (specification, self.get_ticks(specification[0]))
+        return self._customer_arrival[1]
 
+    def check_and_add_customer(self):
+        if len(self.customer_specification) > 0 and len(self.customers) < self.customer_spaces_specification:
+            # we have the space to spawn a customer, if one is waiting
+            # we assume customers are in a queue in the right order!
+            if self.get_customer_arrival_tick() <= self.tick_running:
+                time, customer_type, order = self.customer_specification[0]
+                order = Order(*[item_class(self) for item_class in order])
+                new_customer = Customer(self, order, customer_type)
+                self.customer_specification.pop(0)
 
+class RandomCustomerLevel(Level):
+    '''A level whose customers keep arriving at random, such as `EndlessLevel`.
 
+    Each customer is of a type drawn from `customer_things`, which maps the
+    type to the least and most items in its order and the weighted options for
+    each item. The customers arrive between `customer_time_min` and
+    `customer_time_max` seconds apart.
 
-class EndlessLevel(Level):
+    '''
 
     next_customer_ticks = None
     customer_time_min = 4
     customer_time_max = 8
+    customer_things = {}
+    customer_specification = [None]
 
-    customer_things = {
-        'cop_dog': [1, 1, [
-            (2, item.DoughnutIcedBlue),
-            (2, item.DoughnutIcedPink),
-            (1, item.DoughnutFinalBlueYellow),
-            (1, item.DoughnutFinalPinkYellow),
-            (1, item.DoughnutFinalBluePurple),
-            (1, item.DoughnutFinalPinkPurple),
-        ]],
-        'cop_elephant': [3, 3, [
-            (4, item.DoughnutCooked),
-            (2, item.DoughnutIcedBlue),
-            (2, item.DoughnutIcedPink),
-            (1, item.DoughnutFinalBlueYellow),
-            (1, item.DoughnutFinalPinkYellow),
-            (1, item.DoughnutFinalBluePurple),
-            (1, item.DoughnutFinalPinkPurple),
-        ]],
-        'cop_rabbit': [1, 3, [
-            (1, item.DoughnutCooked),
-            (1, item.DoughnutIcedBlue),
-            (1, item.DoughnutIcedPink),
-        ]],
-        'slacker_patches': [1, 1, [
-            # (1, item.Apple),
-            (1, item.DoughnutUncooked),
-            (1, item.DoughnutCooked),
-            (1, item.DoughnutBurned),
-        ]],
-    }
+    @classmethod
+    def compile_customer_things(cls):
+        '''Return `customer_things` compiled for sampling, caching it on the class.
 
-    background_scenery = scenery.BackgroundHill
-    customer_specification = [None]
-    customer_spaces_specification = 3
+        The result is the tuple of customer types and a map from each type to
+        its order size range and its options, expanded by weight into a tuple
+        so that drawing an option is a single `choice`. The cache is rebuilt
+        if `customer_things` is replaced.
 
-    opening_scene = 'endless_opening'
-    victory_scene = 'endless_victory'
-    failure_scene = 'endless_failure'
+        '''
+        compiled = cls.__dict__.get('_compiled_customer_things')
+        if (compiled is None) or (compiled[0] is not cls.customer_things):
+            order_tables = {}
+            for customer_type, (order_min, order_max, order_options) in cls.customer_things.items():
+                options = tuple(option for count, option in order_options for _ in range(count))
+                order_tables[customer_type] = (order_min, order_max, options)
+            compiled = (cls.customer_things, tuple(cls.customer_things), order_tables)
+            cls._compiled_customer_things = compiled
+        return compiled
+
+    @classmethod
+    def sample_orders(cls, count, random_stream=None):
+        '''Return `count` random `(customer type, item classes)` orders.
+
+        The orders follow the same distribution as the customers of the level
+        but draw different numbers, so this is for simulations rather than
+        for predicting a particular level.
 
-    serve_style = 'fast'
-    alt_suspicion_rate = 0.03
-    alt_suspicion_time = 90
-
-    device_specification = [
-        (device.Dough, -0.5, -0.14),
-        (device.Cooking, 0.28, -0.11),
-        (device.Cooking, 0.37, -0.275),
-        (device.IcingPink, 0.5, -0.05),
-        (device.IcingBlue, 0.6, -0.15),
-        (device.MultiPlatingLeft, -0.1, -0.1),
-        (device.MultiPlatingRight, 0.1, -0.1),
-        (device.Plate, 0.0, -0.28),
-        (device.Bin, 0.65, -0.44),
-        (device.SprinklesPurple, -0.3, -0.17),
-        (device.SprinklesYellow, -0.45, -0.27),
-    ]
+        '''
+        if random_stream is None:
+            random_stream = random
+        _, customer_types, order_tables = cls.compile_customer_things()
+        orders = []
+        for customer_type in random_stream.choices(customer_types, k=count):
+            order_min, order_max, options = order_tables[customer_type]
+            orders.append((customer_type, random_stream.choices(options, k=random_stream.randint(order_min, order_max))))
+        return orders
+
+    def get_ticks_until_customer(self):
+        if self.next_customer_ticks is None:
+            return 1
+        elif len(self.customers) < self.customer_spaces_specification:
+            return max(1, self.next_customer_ticks - self.tick_running)
+        else:
+            return None
 
     def check_and_add_customer(self):
         if self.next_customer_ticks is None:
-            self.next_customer_ticks = self.tick_running + int(math.ceil((random.random() * (self.customer_time_max - self.customer_time_min) + self.customer_time_min) / TICK_LENGTH))
+            self.next_customer_ticks = self.tick_running + int(math.ceil((self.random.random() * (self.customer_time_max - self.customer_time_min) + self.customer_time_min) / self.tick_length))
         if (len(self.customers) < self.customer_spaces_specification) and (self.tick_running >= self.next_customer_ticks):
             # Add a random customer.
-            customer_type = random.choice(list(self.customer_things))
-            order_min, order_max, order_options = self.customer_things[customer_type]
-            order_options = sum([[option] * count for count, option in order_options], [])
-            order_items = [random.choice(order_options)(self) for _ in range(random.randint(order_min, order_max))]
+            _, customer_types, order_tables = self.compile_customer_things()
+            customer_type = self.random.choice(customer_types)
+            order_min, order_max, order_options = order_tables[customer_type]
+            order_items = [self.random.choice(order_options)(self) for _ in range(self.random.randint(order_min, order_max))]
             Customer(self, Order(*order_items), customer_type)
             self.next_customer_ticks = None
 
@@ -755,3 +1076,78 @@ class EndlessLevel(Level):
             (ENDLESS_SAD_GROWTH_RATE * self.sad_customer) +
             (ENDLESS_HAPPY_GROWTH_RATE * self.happy_customer)
         )
+
+
+#: The journal change for moving an item to each location.
+_LOCATION_CHANGES = {
+    item.LOCATION_HAND: journal.ITEM_TO_HAND,
+    item.LOCATION_DEVICE: journal.ITEM_TO_DEVICE,
+    item.LOCATION_PLATE: journal.ITEM_TO_PLATE,
+    item.LOCATION_CUSTOMER: journal.ITEM_TO_CUSTOMER,
+    item.LOCATION_LOOSE: journal.ITEM_LOOSE,
+}
+
+
+## Level data
+
+#: The name of the first story level.
+default_level = 'LevelOne'
+
+#: The names of the level classes being created, to catch circular bases.
+_loading_levels = set()
+
+def _get_named_class(module, name, base_class, kind, level_name):
+    named_class = getattr(module, name, None)
+    if not (isinstance(named_class, type) and issubclass(named_class, base_class)):
+        raise ValueError(f'level {level_name!r}: unknown {kind} {name!r}')
+    return named_class
+
+def get_level_class(name):
+    '''Return the level class with the given name.
+
+    Levels declared in `data/levels/` (see `applib.model.leveldata`) are
+    created the first time they are asked for, and are then kept in this
+    module like any other level class.
+
+    '''
+    level_class = globals().get(name)
+    if isinstance(level_class, type) and issubclass(level_class, Level):
+        return level_class
+    if name in _loading_levels:
+        raise ValueError(f'level {name!r} is its own base')
+    definition = leveldata.load_level(name)
+    _loading_levels.add(name)
+    try:
+        base_class = get_level_class(definition['base'])
+    finally:
+        _loading_levels.discard(name)
+
+    attributes = {'__module__': __name__, '__qualname__': name}
+    for key, value in definition.items():
+        if key == 'base':
+            continue
+        if not hasattr(base_class, key):
+            raise ValueError(f'level {name!r}: unknown level attribute {key!r}')
+        if key == 'background_scenery':
+            value = _get_named_class(scenery, value, scenery.Scenery, 'scenery', name)
+        elif key == 'device_specification':
+            value = [(_get_named_class(device, device_name, device.Device, 'device', name), x, y)
+                for device_name, x, y in value]
+        elif key == 'customer_specification':
+            value = [None if entry is None else (entry[0], entry[1],
+                [_get_named_class(item, item_name, item.Item, 'item', name) for item_name in entry[2]])
+                for entry in value]
+        elif key == 'customer_things':
+            value = {customer_type: [order_min, order_max,
+                [(count, _get_named_class(item, item_name, item.Item, 'item', name)) for count, item_name in options]]
+                for customer_type, (order_min, order_max, options) in value.items()}
+        attributes[key] = value
+    level_class = type(name, (base_class,), attributes)
+    globals()[name] = level_class
+    return level_class
+
+def __getattr__(name):
+    # Levels in data files are only loaded once used, as `level.LevelOne`.
+    if leveldata.has_level(name):
+        return get_level_class(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
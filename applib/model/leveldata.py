@@ -0,0 +1,183 @@
+'''applib.model.leveldata -- level definitions in data files
+
+Every level is declared in a JSON file in `data/levels/` named after its class,
+holding an object whose keys are `Level` class attributes. Devices, scenery
+and items are given by the names of their classes, and `base` names the level
+class to extend (by default `Level`), either another data file or a class of
+`applib.model.level`. For example:
+
+    {
+        "base": "Level",
+        "background_scenery": "BackgroundVillage",
+        "duration": 33,
+        "device_specification": [["Dough", -0.5, -0.14], ["Cooking", 0.3, -0.18]],
+        "customer_specification": [[2, "cop_rabbit", ["DoughnutCooked"]]],
+        "next_level": "LevelTwo"
+    }
+
+Each file is checked and compiled into a normalised form once, and the result
+is cached with `marshal` under the hash of the file's contents, so that an
+edited file is compiled again. The cache sits beside the bytecode of this
+module (see `get_cache_directory`) rather than in `data/`. Nothing is read
+until a level is asked for, so shipping more levels does not slow startup.
+
+'''
+
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+
+import applib
+
+
+#: Changed whenever the compiled form changes, so that older caches are ignored.
+CACHE_VERSION = 1
+
+#: The keys allowed in a level file besides the names of plain level attributes.
+STRUCTURED_KEYS = ('base', 'device_specification', 'customer_specification', 'customer_things')
+
+
+def get_levels_directory():
+    '''Return the absolute path of the level data directory.
+
+    '''
+    return os.path.join(applib.get_data_directory(), 'levels')
+
+def get_cache_directory():
+    '''Return the directory holding the compiled level cache.
+
+    This is next to the bytecode cache of this module, so it follows
+    `sys.pycache_prefix` when one is set.
+
+    '''
+    return os.path.join(os.path.dirname(importlib.util.cache_from_source(__file__)), 'levels')
+
+def get_level_path(name):
+    '''Return the path of the data file declaring the named level.
+
+    '''
+    return os.path.join(get_levels_directory(), f'{name}.json')
+
+def list_levels():
+    '''Return the names of all the levels declared in data files, in order.
+
+    '''
+    try:
+        file_names = os.listdir(get_levels_directory())
+    except FileNotFoundError:
+        return []
+    return sorted(file_name[:-len('.json')] for file_name in file_names if file_name.endswith('.json'))
+
+def has_level(name):
+    '''Return whether a data file declares the named level.
+
+    '''
+    return name.isidentifier() and os.path.isfile(get_level_path(name))
+
+
+def _check(condition, name, message):
+    if not condition:
+        raise ValueError(f'level {name!r}: {message}')
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def compile_level(name, definition):
+    '''Check a level definition parsed from its data file and return it normalised.
+
+    The result holds only plain values, with the specifications as tuples.
+
+    '''
+    _check(isinstance(definition, dict), name, 'the definition must be an object')
+    compiled = {'base': definition.get('base', 'Level')}
+    _check(isinstance(compiled['base'], str), name, 'base must be a level name')
+    for key, value in definition.items():
+        _check(key.isidentifier() and not key.startswith('_'), name, f'bad key {key!r}')
+        if key not in STRUCTURED_KEYS:
+            compiled[key] = value
+
+    if 'device_specification' in definition:
+        devices = []
+        for entry in definition['device_specification']:
+            _check(isinstance(entry, list) and (len(entry) == 3) and isinstance(entry[0], str)
+                and _is_number(entry[1]) and _is_number(entry[2]), name, f'bad device {entry!r}')
+            devices.append((entry[0], float(entry[1]), float(entry[2])))
+        compiled['device_specification'] = tuple(devices)
+
+    if 'customer_specification' in definition:
+        customers = []
+        for entry in definition['customer_specification']:
+            if entry is None:
+                # A customer made up when needed, such as by `EndlessLevel`.
+                customers.append(None)
+                continue
+            _check(isinstance(entry, list) and (len(entry) == 3) and _is_number(entry[0])
+                and isinstance(entry[1], str) and isinstance(entry[2], list)
+                and all(isinstance(item_name, str) for item_name in entry[2]), name, f'bad customer {entry!r}')
+            customers.append((entry[0], entry[1], tuple(entry[2])))
+        compiled['customer_specification'] = tuple(customers)
+
+    if 'customer_things' in definition:
+        customer_things = {}
+        for customer_type, entry in definition['customer_things'].items():
+            _check(isinstance(entry, list) and (len(entry) == 3) and isinstance(entry[0], int)
+                and isinstance(entry[1], int) and (0 < entry[0] <= entry[1]) and entry[2],
+                name, f'bad customer things for {customer_type!r}')
+            options = []
+            for option in entry[2]:
+                _check(isinstance(option, list) and (len(option) == 2) and isinstance(option[0], int)
+                    and (option[0] > 0) and isinstance(option[1], str), name, f'bad option {option!r}')
+                options.append((option[0], option[1]))
+            customer_things[customer_type] = (entry[0], entry[1], tuple(options))
+        compiled['customer_things'] = customer_things
+
+    return compiled
+
+
+def _get_cache_path(name, digest):
+    return os.path.join(get_cache_directory(), f'{name}.{digest}.marshal')
+
+def _write_cache(name, digest, compiled):
+    cache_path = _get_cache_path(name, digest)
+    cache_directory = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        # Drop the caches of earlier versions of the file.
+        for file_name in os.listdir(cache_directory):
+            old_name, _, old_digest = file_name[:-len('.marshal')].rpartition('.')
+            if file_name.endswith('.marshal') and (old_name == name) and (old_digest != digest):
+                os.remove(os.path.join(cache_directory, file_name))
+        temporary_path = f'{cache_path}.{os.getpid()}'
+        with open(temporary_path, 'wb') as cache_file:
+            marshal.dump(compiled, cache_file)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        # The cache directory may be read only once installed.
+        pass
+
+def load_level(name):
+    '''Return the compiled definition of the named level.
+
+    The compiled form is read from the cache when the file has not changed
+    since it was compiled.
+
+    '''
+    if not has_level(name):
+        raise ValueError(f'level not found: {name!r}')
+    with open(get_level_path(name), 'rb') as level_file:
+        contents = level_file.read()
+    digest = hashlib.sha1(CACHE_VERSION.to_bytes(4, 'little') + contents).hexdigest()[:16]
+    try:
+        with open(_get_cache_path(name, digest), 'rb') as cache_file:
+            return marshal.load(cache_file)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    try:
+        definition = json.loads(contents)
+    except ValueError as error:
+        raise ValueError(f'level {name!r}: {error}') from None
+    compiled = compile_level(name, definition)
+    _write_cache(name, digest, compiled)
+    return compiled
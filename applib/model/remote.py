@@ -0,0 +1,381 @@
+'''applib.model.remote -- levels simulated in a worker process
+
+A `LevelWorker` runs a copy of a level in a separate process, so that ticking
+it takes no time from drawing. After every tick or interaction, the worker
+publishes a view of its level into shared memory. A view holds only what is
+drawn: the tick, score and held item, the item and timer of each device, the
+patience and order of each customer, and the class and location of each item.
+The `LevelWorker` brings the local level up to date with the newest view,
+changing only the entities whose part of it differs from the last view, and
+views of the game then read the local level as usual. Requests for ticks,
+interactions, and the level's events and sounds go over a pipe.
+
+The shared memory holds the number of views published so far, followed by two
+slots written alternately. Each slot starts with a sequence number, which is
+odd while the slot is being written, and the length of its view. The reader
+copies the newest slot and then checks that its sequence number has not
+changed, so neither process ever waits for the other.
+
+'''
+
+import collections
+import multiprocessing
+import os
+import struct
+import time
+
+import applib
+
+from multiprocessing import shared_memory
+
+from applib.engine import sound
+from applib.model import item
+from applib.model import replay
+
+
+#: The space for a view in each slot of the shared memory.
+SLOT_SIZE = 1 << 16
+
+_HEADER = struct.Struct('<Q')
+_SLOT = struct.Struct('<QI')
+
+#: Stands in for `None` in integer fields.
+_NONE = -0x80000000
+
+_VIEW = struct.Struct('<idiiHHH')
+_VIEW_DEVICE = struct.Struct('<iii')
+_VIEW_CUSTOMER = struct.Struct('<iHdH')
+_VIEW_ITEM = struct.Struct('<iHBii')
+
+#: The item locations, in the order they are encoded.
+_LOCATIONS = (
+    item.LOCATION_LOOSE,
+    item.LOCATION_HAND,
+    item.LOCATION_DEVICE,
+    item.LOCATION_PLATE,
+    item.LOCATION_CUSTOMER,
+)
+_LOCATION_CODES = {location: code for code, location in enumerate(_LOCATIONS)}
+
+#: The events of a level forwarded from the worker. Customers arriving and
+#: leaving are seen in the views instead.
+_EVENTS = (
+    'on_level_success',
+    'on_level_fail',
+)
+
+
+def _get_slot_offset(slot):
+    return _HEADER.size + slot * (_SLOT.size + SLOT_SIZE)
+
+def _publish(buffer, number, data):
+    '''Write the view with the given number into its slot and publish it.
+
+    '''
+    if len(data) > SLOT_SIZE:
+        raise ValueError(f'view of {len(data)} bytes does not fit in a slot of {SLOT_SIZE}')
+    offset = _get_slot_offset(number % 2)
+    _SLOT.pack_into(buffer, offset, 2 * number - 1, 0)
+    buffer[offset + _SLOT.size:offset + _SLOT.size + len(data)] = data
+    _SLOT.pack_into(buffer, offset, 2 * number, len(data))
+    _HEADER.pack_into(buffer, 0, number)
+
+def _read(buffer, number):
+    '''Return the view with the given number, or `None` if it has been overwritten.
+
+    '''
+    offset = _get_slot_offset(number % 2)
+    sequence, length = _SLOT.unpack_from(buffer, offset)
+    if sequence != 2 * number:
+        return None
+    data = bytes(buffer[offset + _SLOT.size:offset + _SLOT.size + length])
+    if _SLOT.unpack_from(buffer, offset)[0] != sequence:
+        return None
+    return data
+
+def _id_of(level_entity):
+    return _NONE if level_entity is None else level_entity.entity_id
+
+_customer_name_indexes = {}
+
+def _get_customer_names():
+    '''Return the names customers may have, in the order they are encoded.
+
+    '''
+    return list(applib.model.level.Customer.customer_patience)
+
+def _dump_view(level):
+    '''Return the view of the level published by the worker, as bytes.
+
+    '''
+    if not _customer_name_indexes:
+        _customer_name_indexes.update((name, index) for index, name in enumerate(_get_customer_names()))
+    parts = [_VIEW.pack(level.tick_running, level.score, level.sold_cakes, _id_of(level.held_item),
+        len(level.devices), len(level.customers), len(level.items))]
+    for level_device in level.devices:
+        timer_end_tick = level_device.timer_end_tick
+        parts.append(_VIEW_DEVICE.pack(level_device.entity_id, _id_of(level_device.current_item),
+            _NONE if timer_end_tick is None else timer_end_tick))
+    for customer in level.customers:
+        order_items = customer.order.items
+        parts.append(_VIEW_CUSTOMER.pack(customer.entity_id, _customer_name_indexes[customer.name],
+            customer.patience_end_tick, len(order_items)))
+        parts.append(struct.pack(f'<{len(order_items)}i', *[order_item.entity_id for order_item in order_items]))
+    item_locations = level.item_locations
+    for level_item in level.items:
+        location, holder = item_locations[level_item]
+        parts.append(_VIEW_ITEM.pack(level_item.entity_id, level_item.item_id, _LOCATION_CODES[location],
+            _NONE if (holder is None) or (holder is level) else holder.entity_id, _id_of(level_item.holds)))
+    return b''.join(parts)
+
+
+def _run_worker(level_name, seed, tick_rate, data, memory_name, connection):
+    '''Simulate a level for a `LevelWorker` until told to stop.
+
+    '''
+    worker_level = replay.get_level_class(level_name)(seed=seed, tick_rate=tick_rate)
+    worker_level.restore(data)
+    memory = shared_memory.SharedMemory(name=memory_name)
+    number = 0
+
+    # Forward the level's events and sounds, tagged with the view they belong to.
+    worker_level.push_handlers(**{
+        name: (lambda name=name: connection.send(('event', number + 1, name))) for name in _EVENTS
+    })
+    sound.Sound.redirect = (lambda level_sound: connection.send(('sound', number + 1, level_sound.name)))
+
+    try:
+        while True:
+            message = connection.recv()
+            if message[0] == 'tick':
+                for _ in range(message[1]):
+                    worker_level.tick()
+            elif message[0] == 'interact':
+                target = worker_level.entities_by_id.get(message[1])
+                if (target is not None) and (message[2] >= 0):
+                    target = target.subdevices[message[2]]
+                if target is not None:
+                    worker_level.interact(target)
+            elif message[0] == 'stop':
+                break
+            number += 1
+            _publish(memory.buf, number, _dump_view(worker_level))
+    finally:
+        memory.close()
+        connection.close()
+
+
+class LevelWorker(object):
+    '''Worker process simulating a level, keeping the local level in step.
+
+    The local level is ticked and interacted with through the worker, and is
+    otherwise read as usual. It is kept up to date through the same methods
+    the model uses, so its journal records each entity created, destroyed or
+    moved, and customers arriving and leaving dispatch their events as usual.
+    Only the state in the views is kept, not the random number stream or the
+    schedule, so the local level must not be ticked itself. The worker's other
+    events are dispatched by the local level, and its sounds are played
+    locally.
+
+    '''
+
+    def __init__(self, level):
+        '''Start a worker simulating a copy of the given level.
+
+        '''
+        self.level = level
+        #: The tick the worker will be at once it has done everything asked of it.
+        self.tick_running = level.tick_running
+        #: The number of requests sent to the worker, and of views loaded.
+        self.requests = 0
+        self.published = 0
+        #: The messages received from the worker for views not yet loaded.
+        self.messages = collections.deque()
+        #: The part of the last view loaded for each entity, by entity id.
+        self.records = {}
+
+        self.memory = shared_memory.SharedMemory(create=True, size=_get_slot_offset(2))
+        _HEADER.pack_into(self.memory.buf, 0, 0)
+        self.connection, worker_connection = multiprocessing.Pipe()
+
+        # Start the worker without pyglet, which it does not need.
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(
+            target=_run_worker,
+            args=(replay.get_level_name(type(level)), level.seed, level.tick_rate, level.snapshot(),
+                self.memory.name, worker_connection),
+            daemon=True,
+        )
+        headless = os.environ.get('APPLIB_HEADLESS')
+        os.environ['APPLIB_HEADLESS'] = '1'
+        try:
+            self.process.start()
+        finally:
+            if headless is None:
+                del os.environ['APPLIB_HEADLESS']
+            else:
+                os.environ['APPLIB_HEADLESS'] = headless
+        worker_connection.close()
+
+    def tick(self, ticks=1):
+        '''Ask the worker for more ticks and catch up with its latest view.
+
+        '''
+        self.connection.send(('tick', ticks))
+        self.requests += 1
+        self.tick_running += ticks
+        self.sync()
+
+    def interact(self, interactable):
+        '''Forward an interaction to the worker.
+
+        The interaction is recorded at the tick the worker will make it, which
+        the local level may not have reached yet.
+
+        '''
+        if self.level.recorder is not None:
+            self.level.recorder.record(self.tick_running, interactable)
+        parent = getattr(interactable, 'parent', None)
+        if parent is None:
+            self.connection.send(('interact', interactable.entity_id, -1))
+        else:
+            self.connection.send(('interact', parent.entity_id, parent.subdevices.index(interactable)))
+        self.requests += 1
+
+    def sync(self, wait=False):
+        '''Catch up with the newest view published, and the events and sounds before it.
+
+        If `wait` is set, first wait for the worker to do everything asked of it.
+
+        '''
+        buffer = self.memory.buf
+        while True:
+            number, = _HEADER.unpack_from(buffer, 0)
+            data = _read(buffer, number) if (number > self.published) else None
+            if (data is not None) or (number == self.published):
+                if (not wait) or (number == self.requests):
+                    break
+            if not self.process.is_alive():
+                raise RuntimeError('level worker stopped')
+            time.sleep(0.001)
+        if data is not None:
+            self.load_view(data)
+            self.published = number
+
+        while self.connection.poll():
+            self.messages.append(self.connection.recv())
+        while self.messages and (self.messages[0][1] <= self.published):
+            message = self.messages.popleft()
+            if message[0] == 'event':
+                self.level.dispatch_event(message[2])
+            elif message[0] == 'sound':
+                getattr(sound, message[2])()
+
+    def load_view(self, data):
+        '''Bring the local level up to date with a view published by the worker.
+
+        Entities whose part of the view is the same as in the last one are
+        left alone.
+
+        '''
+        Customer = applib.model.level.Customer
+        Order = applib.model.level.Order
+        level = self.level
+        entities = level.entities_by_id
+        records = self.records
+        new_records = {}
+        (tick_running, score, sold_cakes, held_item_id,
+            device_count, customer_count, item_count) = _VIEW.unpack_from(data, 0)
+        offset = _VIEW.size
+        level.tick_running = tick_running
+        level.score = score
+        level.sold_cakes = sold_cakes
+
+        # Find the changed parts of the view.
+        changed_devices = []
+        for _ in range(device_count):
+            record = data[offset:offset + _VIEW_DEVICE.size]
+            offset += _VIEW_DEVICE.size
+            fields = _VIEW_DEVICE.unpack(record)
+            new_records[fields[0]] = record
+            if records.get(fields[0]) != record:
+                changed_devices.append(fields)
+        changed_customers = []
+        for _ in range(customer_count):
+            order_length = _VIEW_CUSTOMER.unpack_from(data, offset)[-1]
+            end = offset + _VIEW_CUSTOMER.size + 4 * order_length
+            record = data[offset:end]
+            fields = _VIEW_CUSTOMER.unpack_from(record)
+            fields += struct.unpack_from(f'<{order_length}i', record, _VIEW_CUSTOMER.size)
+            offset = end
+            new_records[fields[0]] = record
+            if records.get(fields[0]) != record:
+                changed_customers.append(fields)
+        changed_items = []
+        for _ in range(item_count):
+            record = data[offset:offset + _VIEW_ITEM.size]
+            offset += _VIEW_ITEM.size
+            fields = _VIEW_ITEM.unpack(record)
+            new_records[fields[0]] = record
+            if records.get(fields[0]) != record:
+                changed_items.append(fields)
+        self.records = new_records
+
+        # Create the new entities with the ids the worker gave them.
+        for entity_id, item_id, _, _, _ in changed_items:
+            if entity_id not in entities:
+                level.next_entity_id = entity_id
+                item.Item.item_classes[item_id](level)
+        for entity_id, name_index, _, _, *_ in changed_customers:
+            if entity_id not in entities:
+                level.next_entity_id = entity_id
+                Customer(level, Order(), _get_customer_names()[name_index])
+
+        # Update the entities which changed.
+        held_item = entities.get(held_item_id)
+        if level.held_item is not held_item:
+            level.held_item = held_item
+        for entity_id, current_item_id, timer_end_tick in changed_devices:
+            level_device = entities[entity_id]
+            level_device.current_item = entities.get(current_item_id)
+            timer_end_tick = None if timer_end_tick == _NONE else timer_end_tick
+            if level_device.timer_end_tick != timer_end_tick:
+                level_device.ticks_remaining = None if timer_end_tick is None else timer_end_tick - tick_running
+        for entity_id, _, patience_end_tick, _, *order_item_ids in changed_customers:
+            customer = entities[entity_id]
+            customer.patience_end_tick = patience_end_tick
+            order_items = [entities[item_id] for item_id in order_item_ids]
+            if customer.order.items != order_items:
+                level.remove_order(customer)
+                customer.order = Order(*order_items)
+                level.add_order(customer)
+        for entity_id, _, location_code, holder_id, holds_id in changed_items:
+            level_item = entities[entity_id]
+            level_item.holds = entities.get(holds_id)
+            location = _LOCATIONS[location_code]
+            holder = entities.get(holder_id)
+            if (location != item.LOCATION_HAND) and (level.item_locations[level_item] != (location, holder)):
+                level.move_item(level_item, location, holder)
+
+        # Destroy the entities no longer in the view.
+        for customer in list(level.customers):
+            if customer.entity_id not in new_records:
+                customer.destroy()
+        for level_item in list(level.items):
+            if level_item.entity_id not in new_records:
+                if (level_item.holds is not None) and (level_item.holds.entity_id in new_records):
+                    level_item.holds = None
+                level_item.destroy()
+
+    def close(self):
+        '''Stop the worker and release the shared memory.
+
+        '''
+        if self.process.is_alive():
+            self.connection.send(('stop',))
+            self.process.join(5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+        self.memory.close()
+        self.memory.unlink()
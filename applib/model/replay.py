@@ -0,0 +1,148 @@
+'''applib.model.replay -- recording and replaying level inputs
+
+A level is fully determined by its class, its seed, its tick rate and the
+interactions made with it, so a `Recording` of those can replay the run exactly. Interactions
+are stored as `(tick, target id, subdevice index)` tuples, where the target id
+is the `entity_id` of the interacted entity (or of its parent device) and the
+subdevice index is -1 unless a subdevice such as a `Plating` was targeted.
+
+'''
+
+import importlib
+import struct
+
+import applib
+
+from applib.constants import TICK_RATE
+
+
+#: The header of a saved recording: magic, version, seed, end tick, name length, tick rate.
+_HEADER = struct.Struct('<4sHQIHd')
+
+#: A single saved interaction.
+_INPUT = struct.Struct('<IIh')
+
+_MAGIC = b'APRC'
+_VERSION = 2
+
+
+def get_level_name(level_class):
+    '''Return the dotted path of a level class.
+
+    '''
+    return f'{level_class.__module__}.{level_class.__qualname__}'
+
+def get_level_class(level_name):
+    '''Return the level class with the given dotted path.
+
+    '''
+    module_name, class_name = level_name.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class Recording(object):
+    '''The seed and interactions of a single level run.
+
+    '''
+
+    def __init__(self, level_name, seed, inputs=(), end_tick=None, tick_rate=TICK_RATE):
+        '''Create a `Recording` object.
+
+        '''
+        self.level_name = level_name
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.inputs = list(inputs)
+        self.end_tick = end_tick
+
+    @classmethod
+    def start(cls, level):
+        '''Create a recording and attach it to a newly created level.
+
+        '''
+        recording = cls(get_level_name(type(level)), level.seed, tick_rate=level.tick_rate)
+        level.recorder = recording
+        return recording
+
+    def record(self, tick, target):
+        '''Record an interaction; this is called by `Level.interact`.
+
+        '''
+        parent = getattr(target, 'parent', None)
+        if parent is None:
+            self.inputs.append((tick, target.entity_id, -1))
+        else:
+            self.inputs.append((tick, parent.entity_id, parent.subdevices.index(target)))
+        self.end_tick = tick
+
+    def stop(self, level):
+        '''Detach the recording from its level, noting the final tick.
+
+        '''
+        self.end_tick = level.tick_running
+        if level.recorder is self:
+            level.recorder = None
+
+    ## Serialisation
+    ## -------------
+
+    def to_bytes(self):
+        '''Return the recording in its compact binary form.
+
+        '''
+        level_name = self.level_name.encode('utf-8')
+        end_tick = self.end_tick if self.end_tick is not None else 0
+        parts = [_HEADER.pack(_MAGIC, _VERSION, self.seed, end_tick, len(level_name), self.tick_rate), level_name]
+        parts.extend(_INPUT.pack(*entry) for entry in self.inputs)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''Create a recording from its compact binary form.
+
+        '''
+        magic, version, seed, end_tick, name_length, tick_rate = _HEADER.unpack_from(data)
+        if (magic != _MAGIC) or (version != _VERSION):
+            raise ValueError('not a recording')
+        offset = _HEADER.size + name_length
+        level_name = data[_HEADER.size:offset].decode('utf-8')
+        inputs = list(_INPUT.iter_unpack(data[offset:]))
+        return cls(level_name, seed, inputs, end_tick, tick_rate)
+
+    def save(self, path):
+        '''Save the recording to a file.
+
+        '''
+        with open(path, 'wb') as recording_file:
+            recording_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        '''Load a recording from a file.
+
+        '''
+        with open(path, 'rb') as recording_file:
+            return cls.from_bytes(recording_file.read())
+
+
+def replay(recording, level_class=None, end_tick=None):
+    '''Play a recording on a fresh level as fast as possible and return the level.
+
+    The level is left at `end_tick`, which defaults to the end of the recording.
+
+    '''
+    if level_class is None:
+        level_class = get_level_class(recording.level_name)
+    level = level_class(seed=recording.seed, tick_rate=recording.tick_rate)
+    if end_tick is None:
+        end_tick = recording.end_tick or 0
+    for tick, target_id, subdevice_index in recording.inputs:
+        if tick > end_tick:
+            break
+        level.advance_to(tick)
+        target = level.get_entity(target_id)
+        if subdevice_index >= 0:
+            target = target.subdevices[subdevice_index]
+        level.interact(target)
+    level.advance_to(end_tick)
+    return level
@@ -5,7 +5,6 @@
 import re
 
 import applib
-import pyglet
 
 from applib.model import entity
 
@@ -21,7 +20,7 @@ class Scenery(entity.Entity):
 
 
 def load_scenery():
-    indexed_resources = list(pyglet.resource._default_loader._index)
+    indexed_resources = applib.list_resources()
     for resource_name in indexed_resources:
         if match := re.match(rf'{Scenery.group}/([a-z_]+)\.png', resource_name):
             asset_name = match.group(1)
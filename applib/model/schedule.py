@@ -0,0 +1,112 @@
+'''applib.model.schedule -- tick scheduling for level entities
+
+Entities with timed behaviour ask their level to call their `tick` method at
+a given tick, rather than being ticked every tick. A `Scheduler` keeps those
+requests in a heap, so that each tick only touches the entities which are due.
+
+Each entity has at most one request at a time. Replacing or cancelling one
+leaves the old heap entry in place, to be discarded when it reaches the top
+of the heap or when the heap is rebuilt. Entities due at the same tick are
+called in `entity_id` order, which is the order in which the level holds them.
+
+'''
+
+import heapq
+import itertools
+
+import applib
+
+
+class Scheduler(object):
+    '''A queue of the ticks at which entities should next be ticked.
+
+    '''
+
+    def __init__(self):
+        '''Create a `Scheduler` object.
+
+        '''
+        self._heap = []
+        self._entries = {}
+        self._sequence = itertools.count()
+
+    def schedule(self, entity, tick):
+        '''Request that the entity is ticked at the given tick.
+
+        This replaces any earlier request for the entity, and a `tick` of
+        `None` cancels it.
+
+        '''
+        if tick is None:
+            self._entries.pop(entity, None)
+            return
+        entry = [tick, entity.entity_id, next(self._sequence), entity]
+        self._entries[entity] = entry
+        heapq.heappush(self._heap, entry)
+        # Rebuild the heap once it is mostly stale entries.
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+    def cancel(self, entity):
+        '''Cancel any request for the entity.
+
+        '''
+        self._entries.pop(entity, None)
+
+    def get_scheduled_tick(self, entity):
+        '''Return the tick at which the entity is due, or `None`.
+
+        '''
+        entry = self._entries.get(entity)
+        return None if entry is None else entry[0]
+
+    def clear(self):
+        '''Cancel every request.
+
+        '''
+        self._heap.clear()
+        self._entries.clear()
+
+    def reset(self, requests):
+        '''Replace every request with the given `(entity, tick)` pairs at once.
+
+        Pairs whose `tick` is `None` are left out.
+
+        '''
+        self._entries = {}
+        for entity, tick in requests:
+            if tick is not None:
+                self._entries[entity] = [tick, entity.entity_id, next(self._sequence), entity]
+        self._heap = list(self._entries.values())
+        heapq.heapify(self._heap)
+
+    def _discard_stale(self):
+        heap = self._heap
+        entries = self._entries
+        while heap and (entries.get(heap[0][3]) is not heap[0]):
+            heapq.heappop(heap)
+
+    def peek(self):
+        '''Return the earliest tick at which an entity is due, or `None`.
+
+        '''
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop(self, tick):
+        '''Remove and return the next entity due at or before the given tick.
+
+        Returns `None` if no entity is due.
+
+        '''
+        self._discard_stale()
+        heap = self._heap
+        if heap and (heap[0][0] <= tick):
+            entity = heapq.heappop(heap)[3]
+            del self._entries[entity]
+            return entity
+        return None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,407 @@
+'''applib.model.snapshot -- compact binary level snapshots
+
+`Level.snapshot` and `Level.restore` use these functions to capture and
+rewind the full state of a running level. Entities are written in registry
+order and refer to each other by `entity_id`, and classes and customer names
+are written once into a string table at the start of the snapshot.
+
+Snapshots hold only the running state of a level, not its configuration, and
+are meant to be restored by the same version of the game. Since every timer is
+counted in ticks, a snapshot can only be restored into a level running at the
+same tick rate.
+
+'''
+
+import array
+import struct
+
+import applib
+
+from applib.model import device
+from applib.model import entity
+from applib.model import item
+from applib.model import scenery
+
+
+_MAGIC = b'APSN'
+_VERSION = 2
+
+#: Stands in for `None` in integer fields.
+_NONE = -0x80000000
+
+_HEADER = struct.Struct('<4sH')
+_LEVEL = struct.Struct('<diidiiiiid')
+_COUNT = struct.Struct('<I')
+_RANDOM = struct.Struct('<iBd')
+_ENTITY = struct.Struct('<iBH')
+_ITEM = struct.Struct('<i')
+_DEVICE = struct.Struct('<iiidd')
+_CUSTOMER = struct.Struct('<HddiH')
+_SPECIFICATION = struct.Struct('<dHH')
+
+#: The kinds of entity, in the order they are encoded.
+_KIND_ITEM = 0
+_KIND_DEVICE = 1
+_KIND_CUSTOMER = 2
+_KIND_SCENERY = 3
+_KIND_OTHER = 4
+
+
+def _get_kind(level_entity):
+    if isinstance(level_entity, item.Item):
+        return _KIND_ITEM
+    elif isinstance(level_entity, device.Device):
+        return _KIND_DEVICE
+    elif isinstance(level_entity, scenery.Scenery):
+        return _KIND_SCENERY
+    elif level_entity.group == 'customers':
+        return _KIND_CUSTOMER
+    else:
+        return _KIND_OTHER
+
+_class_names = {}
+
+def _get_class_name(cls):
+    if cls not in _class_names:
+        _class_names[cls] = f'{cls.__module__}.{cls.__qualname__}'
+    return _class_names[cls]
+
+_classes_by_name = {}
+
+def _get_class(name):
+    '''Return the entity class with the given name.
+
+    '''
+    if name not in _classes_by_name:
+        pending = [entity.Entity]
+        while len(pending) > 0:
+            cls = pending.pop()
+            _classes_by_name[_get_class_name(cls)] = cls
+            pending.extend(cls.__subclasses__())
+    return _classes_by_name[name]
+
+def _id_of(level_entity):
+    return _NONE if level_entity is None else level_entity.entity_id
+
+
+def dump(level):
+    '''Return the state of the level as bytes.
+
+    '''
+    names = []
+    name_indexes = {}
+
+    def name_index(name):
+        if name not in name_indexes:
+            name_indexes[name] = len(names)
+            names.append(name)
+        return name_indexes[name]
+
+    # Encode the entities.
+    entity_parts = [_COUNT.pack(len(level.entities))]
+    for level_entity in level.entities:
+        kind = _get_kind(level_entity)
+        entity_parts.append(_ENTITY.pack(level_entity.entity_id, kind,
+            name_index(_get_class_name(type(level_entity)))))
+        if kind == _KIND_ITEM:
+            entity_parts.append(_ITEM.pack(_id_of(level_entity.holds)))
+        elif kind == _KIND_DEVICE:
+            ticks_remaining = level_entity.ticks_remaining
+            location_x, location_y = level.device_locations.get(level_entity, (float('nan'),) * 2)
+            entity_parts.append(_DEVICE.pack(
+                _id_of(level_entity.current_item),
+                _NONE if ticks_remaining is None else ticks_remaining,
+                _id_of(level_entity.parent),
+                location_x,
+                location_y,
+            ))
+        elif kind == _KIND_CUSTOMER:
+            order_items = level_entity.order.items
+            entity_parts.append(_CUSTOMER.pack(
+                name_index(level_entity.name),
+                level_entity.patience_ticks,
+                level_entity.start_patience,
+                level_entity.start_patience_ticks,
+                len(order_items),
+            ))
+            entity_parts.append(struct.pack(f'<{len(order_items)}i', *[i.entity_id for i in order_items]))
+
+    # Encode the customers still to arrive.
+    specification_parts = [_COUNT.pack(len(level.customer_specification))]
+    for specification in level.customer_specification:
+        if specification is None:
+            specification_parts.append(_SPECIFICATION.pack(float('nan'), 0xffff, 0))
+            continue
+        time, customer_type, order = specification
+        specification_parts.append(_SPECIFICATION.pack(time,
+            0xffff if customer_type is None else name_index(customer_type), len(order)))
+        specification_parts.append(struct.pack(f'<{len(order)}H',
+            *[name_index(_get_class_name(item_class)) for item_class in order]))
+
+    # Encode the random number stream, unless it is unchanged since last time.
+    random_stream = level.random
+    encoded_state = random_stream.encoded_state
+    if (encoded_state is None) or (encoded_state[0] != random_stream.state_version):
+        version, internal_state, gauss_next = random_stream.getstate()
+        encoded_state = random_stream.encoded_state = (random_stream.state_version, b''.join([
+            _RANDOM.pack(version, gauss_next is not None, gauss_next or 0.0),
+            _COUNT.pack(len(internal_state)),
+            array.array('I', internal_state).tobytes(),
+        ]))
+    random_part = encoded_state[1]
+
+    # Encode the level itself.
+    next_customer_ticks = getattr(level, 'next_customer_ticks', None)
+    level_part = _LEVEL.pack(
+        level.tick_rate,
+        level.tick_running,
+        level.next_entity_id,
+        level.score,
+        level.sold_cakes,
+        level.happy_customer,
+        level.sad_customer,
+        _id_of(level.held_item),
+        _NONE if next_customer_ticks is None else next_customer_ticks,
+        level.alt_suspicion_rate,
+    )
+
+    encoded_names = '\n'.join(names).encode('utf-8')
+    return b''.join([
+        _HEADER.pack(_MAGIC, _VERSION),
+        level_part,
+        _COUNT.pack(len(encoded_names)),
+        encoded_names,
+        random_part,
+        *entity_parts,
+        *specification_parts,
+    ])
+
+
+def _load_entities_in_place(level, data, offset, names):
+    '''Update the entities of the level from a snapshot holding the same ones.
+
+    Returns the offset after the entities, the devices and customers, and
+    whether any order has changed, or `None` if the snapshot holds different
+    entities, in which case some may have been partly updated.
+
+    '''
+    Order = applib.model.level.Order
+    old_entities = level.entities_by_id
+    entity_count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    if entity_count != len(old_entities):
+        return None
+    tick_running = level.tick_running
+    timed_entities = []
+    orders_changed = False
+    for _ in range(entity_count):
+        entity_id, kind, class_index = _ENTITY.unpack_from(data, offset)
+        offset += _ENTITY.size
+        level_entity = old_entities.get(entity_id)
+        if type(level_entity) is not _get_class(names[class_index]):
+            return None
+        if kind == _KIND_ITEM:
+            holds_id, = _ITEM.unpack_from(data, offset)
+            offset += _ITEM.size
+            level_entity.holds = old_entities.get(holds_id)
+        elif kind == _KIND_DEVICE:
+            current_item_id, ticks_remaining = _DEVICE.unpack_from(data, offset)[:2]
+            offset += _DEVICE.size
+            level_entity.current_item = old_entities.get(current_item_id)
+            level_entity.timer_end_tick = None if ticks_remaining == _NONE else tick_running + ticks_remaining
+            timed_entities.append(level_entity)
+        elif kind == _KIND_CUSTOMER:
+            name_index, patience_ticks, start_patience, start_patience_ticks, order_length = _CUSTOMER.unpack_from(data, offset)
+            offset += _CUSTOMER.size
+            order_items = [old_entities.get(item_id) for item_id in struct.unpack_from(f'<{order_length}i', data, offset)]
+            offset += 4 * order_length
+            level_entity.name = names[name_index]
+            if level_entity.order.items != order_items:
+                level_entity.order = Order(*order_items)
+                orders_changed = True
+            level_entity.patience_end_tick = tick_running + patience_ticks
+            level_entity.start_patience = start_patience
+            level_entity.start_patience_ticks = start_patience_ticks
+            timed_entities.append(level_entity)
+    return offset, timed_entities, orders_changed
+
+def _load_entities(level, data, offset, names, previous_tick):
+    '''Replace the entities of the level with those in a snapshot.
+
+    Entities which still exist with the same id and class are reused. Those
+    which do not are detached from the level, and customers among them keep
+    the patience they had at `previous_tick`. Returns the same as
+    `_load_entities_in_place`.
+
+    '''
+    Customer = applib.model.level.Customer
+    Order = applib.model.level.Order
+    tick_running = level.tick_running
+    entity_count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    old_entities = level.entities_by_id
+    records = []
+    for _ in range(entity_count):
+        entity_id, kind, class_index = _ENTITY.unpack_from(data, offset)
+        offset += _ENTITY.size
+        cls = _get_class(names[class_index])
+        level_entity = old_entities.get(entity_id)
+        if type(level_entity) is not cls:
+            level_entity = object.__new__(cls)
+            level_entity._sprite = None
+            level_entity.level = level
+            level_entity.entity_id = entity_id
+            if kind == _KIND_DEVICE:
+                level_entity._sound_player = None
+                level_entity.retime()
+            elif kind == _KIND_CUSTOMER:
+                level_entity.detached_patience_ticks = None
+        if kind == _KIND_ITEM:
+            fields = _ITEM.unpack_from(data, offset)
+            offset += _ITEM.size
+        elif kind == _KIND_DEVICE:
+            fields = _DEVICE.unpack_from(data, offset)
+            offset += _DEVICE.size
+        elif kind == _KIND_CUSTOMER:
+            fields = _CUSTOMER.unpack_from(data, offset)
+            offset += _CUSTOMER.size
+            order_length = fields[-1]
+            fields += struct.unpack_from(f'<{order_length}i', data, offset)
+            offset += 4 * order_length
+        else:
+            fields = ()
+        records.append((level_entity, kind, fields))
+
+    new_entities = {record[0].entity_id: record[0] for record in records}
+    get_entity = lambda entity_id: None if entity_id == _NONE else new_entities[entity_id]
+
+    # Detach any entities that no longer exist.
+    for entity_id, old_entity in old_entities.items():
+        if new_entities.get(entity_id) is not old_entity:
+            if isinstance(old_entity, Customer):
+                old_entity.detached_patience_ticks = old_entity.patience_end_tick - previous_tick
+            old_entity.level = None
+
+    # Link the entities back together.
+    level.device_locations = {}
+    timed_entities = []
+    for level_entity, kind, fields in records:
+        if kind == _KIND_ITEM:
+            level_entity.holds = get_entity(fields[0])
+        elif kind == _KIND_DEVICE:
+            current_item_id, ticks_remaining, parent_id, location_x, location_y = fields
+            level_entity.current_item = get_entity(current_item_id)
+            level_entity.timer_end_tick = None if ticks_remaining == _NONE else tick_running + ticks_remaining
+            if isinstance(level_entity, device.MultiPlating):
+                level_entity.subdevices = []
+            if parent_id != _NONE:
+                parent = get_entity(parent_id)
+                level_entity.parent = parent
+                level_entity.item_position = parent.subpositions[len(parent.subdevices)]
+                parent.subdevices.append(level_entity)
+            if location_x == location_x:
+                level.device_locations[level_entity] = (location_x, location_y)
+            timed_entities.append(level_entity)
+        elif kind == _KIND_CUSTOMER:
+            name_index, patience_ticks, start_patience, start_patience_ticks, order_length = fields[:5]
+            level_entity.name = names[name_index]
+            level_entity.order = Order(*[get_entity(item_id) for item_id in fields[5:]])
+            level_entity.patience_end_tick = tick_running + patience_ticks
+            level_entity.start_patience = start_patience
+            level_entity.start_patience_ticks = start_patience_ticks
+            timed_entities.append(level_entity)
+
+    # Rebuild the registry.
+    groups = {'customers': [], 'devices': [], 'items': [], 'scenery': []}
+    for level_entity, kind, fields in records:
+        groups[level_entity.group].append(level_entity)
+    level.entities = entity.EntityList(record[0] for record in records)
+    for group, group_entities in groups.items():
+        setattr(level, group, entity.EntityList(group_entities))
+    level.devices_by_name = {}
+    level.devices_by_class = {}
+    for level_device in level.devices:
+        level.add_device_index(level_device)
+    level.entities_by_id = new_entities
+    return offset, timed_entities, True
+
+def load(level, data):
+    '''Restore the state of the level from bytes returned by `dump`.
+
+    Entities which still exist with the same id and class are updated in
+    place, so that anything holding on to them stays valid.
+
+    '''
+    data = memoryview(data)
+    magic, version = _HEADER.unpack_from(data)
+    if (magic != _MAGIC) or (version != _VERSION):
+        raise ValueError('not a level snapshot')
+    offset = _HEADER.size
+
+    (tick_rate, tick_running, next_entity_id, score, sold_cakes, happy_customer, sad_customer,
+        held_item_id, next_customer_ticks, alt_suspicion_rate) = _LEVEL.unpack_from(data, offset)
+    offset += _LEVEL.size
+    if tick_rate != level.tick_rate:
+        raise ValueError(f'snapshot tick rate {tick_rate:g} does not match level tick rate {level.tick_rate:g}')
+
+    names_length, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    names = bytes(data[offset:offset + names_length]).decode('utf-8').split('\n')
+    offset += names_length
+
+    # Decode the random number stream, unless it is already in that state.
+    random_length, = _COUNT.unpack_from(data, offset + _RANDOM.size)
+    random_end = offset + _RANDOM.size + _COUNT.size + 4 * random_length
+    random_stream = level.random
+    encoded_state = random_stream.encoded_state
+    if not ((encoded_state is not None) and (encoded_state[0] == random_stream.state_version)
+            and (encoded_state[1] == bytes(data[offset:random_end]))):
+        random_version, has_gauss_next, gauss_next = _RANDOM.unpack_from(data, offset)
+        internal_state = array.array('I')
+        internal_state.frombytes(data[offset + _RANDOM.size + _COUNT.size:random_end])
+        random_stream.setstate((random_version, tuple(internal_state), gauss_next if has_gauss_next else None))
+        random_stream.encoded_state = (random_stream.state_version, bytes(data[offset:random_end]))
+    offset = random_end
+
+    previous_tick = level.tick_running
+    level.tick_running = tick_running
+
+    # Decode the entities, in place if they are the same ones as before, such
+    # as when rewinding a level. Timers are written directly, so that nothing
+    # is journalled or scheduled entity by entity.
+    result = _load_entities_in_place(level, data, offset, names)
+    if result is None:
+        result = _load_entities(level, data, offset, names, previous_tick)
+    offset, timed_entities, orders_changed = result
+    if orders_changed:
+        level.customers_by_order_class = {}
+        for customer in level.customers:
+            level.add_order(customer)
+    level.scheduler.reset([(level_entity, level_entity.get_next_tick()) for level_entity in timed_entities])
+
+    # Decode the customers still to arrive.
+    specification_count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    customer_specification = []
+    for _ in range(specification_count):
+        time, name_index, order_length = _SPECIFICATION.unpack_from(data, offset)
+        offset += _SPECIFICATION.size
+        if time != time:
+            customer_specification.append(None)
+            continue
+        order = [_get_class(names[index]) for index in struct.unpack_from(f'<{order_length}H', data, offset)]
+        offset += 2 * order_length
+        customer_type = None if name_index == 0xffff else names[name_index]
+        customer_specification.append((time, customer_type, order))
+    level.customer_specification = customer_specification
+
+    # Restore the level itself.
+    level.next_entity_id = next_entity_id
+    level.score = score
+    level.sold_cakes = sold_cakes
+    level.happy_customer = happy_customer
+    level.sad_customer = sad_customer
+    level._held_item = level.entities_by_id.get(held_item_id)
+    level.alt_suspicion_rate = alt_suspicion_rate
+    if hasattr(level, 'next_customer_ticks'):
+        level.next_customer_ticks = None if next_customer_ticks == _NONE else next_customer_ticks
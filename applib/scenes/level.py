@@ -27,6 +27,7 @@ from applib.constants import CUSTOMER_SCALE
 from applib.constants import CUSTOMER_WALK_SPEED
 from applib.constants import DEBUG
 from applib.constants import DEVICE_SCALE
+from applib.constants import INTERPOLATION_SNAP_DISTANCE
 from applib.constants import ITEM_SCALE
 from applib.constants import MAX_SCORE_FROM_CUSTOMER
 from applib.constants import PROGRESS_BAR_HEIGHT
@@ -129,12 +130,19 @@ class LevelScene(object):
             if app.settings.level < 0:
                 level = applib.model.level.TestLevel
             else:
-                level = applib.model.level.default_level
+                level = applib.model.level.get_level_class(applib.model.level.default_level)
                 for _ in range(app.settings.level - 1):
-                    level = level.next_level
-        self.level = level()
-        applib.model.scenery.Counter(self.level)
-        self.level.background_scenery(self.level)
+                    level = applib.model.level.get_level_class(level.next_level)
+        self.level = level(tick_rate=app.controller.tick_rate)
+        self.recording = applib.model.replay.Recording.start(self.level)
+
+        #: The worker simulating the level in another process, if enabled.
+        self.level_worker = None
+        if app.settings.remote_level:
+            self.level_worker = applib.model.remote.LevelWorker(self.level)
+
+        #: The reader of the level's journal, drained once a tick to update the sprites.
+        self.journal_reader = self.level.subscribe()
         
         self.level.push_handlers(self)
 
@@ -173,6 +181,10 @@ class LevelScene(object):
 
     def on_scene_end(self):
         self.bg_player.pause()
+        self.keep_static_sprites()
+        self.level.unsubscribe(self.journal_reader)
+        if self.level_worker is not None:
+            self.level_worker.close()
 
     ## Model
     ## -----
@@ -181,8 +193,110 @@ class LevelScene(object):
         self.sprites_by_entity = {}
         self.entities_by_sprite = {}
         self.persisting_sprites = {}
+        #: The entities whose sprites to update in the next tick, as an ordered set.
+        self.changed_entities = {}
+        #: The entities whose sprites were animating in the last tick, as an ordered set.
+        self.animating_entities = {}
+        #: The holder of each item when its sprite was last updated.
+        self.item_holders = {}
+        self.reuse_static_sprites()
+        self.load_entities()
+
+    def load_entities(self):
+        '''Update the sprites of every entity in the level.
+
+        '''
         for entity in self.level.entities:
             self.update_sprite(entity)
+            self.changed_entities[entity] = None
+        self.item_holders = {
+            entity: (None if holder is self.level else holder)
+            for entity, (_, holder) in self.level.item_locations.items()
+        }
+
+    def remove_sprite(self, sprite):
+        '''Remove a sprite, and the entity it shows, from the scene.
+
+        '''
+        sprite.stop_animation()
+        if sprite in self.interface.sprites:
+            self.interface.sprites.remove(sprite)
+        entity = self.entities_by_sprite.pop(sprite, None)
+        # A restored entity may already be back in the level with a new sprite.
+        if (entity is not None) and (self.sprites_by_entity.get(entity) is sprite):
+            del self.sprites_by_entity[entity]
+            self.changed_entities.pop(entity, None)
+            self.animating_entities.pop(entity, None)
+
+    #: The kinds of journal change which move an item.
+    _item_moves = frozenset([
+        applib.model.journal.ITEM_TO_HAND,
+        applib.model.journal.ITEM_TO_DEVICE,
+        applib.model.journal.ITEM_TO_PLATE,
+        applib.model.journal.ITEM_TO_CUSTOMER,
+        applib.model.journal.ITEM_LOOSE,
+    ])
+
+    def update_level_sprites(self):
+        '''Add and remove sprites for the entities created and destroyed since the last tick.
+
+        The entities changed, and the previous and new holders of the items
+        moved, are added to `changed_entities`.
+
+        '''
+        changed_entities = self.changed_entities
+        item_holders = self.item_holders
+        for _, kind, subject, detail in self.journal_reader.drain():
+            if kind == applib.model.journal.ENTITY_CREATED:
+                self.update_sprite(subject)
+                changed_entities[subject] = None
+            elif kind == applib.model.journal.ENTITY_DESTROYED:
+                holder = item_holders.pop(subject, None)
+                if holder is not None:
+                    changed_entities[holder] = None
+                sprite = self.sprites_by_entity.get(subject)
+                if (sprite is not None) and (sprite not in self.persisting_sprites):
+                    self.remove_sprite(sprite)
+            elif kind in self._item_moves:
+                holder = item_holders.get(subject)
+                if holder is not None:
+                    changed_entities[holder] = None
+                item_holders[subject] = detail
+                if detail is not None:
+                    changed_entities[detail] = None
+                changed_entities[subject] = None
+            elif kind == applib.model.journal.LEVEL_RESTORED:
+                self.load_entities()
+                found_sprites = set(entity.sprite for entity in self.level.entities) | set(self.persisting_sprites)
+                for sprite in list(self.interface.sprites):
+                    if sprite not in found_sprites:
+                        self.remove_sprite(sprite)
+
+    #: The device and scenery sprites of the last level, by level class, entity id and entity class.
+    _static_sprites = {}
+
+    def keep_static_sprites(self):
+        '''Keep the device and scenery sprites for the next level of the same class.
+
+        '''
+        static_entities = list(self.level.devices) + list(self.level.scenery)
+        type(self)._static_sprites = {
+            (type(self.level), entity.entity_id, type(entity)): entity._sprite
+            for entity in static_entities if entity._sprite is not None
+        }
+
+    def reuse_static_sprites(self):
+        '''Give devices and scenery the sprites kept from the last level, if it matches.
+
+        Every level of a class creates its devices and scenery in the same
+        order, so their entity ids line up and retrying a level needs no new
+        sprites.
+
+        '''
+        for entity in list(self.level.devices) + list(self.level.scenery):
+            sprite = self._static_sprites.get((type(self.level), entity.entity_id, type(entity)))
+            if sprite is not None:
+                entity._sprite = sprite
 
     _entity_properties = [
         (applib.model.level.Customer, CUSTOMER_SCALE, -1),
@@ -288,6 +402,7 @@ class LevelScene(object):
         # Have all the customers reposition.
         customer_count = len(self.level.customers)
         for index, other_customer in enumerate(self.level.customers):
+            self.animating_entities[other_customer] = None
             move_x = CUSTOMER_POSITIONS[customer_count][index]
             other_customer.sprite._target_offset_x = move_x * view_height
             if other_customer is customer:
@@ -299,6 +414,7 @@ class LevelScene(object):
         # Have the leaving customer walk off.
         customer.sprite.layer = -1.5
         customer.sprite._target_offset_x = -view_width
+        self.animating_entities[customer] = None
         self.persisting_sprites[customer.sprite] = (lambda c=customer:
             abs(c.sprite.animation_offset_x) > view_width / 2)
 
@@ -306,6 +422,7 @@ class LevelScene(object):
         customer_count = len(self.level.customers)
         for index, other_customer in enumerate(self.level.customers):
             move_x = CUSTOMER_POSITIONS[customer_count][index]
+            self.animating_entities[other_customer] = None
             if other_customer is not customer:
                 other_customer.sprite.layer = -1
                 other_customer.sprite._target_offset_x = move_x * view_height
@@ -328,7 +445,7 @@ class LevelScene(object):
     def on_tick(self):
 
         score_ratio = self.level.get_score_ratio()
-        self._score_ratio += (score_ratio - self._score_ratio) * 0.03
+        self._score_ratio += (score_ratio - self._score_ratio) * 0.03 * self.level.tick_scale
 
         if self.dialogue_overlay.visible:
             # Do dialogue things here.
@@ -337,40 +454,48 @@ class LevelScene(object):
             pass
         else:
             # Update the level first.
-            self.level.tick()
+            if self.level_worker is not None:
+                self.level_worker.tick()
+            else:
+                self.level.tick()
 
         view_width, view_height = self.interface.get_content_size()
 
-        # Update the sprites for all entities in the level.
-        for entity in self.level.entities:
-            self.update_sprite(entity)
+        # Update the sprites for the entities created and destroyed in the level.
+        self.update_level_sprites()
 
-        # Depersist any persisting sprites whose check passes.
+        # Depersist any persisting sprites whose check passes, removing them
+        # unless their entity is still in the level.
         for sprite, persist_check in list(self.persisting_sprites.items()):
             if persist_check():
                 del self.persisting_sprites[sprite]
-        
-        # Remove sprites for missing entities from the scene.
-        found_sprites = set(entity.sprite for entity in self.level.entities) | set(self.persisting_sprites)
-        for sprite in list(self.interface.sprites):
-            if sprite not in found_sprites:
-                sprite.stop_animation()
-                self.interface.sprites.remove(sprite)
-                if sprite in self.entities_by_sprite:
-                    entity = self.entities_by_sprite[sprite]
-                    del self.entities_by_sprite[sprite]
-                    del self.sprites_by_entity[entity]
-
-        # Update remaining sprites.
-        processed_items = []
-        for sprite, entity in self.entities_by_sprite.items():
-            
+                entity = self.entities_by_sprite.get(sprite)
+                if (entity is None) or (entity.level is not self.level) or (entity.sprite is not sprite):
+                    self.remove_sprite(sprite)
+
+        # Update the sprites of the entities which changed or are still
+        # animating, remembering those which will animate in the next tick.
+        updated_entities = self.changed_entities
+        updated_entities.update(self.animating_entities)
+        self.changed_entities = {}
+        self.animating_entities = {}
+        updated_items = {}
+        for entity in updated_entities:
+            sprite = self.sprites_by_entity.get(entity)
+            if sprite is None:
+                continue
+            if isinstance(entity, applib.model.item.Item):
+                updated_items[entity] = None
+
             # Move order sprites to follow their customer.
             if isinstance(entity, applib.model.level.Customer):
+                customer_is_moving = (sprite._animation_offset_x != sprite._target_offset_x)
+                if customer_is_moving:
+                    self.animating_entities[entity] = None
                 entity.sprite.overlay_function = self.draw_customer_overlay
                 order_count = len(entity.order.items)
                 for index, item in enumerate(entity.order.items):
-                    processed_items.append(item)
+                    updated_items[item] = None
                     order_arc_angle = CUSTOMER_ORDER_POSITIONS[order_count][index]
                     order_arc_radius = CUSTOMER_ORDER_HEIGHT * view_height + sprite.height / 2
                     relative_position_x = order_arc_radius * math.sin(math.radians(order_arc_angle))
@@ -404,7 +529,6 @@ class LevelScene(object):
                     sprite.update_foreground_sprite()
                     fg = sprite.foreground_sprite
 
-                    customer_is_moving = (sprite._animation_offset_x != sprite._target_offset_x)
                     paws_on_counter = (fg.animation_offset_y == 0.0 and fg.layer == 0.1)
                     paws_are_animating = (entity in self.paw_animations) and (self.paw_animations[entity] in app.animation)
                     customer_is_on_right = (entity in self.level.customers) and (self.level.customers.index(entity) > 2)
@@ -430,8 +554,9 @@ class LevelScene(object):
                                 animation.WaitAnimation(0.0, lambda fg=fg: setattr(fg, 'layer', 0.1)),
                                 animation.AttributeAnimation(fg, 'animation_offset_y', 0.0, 0.4, 'symmetric'),
                             ).start()
-                        
-            
+                    if entity in self.paw_animations and self.paw_animations[entity] in app.animation:
+                        self.animating_entities[entity] = None
+
             # Move current item sprites to their device.
             if isinstance(entity, applib.model.device.Device):
 
@@ -447,6 +572,7 @@ class LevelScene(object):
                         texture_data = texture.get_image_data().get_data()
                         self._texture_data[texture] = texture_data
                     has_alt_sprite = True
+                    self.animating_entities[entity] = None
                 else:
                     texture = entity.texture
                 if texture != sprite._texture:
@@ -456,7 +582,7 @@ class LevelScene(object):
                 if entity.sprite.x > view_width / 2 and entity.sprite.scale_x > 0:
                     entity.sprite.scale_x *= -1
                 if entity.current_item is not None:
-                    processed_items.append(entity.current_item)
+                    updated_items[entity.current_item] = None
                     flipped = (entity.sprite.x > view_width / 2)
                     item_x, item_y = entity.item_position
                     entity.current_item.sprite.layer = sprite.layer + 0.2
@@ -467,27 +593,31 @@ class LevelScene(object):
                     )
 
         # Postprocessing for items.
-        for sprite, entity in self.entities_by_sprite.items():
-            if isinstance(entity, applib.model.item.Item):
-                if entity.holds is not None:
-                    processed_items.append(entity.holds)
-                    hold_sprite = entity.holds.sprite
-                    item_x, item_y = entity.holds_position
-                    entity.holds.sprite.layer = sprite.layer + 0.2
-                    entity.holds.sprite.visible = (entity is not self.level.held_item)
-                    entity.holds.sprite.update(
-                        x = sprite.x + item_x * sprite.width,
-                        y = sprite.y + item_y * sprite.height,
-                    )
-
-        # Postpostprocessing for items.
-        for sprite, entity in self.entities_by_sprite.items():
-            if isinstance(entity, applib.model.item.Item):
-                if entity not in processed_items:
+        held_items = {}
+        for entity in updated_items:
+            sprite = self.sprites_by_entity.get(entity)
+            if (sprite is not None) and (entity.holds is not None):
+                held_items[entity.holds] = None
+                item_x, item_y = entity.holds_position
+                entity.holds.sprite.layer = sprite.layer + 0.2
+                entity.holds.sprite.visible = (entity is not self.level.held_item)
+                entity.holds.sprite.update(
+                    x = sprite.x + item_x * sprite.width,
+                    y = sprite.y + item_y * sprite.height,
+                )
+        updated_items.update(held_items)
+
+        # Postpostprocessing for items not placed above.
+        item_locations = self.level.item_locations
+        for entity in updated_items:
+            sprite = self.sprites_by_entity.get(entity)
+            if sprite is not None:
+                location, _ = item_locations.get(entity, (applib.model.item.LOCATION_LOOSE, None))
+                if location == applib.model.item.LOCATION_HAND:
+                    sprite.visible = False
+                elif location == applib.model.item.LOCATION_LOOSE:
                     sprite.visible = True
-                    if entity is self.level.held_item:
-                        sprite.visible = False
-                    elif DEBUG:
+                    if DEBUG and not entity.can_be_loose:
                         self.level.debug_print()
 
     ## Dialogue
@@ -582,10 +712,7 @@ class LevelScene(object):
                 break
 
             if command == 'next_level':
-                if value:
-                    next_level = getattr(applib.model.level, value)
-                else:
-                    next_level = self.level.next_level
+                next_level = applib.model.level.get_level_class(value or self.level.next_level)
                 self.fade_animation = animation.QueuedAnimation(
                     animation.ParallelAnimation(
                         animation.AttributeAnimation(self.bg_player, 'volume', 0.0, 2.0),
@@ -761,7 +888,10 @@ class LevelScene(object):
                                     best_distance = distance
                                     best_index = index
                             target = target.subdevices[best_index]
-                        self.level.interact(target)
+                        if self.level_worker is not None:
+                            self.level_worker.interact(target)
+                        else:
+                            self.level.interact(target)
                 self._clicked_sprite = None
 
     ## Debugging
@@ -788,6 +918,11 @@ class LevelScene(object):
             self.level.dispatch_event('on_level_success')
         if DEBUG and symbol == pyglet.window.key.T:
             app.controller.switch_scene(LevelScene, applib.model.level.TestLevel)
+        if DEBUG and symbol == pyglet.window.key.R:
+            self.recording.end_tick = self.level.tick_running
+            recording_path = f'{type(self.level).__name__}-{self.level.seed}-{self.level.tick_running}.rec'
+            self.recording.save(recording_path)
+            print(f'saved recording: {recording_path}')
 
     ## Rendering
     ## ---------
@@ -807,6 +942,15 @@ class LevelScene(object):
         else:
             app.window.set_mouse_cursor(None)
 
+    def is_idle(self):
+        '''Return whether the scene will look the same until the next input.
+
+        The level is paused while dialogue is shown, leaving only the score bar
+        to settle and the animations, which the controller checks itself.
+
+        '''
+        return self.dialogue_overlay.visible and (abs(self.level.get_score_ratio() - self._score_ratio) < 1e-3)
+
     def on_draw(self):
 
         glEnable(GL_BLEND)
@@ -828,6 +972,12 @@ class LevelScene(object):
         layer_key = (lambda sprite: sprite.layer)
         self.interface.sprites.sort(key=layer_key)
 
+        # Draw the sprites between where the last tick moved them from and to.
+        snap_distance = INTERPOLATION_SNAP_DISTANCE * h
+        for sprite in self.interface.sprites:
+            if isinstance(sprite, applib.engine.sprite.EntitySprite):
+                sprite.interpolate(app.controller.tick_fraction, snap_distance)
+
         # Render the interface.
         self.interface.draw()
 
@@ -9,7 +9,6 @@ import applib
 import pyglet
 
 from applib import app
-from applib.constants import TICK_LENGTH
 from applib.engine import animation
 from applib.engine import music
 from applib.engine import sound
@@ -63,7 +62,7 @@ class SpiralAnimation(animation.Animation):
         self.tilt = None
 
     def tick(self):
-        self.elapsed += TICK_LENGTH
+        self.elapsed += app.controller.tick_length
         lerp = max(0, min(1, self.elapsed / self.duration))
         lerp = 3 * lerp ** 2 - 2 * lerp ** 3
         theta = self.angle * (1 - lerp)
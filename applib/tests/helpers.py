@@ -0,0 +1,31 @@
+'''applib.tests.helpers -- shared helpers for the test modules
+
+'''
+
+from applib.model import level
+
+
+class ImmortalEndlessLevel(level.EndlessLevel):
+    '''An `EndlessLevel` which never runs out of suspicion time.
+
+    '''
+    alt_suspicion_time = 1e9
+
+
+def full_state(level):
+    '''Return everything that should match between two equivalent levels.
+
+    '''
+    return (
+        level.tick_running,
+        level.score,
+        level.sold_cakes,
+        level.happy_customer,
+        level.sad_customer,
+        level.random.getstate(),
+        getattr(level.held_item, 'entity_id', None),
+        [(e.entity_id, type(e), getattr(e, 'name', None)) for e in level.entities],
+        [(d.entity_id, getattr(d.current_item, 'entity_id', None), d.ticks_remaining) for d in level.devices],
+        [(c.entity_id, c.patience_ticks, [i.entity_id for i in c.order.items]) for c in level.customers],
+        [(i.entity_id, getattr(i.holds, 'entity_id', None)) for i in level.items],
+    )
@@ -0,0 +1,90 @@
+import types
+
+import pytest
+
+import applib
+
+from applib import app
+from applib.constants import HEADLESS
+
+
+pytestmark = pytest.mark.skipif(HEADLESS, reason='animations need pyglet')
+
+
+@pytest.fixture
+def animation(monkeypatch):
+    from applib.engine import animation
+    monkeypatch.setattr(app, 'animation', animation.AnimationManager())
+    monkeypatch.setattr(app, 'controller', types.SimpleNamespace(tick_length=0.25))
+    return animation
+
+
+def run_ticks(count):
+    for _ in range(count):
+        app.animation.on_tick()
+
+
+def test_manager_keeps_start_order(animation):
+    first = animation.WaitAnimation(1.0).start()
+    second = animation.WaitAnimation(1.0).start()
+    first.start()
+    assert list(app.animation) == [first, second]
+    first.stop()
+    assert first not in app.animation
+    assert list(app.animation) == [second]
+
+def test_queued_animations_run_in_turn(animation):
+    calls = []
+    thing = types.SimpleNamespace(value=0.0)
+    queued = animation.QueuedAnimation(
+        animation.AttributeAnimation(thing, 'value', 1.0, 0.5),
+        animation.WaitAnimation(0.5, calls.append, 'waited'),
+    ).start()
+    run_ticks(1)
+    assert thing.value == 0.5
+    run_ticks(1)
+    assert thing.value == 1.0
+    run_ticks(1)
+    assert calls == []
+    run_ticks(1)
+    assert calls == ['waited']
+    assert queued in app.animation
+    run_ticks(1)
+    assert len(app.animation) == 0
+
+def test_parallel_animation_stops_with_its_last_child(animation):
+    short = animation.WaitAnimation(0.25)
+    long = animation.WaitAnimation(0.75)
+    parallel = animation.ParallelAnimation(short, long).start()
+    run_ticks(1)
+    assert short not in app.animation
+    assert parallel in app.animation
+    run_ticks(3)
+    assert parallel not in app.animation
+    assert len(app.animation) == 0
+
+def test_shared_children_tell_every_parent(animation):
+    calls = []
+    shared = animation.WaitAnimation(0.5).add_stop_callback(calls.append)
+    first = animation.ParallelAnimation(shared).start()
+    second = animation.ParallelAnimation(shared, animation.WaitAnimation(0.25)).start()
+    queued = animation.QueuedAnimation(shared).start()
+    run_ticks(3)
+    assert calls == [shared]
+    assert first not in app.animation
+    assert second not in app.animation
+    run_ticks(1)
+    assert queued not in app.animation
+    assert len(app.animation) == 0
+
+def test_stopping_runs_stop_states_and_chains(animation):
+    calls = []
+    following = animation.WaitAnimation(1.0)
+    queued = animation.QueuedAnimation(
+        animation.WaitAnimation(1.0, calls.append, 'first'),
+        animation.WaitAnimation(1.0, calls.append, 'second'),
+    ).queue(following).start()
+    run_ticks(1)
+    queued.stop()
+    assert calls == ['first', 'second']
+    assert list(app.animation) == [following]
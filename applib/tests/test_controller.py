@@ -0,0 +1,114 @@
+import types
+
+import pytest
+
+import applib
+
+from applib import app
+from applib.constants import BACKGROUND_FRAME_RATE
+from applib.constants import FRAME_RATE
+from applib.constants import HEADLESS
+from applib.constants import MAX_CATCH_UP_TICKS
+
+
+pytestmark = pytest.mark.skipif(HEADLESS, reason='the controller needs pyglet')
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    from applib.engine import controller
+    monkeypatch.setattr(app, 'scene', types.SimpleNamespace(is_idle=(lambda: False)))
+    monkeypatch.setattr(app, 'window', types.SimpleNamespace(visible=True))
+    test_controller = controller.Controller.__new__(controller.Controller)
+    # A tick rate whose fractions of a tick add up exactly.
+    test_controller.tick_rate = 64.0
+    test_controller.tick_length = 1.0 / 64.0
+    test_controller.next_tick = 0.0
+    test_controller.ticks_run = 0
+    test_controller.ticks_dropped = 0
+    test_controller.tick_fraction = 1.0
+    test_controller.max_catch_up_ticks = MAX_CATCH_UP_TICKS
+    test_controller.active = test_controller.shown = True
+    test_controller.sleeping = False
+    test_controller.frame_pending = False
+    ticks = []
+    test_controller.dispatch_event = (lambda event_type: ticks.append(event_type))
+    test_controller.ticks = ticks
+    return test_controller
+
+
+def test_ticks_keep_up_with_time(controller):
+    controller.update(0.0)
+    for _ in range(12):
+        controller.update(0.25 / 64.0)
+    assert controller.ticks == ['on_tick'] * 4
+    assert controller.ticks_dropped == 0
+
+def test_frames_between_ticks_are_interpolated(controller):
+    controller.update(0.0)
+    controller.update(0.25 / 64.0)
+    assert controller.tick_fraction == pytest.approx(0.25)
+    controller.update(0.5 / 64.0)
+    assert controller.tick_fraction == pytest.approx(0.75)
+    assert len(controller.ticks) == 1
+
+def test_catching_up_is_limited(controller):
+    controller.update(0.0)
+    controller.update(1.0 + 0.5 / 64.0)
+    assert controller.ticks_run == len(controller.ticks) == 1 + MAX_CATCH_UP_TICKS
+    assert controller.ticks_dropped == 64 - MAX_CATCH_UP_TICKS
+    assert controller.tick_fraction == pytest.approx(0.5)
+    controller.update(0.5 / 64.0)
+    assert controller.ticks_run == 2 + MAX_CATCH_UP_TICKS
+
+def test_idle_scenes_sleep_until_input(controller, monkeypatch):
+    import pyglet
+    from applib.engine import animation
+    scheduled = []
+    monkeypatch.setattr(pyglet.clock, 'schedule_interval', (lambda function, interval: scheduled.append(interval)))
+    # A scene without `is_idle` is idle whenever its animations are.
+    monkeypatch.setattr(app, 'scene', object())
+    monkeypatch.setattr(app, 'animation', animation.AnimationManager())
+    monkeypatch.setattr(app, 'music', types.SimpleNamespace(is_idle=(lambda: True)))
+    controller.update(0.0)
+    assert controller.sleeping and controller.frame_pending
+    controller.frame_pending = False
+    controller.on_mouse_motion(0, 0, 1, 1)
+    assert not controller.sleeping and controller.frame_pending
+    assert len(scheduled) == 1
+    animation.WaitAnimation(1.0).start()
+    controller.update(0.5 / 64.0)
+    assert not controller.sleeping
+
+def test_input_does_not_draw_extra_frames(controller):
+    controller.update(0.0)
+    controller.frame_pending = False
+    controller.on_mouse_motion(0, 0, 1, 1)
+    assert not controller.frame_pending
+
+def test_background_updates_are_throttled(controller, monkeypatch):
+    import pyglet
+    scheduled = []
+    monkeypatch.setattr(pyglet.clock, 'schedule_interval', (lambda function, interval: scheduled.append(interval)))
+    controller.on_deactivate()
+    assert scheduled[-1] == pytest.approx(1.0 / BACKGROUND_FRAME_RATE)
+    controller.update(0.0)
+    controller.update(1.0 / BACKGROUND_FRAME_RATE)
+    assert controller.ticks_dropped == 0
+    controller.on_activate()
+    assert scheduled[-1] == pytest.approx(1.0 / FRAME_RATE)
+    assert controller.max_catch_up_ticks == MAX_CATCH_UP_TICKS
+
+def test_frame_rate_does_not_follow_the_tick_rate(controller, monkeypatch):
+    import pyglet
+    scheduled = []
+    monkeypatch.setattr(pyglet.clock, 'schedule_interval', (lambda function, interval: scheduled.append(interval)))
+    controller.tick_rate = 4 * FRAME_RATE
+    controller.tick_length = 1.0 / controller.tick_rate
+    controller.schedule_update()
+    assert scheduled == [pytest.approx(1.0 / FRAME_RATE)]
+    controller.update(0.0)
+    for _ in range(10):
+        controller.update(1.0 / FRAME_RATE)
+    assert controller.ticks_run == 41
+    assert controller.ticks_dropped == 0
@@ -0,0 +1,56 @@
+import pytest
+
+import applib
+
+from applib.model import entity
+
+
+class Thing(object):
+    pass
+
+
+def test_entity_list_keeps_insertion_order():
+    things = [Thing() for _ in range(5)]
+    entities = entity.EntityList(things)
+    entities.remove(things[1])
+    entities.remove(things[3])
+    assert list(entities) == [things[0], things[2], things[4]]
+    assert len(entities) == 3
+    assert entities[1] is things[2]
+    assert entities[-1] is things[4]
+    assert entities.index(things[4]) == 2
+    assert things[1] not in entities
+    assert things[2] in entities
+
+def test_entity_list_rejects_missing_entities():
+    entities = entity.EntityList()
+    with pytest.raises(ValueError):
+        entities.remove(Thing())
+    with pytest.raises(ValueError):
+        entities.index(Thing())
+
+def test_entity_list_iteration_is_stable():
+    things = [Thing() for _ in range(4)]
+    entities = entity.EntityList(things)
+    extra = Thing()
+    seen = []
+    for thing in entities:
+        seen.append(thing)
+        if thing is things[0]:
+            entities.remove(things[0])
+            entities.remove(things[2])
+            entities.add(extra)
+    assert seen == [things[0], things[1], things[3], extra]
+    assert list(entities) == [things[1], things[3], extra]
+    assert entities.index(extra) == 2
+
+def test_entity_list_compacts_after_churn():
+    entities = entity.EntityList()
+    kept = Thing()
+    entities.add(kept)
+    for _ in range(1000):
+        thing = Thing()
+        entities.add(thing)
+        entities.remove(thing)
+    assert len(entities._slots) < 20
+    assert list(entities) == [kept]
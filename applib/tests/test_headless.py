@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import applib
+
+from applib.constants import HEADLESS
+
+
+HEADLESS_SCRIPT = '''
+import sys
+
+import applib
+
+from applib.model import level
+
+arrivals = []
+
+class Handler(object):
+    def on_customer_arrives(self, customer):
+        arrivals.append(customer)
+
+example_level = level.LevelTwo()
+example_level.push_handlers(Handler())
+for _ in range(300):
+    example_level.tick()
+
+assert len(arrivals) == 1
+assert example_level.customers[0] is arrivals[0]
+assert 'pyglet' not in sys.modules
+'''
+
+
+def test_headless_model_does_not_need_pyglet():
+    environment = dict(os.environ, APPLIB_HEADLESS='1')
+    project_directory = os.path.dirname(os.path.dirname(applib.__file__))
+    subprocess.run([sys.executable, '-c', HEADLESS_SCRIPT],
+        env=environment, cwd=project_directory, check=True)
+
+@pytest.mark.skipif(HEADLESS, reason='pyglet resources are not indexed when headless')
+def test_resources_match_pyglet_index():
+    import pyglet
+    indexed_resources = list(pyglet.resource._default_loader._index)
+    assert sorted(applib.list_resources()) == sorted(indexed_resources)
@@ -0,0 +1,99 @@
+import pytest
+
+import applib
+
+from applib.model import device
+from applib.model import item
+from applib.model import journal
+from applib.model import level
+from applib.tools import policy
+
+
+def get_item_places(current_level):
+    places = {}
+    if current_level.held_item is not None:
+        places[current_level.held_item] = (journal.ITEM_TO_HAND, None)
+    for level_device in current_level.devices:
+        current_item = level_device.current_item
+        if current_item is not None:
+            places[current_item] = (journal.ITEM_TO_DEVICE, level_device)
+            if current_item.holds is not None:
+                places[current_item.holds] = (journal.ITEM_TO_PLATE, current_item)
+    for customer in current_level.customers:
+        for order_item in customer.order.items:
+            places[order_item] = (journal.ITEM_TO_CUSTOMER, customer)
+    return places
+
+
+def test_no_journal_without_readers():
+    level_four = level.LevelFour(seed=0)
+    assert level_four.journal is None
+    reader = level_four.subscribe()
+    assert level_four.journal is not None
+    level_four.unsubscribe(reader)
+    assert level_four.journal is None
+
+def test_journal_records_an_item_being_made():
+    level_one = level.LevelOne(seed=0)
+    reader = level_one.subscribe()
+    dough = level_one.get_device('station_dough')
+    cooking = level_one.get_device('station_cooking')
+    level_one.interact(dough)
+    made_item = level_one.held_item
+    assert [change[1:] for change in reader.drain()] == [
+        (journal.TIMER_STARTED, dough, level_one.tick_running),
+        (journal.ENTITY_CREATED, made_item, None),
+        (journal.ITEM_TO_HAND, made_item, None),
+    ]
+    level_one.interact(cooking)
+    changes = [change[1:3] for change in reader.drain()]
+    assert (journal.ITEM_TO_DEVICE, made_item) in changes
+    assert (journal.TIMER_STARTED, cooking) in changes
+    level_one.advance_to(cooking.timer_end_tick)
+    kinds = [change[1] for change in reader.drain()]
+    assert kinds.index(journal.TIMER_FINISHED) < kinds.index(journal.ITEM_TO_DEVICE)
+    assert journal.ENTITY_DESTROYED in kinds
+
+def test_readers_drain_independently():
+    level_one = level.LevelOne(seed=0)
+    first = level_one.subscribe()
+    level_one.interact(level_one.get_device('station_dough'))
+    second = level_one.subscribe()
+    level_one.interact(level_one.get_device('station_bin'))
+    assert len(first.drain()) > len(second.drain()) > 0
+    assert first.drain() == second.drain() == []
+    assert level_one.journal.changes == []
+
+def test_journal_follows_a_played_level():
+    level_four = level.LevelFour(seed=0)
+    reader = level_four.subscribe()
+    greedy_policy = policy.get_policy('greedy')
+    live_entities = set(level_four.entities)
+    places = {}
+    score = level_four.score
+    ended = []
+    level_four.push_handlers(on_level_success=lambda: ended.append(1), on_level_fail=lambda: ended.append(0))
+    while not ended:
+        greedy_policy(level_four)
+        level_four.advance_to(level_four.tick_running + 20)
+        for _, kind, subject, detail in reader.drain():
+            if kind == journal.ENTITY_CREATED:
+                live_entities.add(subject)
+            elif kind == journal.ENTITY_DESTROYED:
+                live_entities.discard(subject)
+                places.pop(subject, None)
+            elif kind in (journal.ITEM_TO_HAND, journal.ITEM_TO_DEVICE, journal.ITEM_TO_PLATE, journal.ITEM_TO_CUSTOMER):
+                places[subject] = (kind, detail)
+            elif kind == journal.SCORE_CHANGED:
+                score = detail
+        assert live_entities == set(level_four.entities)
+        assert places == get_item_places(level_four)
+    assert level_four.sold_cakes > 0
+    assert score != 0
+
+def test_restore_is_journalled():
+    level_one = level.LevelOne(seed=0)
+    data = level_one.snapshot()
+    reader = level_one.subscribe()
+    level_one.restore(data)
+    assert reader.drain()[-1][1:] == (journal.LEVEL_RESTORED, level_one, None)
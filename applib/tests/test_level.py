@@ -37,8 +37,7 @@ class ExampleLevel(level.Level):
     alt_suspicion_mode = False
 
     def wait_for(self, time, extra=0):
-        for _ in range(extra + int(math.ceil(time // TICK_LENGTH))):
-            self.tick()
+        self.advance_to(self.tick_running + extra + int(math.ceil(time // TICK_LENGTH)))
 
 @pytest.fixture
 def level():
@@ -168,6 +167,23 @@ def test_customer_added_with_one_item_order(level):
     customer = Customer(level, Order(item.DoughnutCooked(level)))
     assert len(level.customers[0].order.items) == 1
 
+def test_customer_without_a_level():
+    from applib.model.level import Customer, Order
+    customer = Customer(None, Order(), 'cop_dog')
+    assert customer.patience_ticks == customer.start_patience_ticks == math.ceil(15 / TICK_LENGTH)
+    customer.patience_ticks -= 1
+    assert customer.patience_ticks == customer.start_patience_ticks - 1
+
+def test_destroyed_customer_keeps_its_patience(level):
+    from applib.model.level import Customer, Order
+    customer = Customer(level, Order(item.DoughnutCooked(level)), 'cop_dog')
+    level.wait_for(1.0, 1)
+    patience_ticks = customer.patience_ticks
+    customer.destroy()
+    level.wait_for(1.0, 1)
+    assert customer.patience_ticks == patience_ticks
+    assert customer.get_patience_ratio() < 1.0
+
 def test_customer_serve_right_item(level):
     from applib.model.level import Customer, Order
     customer = Customer(level, Order(item.DoughnutCooked(level)))
@@ -592,6 +608,28 @@ def test_alt_lose_after_40_seconds(alt_level):
     assert alt_level.score >= alt_level.fail_score
     assert alt_level.has_level_ended()
 
+def test_tick_rate_retimes_durations():
+    fast_level = ExampleLevel()
+    slow_level = ExampleLevel(tick_rate=10)
+    assert slow_level.tick_length == 0.1
+    assert slow_level.duration_ticks * 6 == fast_level.duration_ticks
+    fast_cooking = fast_level.devices_by_class[device.Cooking][0]
+    slow_cooking = slow_level.devices_by_class[device.Cooking][0]
+    assert slow_cooking.duration_ticks * 6 == fast_cooking.duration_ticks
+    fast_level.advance_to(5 * 60)
+    slow_level.advance_to(5 * 10)
+    assert len(fast_level.customers) == len(slow_level.customers) == 1
+    assert slow_level.customers[0].patience_ticks * 6 == fast_level.customers[0].patience_ticks
+
+def test_suspicion_grows_at_the_same_speed_at_any_tick_rate():
+    fast_level = ExampleLevel()
+    slow_level = ExampleLevel(tick_rate=10)
+    fast_level.alt_suspicion_mode = slow_level.alt_suspicion_mode = True
+    assert slow_level.fail_score == fast_level.fail_score
+    fast_level.advance_to(10 * 60)
+    slow_level.advance_to(10 * 10)
+    assert slow_level.score == pytest.approx(fast_level.score)
+
 def test_alt_serving_reduces_suspicion(alt_level):
     assert alt_level.score == 0.0
     alt_level.wait_for(5.0)
@@ -635,3 +673,235 @@ def test_alt_level_score_brackets(alt_level, bracket, time, score):
     alt_level.interact(customer)
     alt_level.tick()
     assert alt_level.score == pytest.approx(max(0.0, ((5.0 + time) * 60 + 2) * 0.04 - score))
+
+
+def _level_state(level):
+    return (
+        level.tick_running,
+        level.score,
+        level.happy_customer,
+        level.sad_customer,
+        level.sold_cakes,
+        type(level.held_item),
+        [(type(d), type(d.current_item), d.ticks_remaining) for d in level.devices],
+        [(c.name, c.patience_ticks, [type(i) for i in c.order.items]) for c in level.customers],
+    )
+
+def _play_scripted_level(level, advance):
+    script = {
+        30: 'station_dough',
+        40: 'station_cooking',
+        400: 'station_cooking',
+        410: 'station_icing_blue',
+        420: 'station_dough',
+        430: 'station_cooking',
+        700: 'station_icing_blue',
+        900: 'customer',
+        1500: 'station_cooking',
+        2000: 'station_bin',
+    }
+    events = []
+    level.push_handlers(
+        on_customer_arrives=lambda c: events.append(('arrives', level.tick_running, c.name)),
+        on_customer_leaves=lambda c: events.append(('leaves', level.tick_running, c.name)),
+        on_level_fail=lambda: events.append(('fail', level.tick_running)),
+        on_level_success=lambda: events.append(('success', level.tick_running)),
+    )
+    states = []
+    fired = []
+    for tick in range(0, 3000, 10):
+        if advance:
+            level.advance_to(tick)
+        else:
+            while level.tick_running < tick:
+                level.tick()
+        if tick in script:
+            fired.append(tick)
+            if script[tick] == 'customer':
+                if level.customers:
+                    level.interact(level.customers[0])
+            else:
+                level.interact(level.get_device(script[tick]))
+        states.append(_level_state(level))
+    assert fired == list(script)
+    return states, events
+
+@pytest.mark.parametrize('alt_suspicion_mode', [False, True])
+def test_advance_to_matches_ticking(alt_suspicion_mode):
+    results = []
+    for advance in (False, True):
+        example_level = ExampleLevel()
+        example_level.alt_suspicion_mode = alt_suspicion_mode
+        example_level.alt_suspicion_time = 40.0
+        results.append(_play_scripted_level(example_level, advance))
+    assert results[0] == results[1]
+
+def test_advance_to_matches_ticking_endless():
+    results = []
+    for advance in (False, True):
+        endless_level = applib.model.level.EndlessLevel(seed=31)
+        results.append(_play_scripted_level(endless_level, advance))
+    assert results[0] == results[1]
+
+def test_run_until_event(level):
+    device = level.get_device('station_cooking')
+    level.interact(level.get_device('station_dough'))
+    level.interact(device)
+    assert level.run_until_event() == device.duration_ticks
+    assert device.current_item.name == 'doughnut_cooked'
+    assert len(level.customers) == 1
+    assert level.run_until_event() == 2 * device.duration_ticks
+    assert device.current_item.name == 'doughnut_burned'
+
+
+def test_items_use_slots(level):
+    new_item = item.DoughnutCooked(level)
+    assert not hasattr(new_item, '__dict__')
+    assert new_item in level.items
+
+def test_destroyed_items_are_not_reused(level):
+    plate = item.Plate(level)
+    held_item = item.DoughnutCooked(level)
+    plate.holds = held_item
+    plate.destroy()
+    plate.destroy()
+    assert plate.level is None
+    assert held_item.level is None
+    assert item.Plate(level) is not plate
+    assert item.DoughnutCooked(level) is not held_item
+
+
+@pytest.mark.parametrize('device_class', sorted(entity.Entity.index['devices'].values(), key=lambda cls: cls.__name__))
+def test_transition_table_matches_recipes(device_class):
+    compiled_classes = item.Item.item_classes[:len(device_class.transitions)]
+    for input_id, input_class in enumerate(compiled_classes):
+        for current_id, current_class in enumerate(compiled_classes):
+            transition = device_class.transitions[input_id][current_id]
+            assert transition.input_class is input_class
+            assert transition.current_class is current_class
+            expected = device_class.compute_transition(input_class, current_class)
+            assert (transition.output_class, transition.new_class) == expected[:2]
+
+def test_transition_table_describes_cooking():
+    transition = device.Cooking.transitions[item.DoughnutUncooked.item_id][0]
+    assert transition.new_class is item.DoughnutUncooked
+    assert transition.new_source == device.SOURCE_INPUT
+    assert transition.timer == device.TIMER_START
+    assert not transition.destroy_input
+    transition = device.Cooking.transitions[item.Time.item_id][item.DoughnutUncooked.item_id]
+    assert transition.new_class is item.DoughnutCooked
+    assert transition.new_source == device.SOURCE_NEW
+    assert transition.destroy_current
+
+def test_transition_for_late_item_class(level, monkeypatch):
+    # Register the new class in a copy, so that later tests do not see it.
+    monkeypatch.setattr(item.Item, 'item_classes', list(item.Item.item_classes))
+    class LateItem(item.Item):
+        __slots__ = ()
+    cooking = level.get_device('station_cooking')
+    level.held_item = LateItem(None)
+    level.interact(cooking)
+    assert isinstance(level.held_item, LateItem)
+    assert cooking.current_item is None
+
+
+def test_only_due_entities_are_ticked(level):
+    cooking = level.get_device('station_cooking')
+    level.interact(level.get_device('station_dough'))
+    level.interact(cooking)
+    assert level.scheduler.get_scheduled_tick(cooking) == cooking.duration_ticks
+    ticked = []
+    for device in level.devices:
+        device.tick = (lambda device=device: ticked.append(device))
+    level.advance_to(cooking.duration_ticks - 1)
+    assert ticked == []
+    level.tick()
+    assert ticked == [cooking]
+
+def test_removing_an_item_cancels_the_timer(level):
+    cooking = level.get_device('station_cooking')
+    level.interact(level.get_device('station_dough'))
+    level.interact(cooking)
+    level.advance_to(10)
+    level.interact(cooking)
+    assert level.held_item.name == 'doughnut_uncooked'
+    assert cooking.ticks_remaining is None
+    assert level.scheduler.get_scheduled_tick(cooking) is None
+    level.advance_to(3 * cooking.duration_ticks)
+    assert cooking.current_item is None
+    assert level.held_item.name == 'doughnut_uncooked'
+
+def test_order_buckets_items_by_class(level):
+    from applib.model.level import Order
+    cooked, iced, other_cooked = item.DoughnutCooked(level), item.DoughnutIcedBlue(level), item.DoughnutCooked(level)
+    order = Order(cooked, iced, other_cooked)
+    assert order.count(item.DoughnutCooked) == 2
+    assert order.count(item.DoughnutIcedPink) == 0
+    plate = item.Plate(level)
+    plate.holds = item.DoughnutIcedBlue(level)
+    assert order.find(plate) is iced
+    assert order.remove(item.DoughnutCooked(level)) is item.DoughnutCooked
+    assert order.items == [iced, other_cooked]
+    assert cooked.level is None
+    assert order.remove(item.DoughnutUncooked(level)) is None
+    assert order.remove(plate) is item.DoughnutIcedBlue
+    assert order.remove(None) is None
+    assert not order.is_complete
+    order.remove(item.DoughnutCooked(level))
+    assert order.is_complete
+    assert order.items_by_class == {}
+
+def test_level_indexes_customers_by_order_class(level):
+    from applib.model.level import Customer, Order
+    first = Customer(level, Order(item.DoughnutCooked(level), item.DoughnutIcedBlue(level)))
+    second = Customer(level, Order(item.DoughnutCooked(level)))
+    assert level.get_customers_wanting(item.DoughnutCooked) == [first, second]
+    assert level.get_customers_wanting(item.DoughnutIcedBlue) == [first]
+    assert level.get_customers_wanting(item.DoughnutIcedPink) == []
+    level.held_item = item.DoughnutIcedBlue(level)
+    assert first.wants(level.held_item) and not second.wants(level.held_item)
+    level.interact(first)
+    assert level.get_customers_wanting(item.DoughnutIcedBlue) == []
+    second.destroy()
+    assert level.get_customers_wanting(item.DoughnutCooked) == [first]
+
+def test_endless_customer_things_are_compiled():
+    EndlessLevel = applib.model.level.EndlessLevel
+    _, customer_types, order_tables = EndlessLevel.compile_customer_things()
+    assert customer_types == tuple(EndlessLevel.customer_things)
+    order_min, order_max, options = order_tables['cop_elephant']
+    assert (order_min, order_max) == (3, 3)
+    assert len(options) == 12
+    assert options.count(item.DoughnutCooked) == 4
+    assert EndlessLevel.compile_customer_things() is EndlessLevel.compile_customer_things()
+
+    class NarrowLevel(EndlessLevel):
+        customer_things = {'cop_dog': [1, 2, [(1, item.DoughnutIcedPink)]]}
+
+    assert NarrowLevel.compile_customer_things()[1] == ('cop_dog',)
+    assert EndlessLevel.compile_customer_things()[1] == customer_types
+
+def test_endless_sample_orders():
+    import random
+    EndlessLevel = applib.model.level.EndlessLevel
+    orders = EndlessLevel.sample_orders(4000, random.Random(5))
+    assert len(orders) == 4000
+    for customer_type, order in orders:
+        order_min, order_max, options = EndlessLevel.customer_things[customer_type]
+        assert order_min <= len(order) <= order_max
+        assert all(order_class in [option for _, option in options] for order_class in order)
+    elephant_items = [order_class for customer_type, order in orders if customer_type == 'cop_elephant' for order_class in order]
+    assert elephant_items.count(item.DoughnutCooked) / len(elephant_items) == pytest.approx(4 / 12, abs=0.05)
+
+def test_device_indexes(level):
+    plating = level.get_device('station_plating')
+    assert level.get_devices('station_none') == plating.subdevices
+    assert level.get_devices_of_class(device.Plating) == plating.subdevices
+    assert level.get_devices_of_class(device.MultiPlating) == [plating]
+    assert level.get_devices_of_class(device.Device) == []
+    assert all(subdevice.parent is plating for subdevice in plating.subdevices)
+    plating.destroy()
+    assert level.get_devices('station_none') == []
+    assert level.get_devices_of_class(device.MultiPlating) == []
+    with pytest.raises(ValueError):
+        level.get_device('station_plating')
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+import applib
+
+from applib.model import device
+from applib.model import item
+from applib.model import level
+from applib.model import leveldata
+
+
+@pytest.fixture
+def levels_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(leveldata, 'get_levels_directory', lambda: str(tmp_path))
+    monkeypatch.setattr(leveldata, 'get_cache_directory', lambda: str(tmp_path / 'cache'))
+    yield tmp_path
+    for path in tmp_path.glob('*.json'):
+        vars(level).pop(path.stem, None)
+
+def write_level(directory, name, definition):
+    with open(directory / f'{name}.json', 'w') as level_file:
+        json.dump(definition, level_file)
+
+
+def test_shipped_levels_load():
+    names = leveldata.list_levels()
+    assert {'LevelOne', 'LevelFour', 'LevelFourTutorial', 'EndlessLevel'} <= set(names)
+    for name in names:
+        level_class = level.get_level_class(name)
+        assert getattr(level, name) is level_class
+        assert level_class.__name__ == name
+    assert level.LevelFour.device_specification[1] == (device.Cooking, 0.25, -0.11)
+    assert level.LevelFour.customer_specification[0] == (1, 'cop_elephant', [item.DoughnutFinalBluePurple])
+    assert level.LevelFourBee.failure_scene == 'level_4B_failure'
+    assert issubclass(level.LevelFourBee, level.LevelFour)
+    assert issubclass(level.EndlessLevel, level.RandomCustomerLevel)
+
+def test_next_level_chain():
+    level_class = level.get_level_class(level.default_level)
+    names = [level_class.__name__]
+    while level_class.next_level is not None:
+        level_class = level.get_level_class(level_class.next_level)
+        names.append(level_class.__name__)
+    assert names == ['LevelOne', 'LevelTwo', 'LevelThree', 'LevelFour']
+
+def test_level_is_loaded_when_first_used(levels_directory):
+    write_level(levels_directory, 'LevelCustom', {
+        'base': 'LevelOne',
+        'duration': 10,
+        'device_specification': [['Dough', 0, 0], ['Cooking', 0.5, 0]],
+        'customer_specification': [[1, 'cop_dog', ['DoughnutCooked']]],
+    })
+    assert 'LevelCustom' not in vars(level)
+    new_level = level.LevelCustom(seed=0)
+    assert new_level.duration == 10
+    assert new_level.background_scenery is level.LevelOne.background_scenery
+    assert [type(d) for d in new_level.devices] == [device.Dough, device.Cooking]
+    assert [file_name.split('.')[0] for file_name in os.listdir(levels_directory / 'cache')] == ['LevelCustom']
+
+def test_cache_follows_the_file_contents(levels_directory, monkeypatch):
+    write_level(levels_directory, 'LevelCached', {'duration': 10})
+    write_level(levels_directory, 'LevelCachedToo', {'duration': 30})
+    assert leveldata.load_level('LevelCached')['duration'] == 10
+    assert leveldata.load_level('LevelCachedToo')['duration'] == 30
+    # The cached form is used while the file is unchanged.
+    with monkeypatch.context() as patch:
+        patch.setattr(leveldata, 'compile_level', None)
+        assert leveldata.load_level('LevelCached')['duration'] == 10
+    write_level(levels_directory, 'LevelCached', {'duration': 20})
+    assert leveldata.load_level('LevelCached')['duration'] == 20
+    # Only the cache of the old contents is dropped.
+    cached_names = sorted(file_name.split('.')[0] for file_name in os.listdir(levels_directory / 'cache'))
+    assert cached_names == ['LevelCached', 'LevelCachedToo']
+
+def test_cache_is_kept_out_of_the_data_directory():
+    cache_directory = leveldata.get_cache_directory()
+    assert not cache_directory.startswith(applib.get_data_directory() + os.sep)
+    leveldata.load_level('LevelOne')
+    assert not os.path.exists(os.path.join(leveldata.get_levels_directory(), '__pycache__'))
+
+@pytest.mark.parametrize('definition', [
+    {'device_specification': [['Oven', 0, 0]]},
+    {'device_specification': [['Dough', 0]]},
+    {'customer_specification': [[1, 'cop_dog', ['Cake']]]},
+    {'background_scenery': 'BackgroundMoon'},
+    {'not_an_attribute': 1},
+    {'base': 'LevelLoop'},
+])
+def test_bad_levels_are_rejected(levels_directory, definition):
+    write_level(levels_directory, 'LevelLoop', definition)
+    with pytest.raises(ValueError):
+        level.get_level_class('LevelLoop')
+
+def test_unknown_level():
+    with pytest.raises(ValueError):
+        level.get_level_class('LevelNowhere')
+    with pytest.raises(AttributeError):
+        level.LevelNowhere
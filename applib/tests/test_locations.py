@@ -0,0 +1,75 @@
+import pytest
+
+import applib
+
+from applib.model import item
+from applib.model import level
+from applib.tools import policy
+
+
+def test_items_are_placed_as_they_move():
+    level_one = level.LevelOne(seed=0)
+    dough = level_one.get_device('station_dough')
+    cooking = level_one.get_device('station_cooking')
+    level_one.interact(dough)
+    made_item = level_one.held_item
+    assert level_one.location_of(made_item) == (item.LOCATION_HAND, level_one)
+    assert level_one.items_at(level_one) == [made_item]
+    level_one.interact(cooking)
+    assert level_one.location_of(made_item) == (item.LOCATION_DEVICE, cooking)
+    assert level_one.items_at(cooking) == [made_item]
+    assert level_one.items_at(level_one) == []
+    level_one.check_item_locations()
+
+def test_destroyed_items_have_no_location():
+    level_one = level.LevelOne(seed=0)
+    level_one.interact(level_one.get_device('station_dough'))
+    made_item = level_one.held_item
+    level_one.interact(level_one.get_device('station_bin'))
+    with pytest.raises(ValueError):
+        level_one.location_of(made_item)
+    assert level_one.items_at(level_one) == []
+
+def test_orphaned_items_are_caught():
+    level_one = level.LevelOne(seed=0)
+    orphan = item.DoughnutCooked(level_one)
+    assert level_one.location_of(orphan) == (item.LOCATION_LOOSE, None)
+    assert level_one.get_orphaned_items() == [orphan]
+    with pytest.raises(RuntimeError):
+        level_one.check_item_locations()
+
+def test_orphaned_items_only_warn_when_debugging(capsys):
+    level_one = level.LevelOne(seed=0)
+    orphan = item.DoughnutCooked(level_one)
+    level_one.debug_item_locations()
+    assert 'orphaned items' in capsys.readouterr().out
+    level_one.debug_item_locations()
+    assert capsys.readouterr().out == ''
+
+def test_held_items_outside_the_level_are_not_located():
+    level_one = level.LevelOne(seed=0)
+    level_one.held_item = item.DoughnutCooked(None)
+    assert level_one.items_at(level_one) == []
+    assert level_one.find_item_locations() == level_one.item_locations
+    level_one.check_item_locations()
+
+def test_locations_follow_a_played_level():
+    level_four = level.LevelFour(seed=0)
+    greedy_policy = policy.get_policy('greedy')
+    ended = []
+    level_four.push_handlers(on_level_success=lambda: ended.append(1), on_level_fail=lambda: ended.append(0))
+    while not ended:
+        greedy_policy(level_four)
+        level_four.advance_to(level_four.tick_running + 20)
+        level_four.check_item_locations()
+        for customer in level_four.customers:
+            assert set(level_four.items_at(customer)) == set(customer.order.items)
+
+def test_locations_survive_restore():
+    level_one = level.LevelOne(seed=0)
+    level_one.interact(level_one.get_device('station_dough'))
+    data = level_one.snapshot()
+    level_one.interact(level_one.get_device('station_cooking'))
+    level_one.restore(data)
+    level_one.check_item_locations()
+    assert level_one.location_of(level_one.held_item) == (item.LOCATION_HAND, level_one)
@@ -0,0 +1,64 @@
+import math
+
+import pytest
+
+import applib
+
+from applib.model import item
+from applib.model import level
+from applib.tools import montecarlo
+
+
+needs_numpy = pytest.mark.skipif(montecarlo.numpy is None, reason='needs NumPy')
+
+
+def test_score_table_matches_customers():
+    endless_level = level.EndlessLevel(seed=0)
+    customer = level.Customer(endless_level, level.Order(), 'cop_dog')
+    table = montecarlo.get_score_table(level.EndlessLevel)
+    for ratio, bracket in [(1.0, 0), (0.8, 0), (0.5, 1), (0.3, 2), (0.1, 3), (0.0, 4)]:
+        customer.patience_ticks = ratio * customer.start_patience_ticks
+        assert customer.compute_score() == table[bracket]
+
+def test_service_model_from_recipes():
+    service_model = montecarlo.ServiceModel.from_recipes(level.EndlessLevel, customer_time=1.0)
+    cooked = service_model.item_times[item.DoughnutCooked]
+    assert 0.0 < cooked < math.inf
+    assert service_model.get_seconds([item.DoughnutCooked] * 2) == 1.0 + 2 * cooked
+    assert service_model.get_seconds([item.Apple]) == math.inf
+    assert montecarlo.get_work_ticks(0.25, 10.0) == 3
+    assert montecarlo.get_work_ticks(0.0, 10.0) == 1
+
+def test_play_level_serves_customers():
+    service_model = montecarlo.ServiceModel.from_recipes(level.EndlessLevel)
+    endless_level = level.EndlessLevel(seed=0, tick_rate=10.0)
+    survival_time = montecarlo.play_level(endless_level, service_model, 600)
+    assert survival_time == math.inf
+    assert endless_level.happy_customer > 0
+    assert endless_level.tick_running == 600
+
+@needs_numpy
+def test_simulation_curves():
+    result = montecarlo.simulate(runs=500, max_time=200.0, seed=1)
+    assert len(result.survival_times) == 500
+    assert len(result.sample_times) == len(result.alive) == result.suspicion.shape[1]
+    assert all(later <= earlier for earlier, later in zip(result.alive, result.alive[1:]))
+    summary = result.summary()
+    assert summary['runs'] == 500
+    assert 0.0 < summary['survival_time_mean'] <= 200.0
+    assert set(result.curves()) >= {'time', 'alive', 'suspicion_mean'}
+
+@needs_numpy
+def test_simulation_is_repeatable():
+    first = montecarlo.simulate(runs=200, max_time=100.0, seed=3)
+    second = montecarlo.simulate(runs=200, max_time=100.0, seed=3)
+    assert (first.survival_times == second.survival_times).all()
+
+@needs_numpy
+def test_simulation_agrees_with_the_level():
+    # Without serving anyone the survival time hangs on the customers alone.
+    service_model = montecarlo.ServiceModel({})
+    summaries = montecarlo.validate(service_model=service_model, runs=10, max_time=300.0, simulated_runs=2000)
+    played, simulated = summaries['played'], summaries['simulated']
+    assert played['survival_rate'] == simulated['survival_rate'] == 0.0
+    assert abs(played['survival_time_mean'] - simulated['survival_time_mean']) < 10.0
@@ -0,0 +1,59 @@
+import applib
+
+from applib.model import device
+from applib.model import item
+from applib.model import level
+from applib.tools import recipes
+
+
+def test_production_time_follows_the_critical_path():
+    graph = recipes.analyse(level.LevelFour).graph
+    assert graph.production_times[item.DoughnutFinalBluePurple] == 8.0
+    devices = [step.device_class for step in graph.routes[item.DoughnutFinalBluePurple]]
+    assert devices.index(device.Cooking) < devices.index(device.IcingBlue) < devices.index(device.Plating)
+    assert graph.get_bottleneck(item.DoughnutFinalBluePurple) is device.IcingBlue
+
+def test_throughput_counts_devices():
+    assert recipes.analyse(level.LevelFour).graph.get_throughput(item.DoughnutCooked) == 0.4
+    assert recipes.analyse(level.LevelThree).graph.get_throughput(item.DoughnutCooked) == 0.2
+
+def test_action_time_makes_the_player_busy():
+    graph = recipes.analyse(level.LevelFour, action_time=0.5).graph
+    assert graph.production_times[item.DoughnutUncooked] == 0.5
+    assert graph.get_bottleneck(item.DoughnutUncooked) is None
+
+def test_graphs_and_analyses_are_cached():
+    assert recipes.analyse(level.LevelFour) is recipes.analyse(level.LevelFour)
+    assert recipes.get_graph(level.LevelFour.device_specification) is recipes.analyse(level.LevelFour).graph
+
+def test_analysis_is_remade_for_a_new_specification():
+    analysis = recipes.analyse(level.LevelFour)
+    changed_class = type('LevelFour', (level.LevelFour,), {
+        'customer_specification': level.LevelFour.customer_specification[:1],
+    })
+    assert recipes.analyse(changed_class) is not analysis
+    assert len(recipes.analyse(changed_class).spacing) == 1
+
+def test_spacing_flags_tight_customers():
+    analysis = recipes.analyse(level.LevelFour)
+    assert len(analysis.spacing) == len(level.LevelFour.customer_specification)
+    for index in analysis.tight_customers:
+        _, gap, least_gap = analysis.spacing[index]
+        assert gap < least_gap
+    assert analysis.missing_items == []
+
+def test_every_level_is_analysed_once():
+    recipes._graphs.clear()
+    recipes._analyses.clear()
+    level_classes = recipes.get_level_classes()
+    for level_class in level_classes:
+        analysis = recipes.analyse(level_class)
+        assert analysis.missing_items == []
+        assert analysis.as_dict()['level'] == level_class.__name__
+    assert len(recipes._analyses) == len(level_classes)
+    # Levels with the same devices share one graph.
+    assert len(recipes._graphs) < len(level_classes)
+    graphs = dict(recipes._graphs)
+    for level_class in level_classes:
+        recipes.analyse(level_class)
+    assert recipes._graphs == graphs
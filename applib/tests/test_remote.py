@@ -0,0 +1,64 @@
+import pytest
+
+import applib
+
+from applib.model import journal
+from applib.model import level
+from applib.model import remote
+from applib.model import replay
+from applib.tools import policy
+
+
+@pytest.fixture
+def worker():
+    level_worker = remote.LevelWorker(level.LevelFour(seed=0))
+    yield level_worker
+    level_worker.close()
+
+
+def test_publish_and_read_alternate_slots():
+    buffer = bytearray(remote._get_slot_offset(2))
+    remote._publish(buffer, 1, b'first')
+    remote._publish(buffer, 2, b'second')
+    assert remote._read(buffer, 1) == b'first'
+    assert remote._read(buffer, 2) == b'second'
+    remote._publish(buffer, 3, b'third')
+    assert remote._read(buffer, 1) is None
+    assert remote._read(buffer, 3) == b'third'
+
+def test_worker_matches_a_local_level(worker):
+    local_level = level.LevelFour(seed=0)
+    greedy_policy = policy.get_policy('greedy')
+    arrivals = []
+    departures = []
+    worker.level.push_handlers(on_customer_arrives=arrivals.append, on_customer_leaves=departures.append)
+    reader = worker.level.subscribe()
+    changes = []
+    for _ in range(160):
+        target = greedy_policy.choose(worker.level)
+        if target is not None:
+            worker.interact(target)
+            local_level.interact(local_level.entities_by_id[target.entity_id])
+        worker.tick(15)
+        local_level.advance_to(local_level.tick_running + 15)
+        worker.sync(wait=True)
+        assert remote._dump_view(worker.level) == remote._dump_view(local_level)
+        worker.level.check_item_locations()
+        changes.extend(kind for _, kind, _, _ in reader.drain())
+    assert len(arrivals) > 0 and len(departures) > 0
+    assert all(customer.level is worker.level or customer.level is None for customer in arrivals)
+    assert journal.ITEM_TO_DEVICE in changes
+    assert journal.LEVEL_RESTORED not in changes
+
+def test_views_leave_out_the_random_stream():
+    level_four = level.LevelFour(seed=0)
+    level_four.advance_to(600)
+    assert len(remote._dump_view(level_four)) < len(level_four.snapshot()) // 4
+
+def test_interactions_are_forwarded_and_recorded(worker):
+    recording = replay.Recording.start(worker.level)
+    dough = worker.level.get_device('station_dough')
+    worker.interact(dough)
+    worker.sync(wait=True)
+    assert worker.level.held_item is not None
+    assert recording.inputs == [(0, dough.entity_id, -1)]
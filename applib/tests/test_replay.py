@@ -0,0 +1,88 @@
+import pytest
+
+import applib
+
+from applib.constants import TICK_RATE
+from applib.model import level
+from applib.model import replay
+from applib.tests.helpers import ImmortalEndlessLevel
+from applib.tests.helpers import full_state
+from applib.tools import policy
+
+
+def _play_endless(seed, seconds):
+    endless_level = level.EndlessLevel(seed=seed)
+    endless_level.alt_suspicion_time = 1e9
+    recording = replay.Recording.start(endless_level)
+    greedy_policy = policy.GreedyPolicy()
+    while endless_level.tick_running < seconds * TICK_RATE:
+        greedy_policy(endless_level)
+        endless_level.advance_to(endless_level.tick_running + 20)
+    recording.stop(endless_level)
+    return endless_level, recording
+
+
+def test_levels_with_the_same_seed_match():
+    first_level = level.EndlessLevel(seed=7)
+    second_level = level.EndlessLevel(seed=7)
+    first_level.advance_to(3000)
+    second_level.advance_to(3000)
+    assert full_state(first_level) == full_state(second_level)
+    assert first_level.sad_customer > 0
+
+def test_recording_records_subdevices():
+    example_level = level.LevelFour(seed=1)
+    recording = replay.Recording.start(example_level)
+    plating = example_level.get_device('station_plating')
+    example_level.interact(example_level.get_device('station_plate'))
+    example_level.advance_to(10)
+    example_level.interact(plating.subdevices[1])
+    assert recording.inputs == [
+        (0, example_level.get_device('station_plate').entity_id, -1),
+        (10, plating.entity_id, 1),
+    ]
+
+def test_recording_round_trips_through_bytes(tmp_path):
+    endless_level, recording = _play_endless(3, 60)
+    path = tmp_path / 'endless.rec'
+    recording.save(path)
+    loaded = replay.Recording.load(path)
+    assert loaded.level_name == 'applib.model.level.EndlessLevel'
+    assert loaded.seed == 3
+    assert loaded.end_tick == 60 * TICK_RATE
+    assert loaded.inputs == recording.inputs
+    with pytest.raises(ValueError):
+        replay.Recording.from_bytes(b'nonsense' * 4)
+
+def test_recording_keeps_the_tick_rate():
+    endless_level = ImmortalEndlessLevel(seed=4, tick_rate=10)
+    recording = replay.Recording.start(endless_level)
+    greedy_policy = policy.GreedyPolicy()
+    while endless_level.tick_running < 600:
+        greedy_policy(endless_level)
+        endless_level.advance_to(endless_level.tick_running + 5)
+    recording.stop(endless_level)
+    loaded = replay.Recording.from_bytes(recording.to_bytes())
+    assert loaded.tick_rate == 10
+    replayed_level = replay.replay(loaded, level_class=ImmortalEndlessLevel)
+    assert replayed_level.tick_rate == 10
+    assert full_state(replayed_level) == full_state(endless_level)
+
+def test_recordings_of_another_version_are_rejected():
+    data = replay.Recording('a.b.C', 7, end_tick=30).to_bytes()
+    with pytest.raises(ValueError):
+        replay.Recording.from_bytes(data[:4] + b'\x01\x00' + data[6:])
+
+def test_replay_reproduces_endless_run():
+    endless_level, recording = _play_endless(5, 600)
+    assert endless_level.sold_cakes > 50
+    recording = replay.Recording.from_bytes(recording.to_bytes())
+    ticked = []
+    class _CountingLevel(ImmortalEndlessLevel):
+        def tick(self):
+            ticked.append(self.tick_running)
+            super().tick()
+    replayed_level = replay.replay(recording, level_class=_CountingLevel)
+    assert full_state(replayed_level) == full_state(endless_level)
+    # The uneventful ticks between the inputs are skipped rather than run.
+    assert len(ticked) < replayed_level.tick_running // 10
@@ -0,0 +1,49 @@
+import pytest
+
+import applib
+
+from applib.model import schedule
+
+
+class Thing(object):
+
+    def __init__(self, entity_id):
+        self.entity_id = entity_id
+
+
+def test_scheduler_orders_by_tick_then_entity_id():
+    scheduler = schedule.Scheduler()
+    things = [Thing(entity_id) for entity_id in range(4)]
+    scheduler.schedule(things[3], 5)
+    scheduler.schedule(things[1], 7)
+    scheduler.schedule(things[2], 5)
+    scheduler.schedule(things[0], 9)
+    assert scheduler.peek() == 5
+    assert scheduler.pop(4) is None
+    assert scheduler.pop(5) is things[2]
+    assert scheduler.pop(5) is things[3]
+    assert scheduler.pop(5) is None
+    assert [scheduler.pop(10), scheduler.pop(10), scheduler.pop(10)] == [things[1], things[0], None]
+    assert scheduler.peek() is None
+
+def test_scheduler_replaces_and_cancels_requests():
+    scheduler = schedule.Scheduler()
+    first, second = Thing(0), Thing(1)
+    scheduler.schedule(first, 3)
+    scheduler.schedule(first, 8)
+    scheduler.schedule(second, 4)
+    scheduler.cancel(second)
+    assert scheduler.get_scheduled_tick(first) == 8
+    assert scheduler.get_scheduled_tick(second) is None
+    assert len(scheduler) == 1
+    assert scheduler.peek() == 8
+    scheduler.schedule(first, None)
+    assert scheduler.peek() is None
+
+def test_scheduler_discards_stale_entries():
+    scheduler = schedule.Scheduler()
+    thing = Thing(0)
+    for tick in range(1000):
+        scheduler.schedule(thing, 1000 - tick)
+    assert len(scheduler._heap) < 100
+    assert scheduler.pop(1) is thing
@@ -0,0 +1,129 @@
+import pytest
+
+import applib
+
+from applib.model import journal
+from applib.model import level
+from applib.model import scenery
+from applib.tests.helpers import ImmortalEndlessLevel
+from applib.tests.helpers import full_state
+from applib.tools import policy
+
+
+def _play(example_level, ticks):
+    greedy_policy = policy.GreedyPolicy()
+    end_tick = example_level.tick_running + ticks
+    while example_level.tick_running < end_tick:
+        greedy_policy(example_level)
+        example_level.advance_to(min(example_level.tick_running + 20, end_tick))
+
+
+def test_restore_rewinds_a_running_level():
+    endless_level = ImmortalEndlessLevel(seed=11)
+    _play(endless_level, 3000)
+    data = endless_level.snapshot()
+    expected_state = full_state(endless_level)
+    station = endless_level.devices[0]
+    _play(endless_level, 3000)
+    endless_level.restore(data)
+    assert full_state(endless_level) == expected_state
+    assert endless_level.get_entity(station.entity_id) is station
+
+    # The restored level carries on exactly as an uninterrupted one would.
+    other_level = ImmortalEndlessLevel(seed=11)
+    _play(other_level, 3000)
+    _play(other_level, 2000)
+    _play(endless_level, 2000)
+    assert full_state(endless_level) == full_state(other_level)
+
+def test_rewinding_keeps_the_registry_and_schedule():
+    endless_level = ImmortalEndlessLevel(seed=13)
+    _play(endless_level, 2000)
+    data = endless_level.snapshot()
+    entities = endless_level.entities
+    devices_by_name = endless_level.devices_by_name
+    timed_entities = list(endless_level.devices) + list(endless_level.customers)
+    scheduled = [endless_level.scheduler.get_scheduled_tick(e) for e in timed_entities]
+    reader = endless_level.subscribe()
+    endless_level.restore(data)
+    assert endless_level.entities is entities
+    assert endless_level.devices_by_name is devices_by_name
+    assert [endless_level.scheduler.get_scheduled_tick(e) for e in timed_entities] == scheduled
+    assert [change[1] for change in reader.drain()] == [journal.LEVEL_RESTORED]
+
+def test_restore_into_a_new_level():
+    endless_level = ImmortalEndlessLevel(seed=12)
+    _play(endless_level, 2000)
+    data = endless_level.snapshot()
+    restored_level = ImmortalEndlessLevel(seed=0)
+    restored_level.restore(data)
+    assert full_state(restored_level) == full_state(endless_level)
+    assert restored_level.customer_specification == endless_level.customer_specification
+    assert {cls: [c.entity_id for c in customers] for cls, customers in restored_level.customers_by_order_class.items()} == {
+        cls: [c.entity_id for c in customers] for cls, customers in endless_level.customers_by_order_class.items()
+    }
+    assert restored_level.device_locations.keys() == {
+        restored_level.get_entity(d.entity_id) for d in endless_level.device_locations
+    }
+    assert all(e.level is restored_level for e in restored_level.entities)
+    assert len(restored_level.scenery) == len(endless_level.scenery)
+    assert isinstance(restored_level.scenery[0], scenery.Counter)
+    assert restored_level.random.random() == endless_level.random.random()
+
+def test_restoring_twice_detaches_customers_with_their_patience():
+    endless_level = ImmortalEndlessLevel(seed=14)
+    _play(endless_level, 500)
+    early_data = endless_level.snapshot()
+    _play(endless_level, 2500)
+    late_data = endless_level.snapshot()
+    restored_level = ImmortalEndlessLevel(seed=0)
+    restored_level.restore(late_data)
+    customers = list(restored_level.customers)
+    patience = [c.patience_ticks for c in customers]
+    restored_level.restore(early_data)
+    detached = [(c, p) for c, p in zip(customers, patience) if c.level is None]
+    assert detached
+    assert all(c.patience_ticks == p for c, p in detached)
+    _play(restored_level, 2500)
+    assert full_state(restored_level) == full_state(endless_level)
+
+def test_restore_links_plates_and_subdevices():
+    example_level = level.LevelFour(seed=1)
+    plating = example_level.get_device('station_plating')
+    example_level.interact(example_level.get_device('station_plate'))
+    example_level.interact(plating.subdevices[1])
+    plate = plating.subdevices[1].current_item
+    data = example_level.snapshot()
+    example_level.interact(plating.subdevices[1])
+    restored_level = level.LevelFour(seed=2)
+    restored_level.restore(data)
+    restored_plating = restored_level.get_entity(plating.entity_id)
+    restored_plate = restored_plating.subdevices[1].current_item
+    assert restored_plate is not None
+    assert restored_plate.entity_id == plate.entity_id
+    assert all(subdevice.parent is restored_plating for subdevice in restored_plating.subdevices)
+    assert restored_level.held_item is None
+
+def test_restore_rejects_bad_data():
+    example_level = level.LevelOne()
+    with pytest.raises(ValueError):
+        example_level.restore(b'nonsense' * 8)
+
+def test_restore_needs_the_same_tick_rate():
+    slow_level = ImmortalEndlessLevel(seed=13, tick_rate=10)
+    _play(slow_level, 500)
+    data = slow_level.snapshot()
+    restored_level = ImmortalEndlessLevel(seed=0, populate=False, tick_rate=10)
+    restored_level.restore(data)
+    assert full_state(restored_level) == full_state(slow_level)
+    assert [d.duration_ticks for d in restored_level.devices] == [d.duration_ticks for d in slow_level.devices]
+    with pytest.raises(ValueError):
+        ImmortalEndlessLevel(seed=0, populate=False).restore(data)
+
+def test_levels_of_a_class_share_static_entity_ids():
+    # The level scene relies on this to reuse device and scenery sprites.
+    def static_entities(level):
+        return [(e.entity_id, type(e)) for e in list(level.devices) + list(level.scenery)]
+    assert static_entities(ImmortalEndlessLevel(seed=21)) == static_entities(ImmortalEndlessLevel(seed=5))
+    assert static_entities(level.LevelFour(seed=21)) == static_entities(level.LevelFour(seed=5, tick_rate=30))
+    assert len(ImmortalEndlessLevel(seed=21, populate=False).entities) == 0
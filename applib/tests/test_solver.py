@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+import applib
+
+from applib.model import level
+from applib.model import replay
+from applib.tools import policy
+from applib.tools import solver
+from applib.tools import sweep
+
+
+def test_model_predicts_the_level():
+    level_two = level.LevelTwo(seed=0)
+    solver_policy = solver.SolverPolicy()
+    model = solver_policy.get_model(level_two)
+    plan, _ = model.search(model.observe(level_two), level_two.score)
+    assert plan
+    for step, state in plan:
+        assert model.observe(level_two) == state
+        _take_step(level_two, model, step)
+    final_state = model.observe(level_two)
+    assert final_state[2] == () and final_state[3] is None
+
+def _take_step(current_level, model, step):
+    kind, target, ticks = step
+    if kind == solver.ACTION_DEVICE:
+        current_level.interact(model.targets[target])
+    elif kind == solver.ACTION_SERVE:
+        current_level.interact(current_level.get_entity(model.entity_ids[target]))
+    current_level.advance_to(current_level.tick_running + ticks)
+
+@pytest.mark.parametrize('level_name', ['LevelOne', 'LevelTwo', 'LevelThree', 'LevelFour'])
+@pytest.mark.parametrize('tick_rate', [None, 24])
+def test_model_agrees_with_the_level(level_name, tick_rate):
+    # Take every step open to the model from each state along a run, mostly
+    # following short searches, and compare the level with the prediction.
+    current_level = getattr(level, level_name)(seed=0, tick_rate=tick_rate)
+    model = solver.SolverPolicy().get_model(current_level)
+    random_stream = random.Random(0)
+    state = model.observe(current_level)
+    while (state[2] or state[3] is not None) and not current_level.has_level_ended():
+        data = current_level.snapshot()
+        numbers, entity_ids = dict(model.numbers), list(model.entity_ids)
+        choices = list(model.expand(state, current_level.score))
+        assert choices
+        for step, _, next_score, next_state in choices:
+            current_level.restore(data)
+            model.numbers, model.entity_ids = dict(numbers), list(entity_ids)
+            _take_step(current_level, model, step)
+            if not current_level.has_level_ended():
+                assert model.observe(current_level) == next_state
+                assert current_level.score == pytest.approx(next_score)
+        plan = model.search(state, current_level.score, 600)[0] if random_stream.random() < 0.9 else None
+        step = plan[0][0] if plan else random_stream.choice(choices)[0]
+        current_level.restore(data)
+        model.numbers, model.entity_ids = numbers, entity_ids
+        _take_step(current_level, model, step)
+        state = model.observe(current_level)
+    assert current_level.sold_cakes > 0
+
+@pytest.mark.parametrize('level_name', ['LevelOne', 'LevelTwo', 'LevelThree'])
+def test_solver_wins_story_levels(level_name):
+    solution = solver.solve(getattr(level, level_name)(seed=0), max_time=600.0)
+    assert solution.won == 1
+    assert solution.sold_cakes > 0
+    assert 0.0 <= solution.difficulty < 1.0
+
+@pytest.mark.parametrize('level_name', ['LevelTwo', 'LevelThree'])
+def test_solver_does_no_worse_than_greedy(level_name):
+    greedy = sweep.run_chunk(level_name, {}, 'greedy', 0, 1, 0.5, 600.0)
+    solution = solver.solve(getattr(level, level_name)(seed=0), max_time=600.0)
+    assert solution.score <= greedy['score'][0]
+
+def test_solution_recording_replays_the_run():
+    solution = solver.solve(level.LevelTwo(seed=0), max_time=600.0)
+    replayed_level = replay.replay(solution.recording)
+    assert replayed_level.tick_running == solution.level.tick_running
+    assert replayed_level.score == solution.level.score
+    assert replayed_level.sold_cakes == solution.sold_cakes
+
+def test_solver_policy_is_registered():
+    assert isinstance(policy.get_policy('solver'), solver.SolverPolicy)
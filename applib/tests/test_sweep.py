@@ -0,0 +1,91 @@
+import pytest
+
+import applib
+
+from applib.model import level
+from applib.tools import policy
+from applib.tools import sweep
+
+
+def test_make_grid():
+    grid = sweep.make_grid({'a': [1, 2], 'b': ['x', 'y', 'z']})
+    assert len(grid) == 6
+    assert grid[0] == {'a': 1, 'b': 'x'}
+    assert grid[-1] == {'a': 2, 'b': 'z'}
+
+def test_level_factory_applies_parameters():
+    factory = sweep.LevelFactory(level.LevelThree, {
+        'alt_suspicion_rate': 0.5,
+        'station_cooking.duration': 2.0,
+    })
+    new_level = factory()
+    assert isinstance(new_level, level.LevelThree)
+    assert new_level.alt_suspicion_rate == 0.5
+    assert level.LevelThree.alt_suspicion_rate != 0.5
+    cooking = new_level.get_device('station_cooking')
+    assert cooking.duration_ticks == 120
+    assert type(cooking).duration_ticks != 120
+
+def test_level_factory_sets_patience_on_the_level():
+    factory = sweep.LevelFactory(level.EndlessLevel, {'patience.cop_dog': 5})
+    new_level = factory(seed=0)
+    assert new_level.customer_patience['cop_dog'] == 5
+    assert level.Customer.customer_patience['cop_dog'] != 5
+    assert level.EndlessLevel.customer_patience['cop_dog'] != 5
+    customer = level.Customer(new_level, level.Order(), 'cop_dog')
+    assert customer.patience_ticks == new_level.get_ticks(5)
+    assert level.Customer(level.EndlessLevel(seed=0), level.Order(), 'cop_dog').start_patience != 5
+
+def test_sweeps_need_runs():
+    with pytest.raises(ValueError):
+        list(sweep.run_sweep('LevelOne', [{}], 0, workers=1))
+    with pytest.raises(SystemExit):
+        sweep.parse_arguments(['LevelOne', '-n', '0'])
+
+def test_level_factory_rejects_unknown_parameters():
+    with pytest.raises(ValueError):
+        sweep.LevelFactory(level.LevelThree, {'not_a_parameter': 1})
+    with pytest.raises(ValueError):
+        sweep.LevelFactory(level.LevelThree, {'patience.nobody': 1})
+    with pytest.raises(ValueError):
+        sweep.LevelFactory(level.LevelThree, {'station_cooking.colour': 1})
+
+@pytest.mark.parametrize('level_name', ['LevelOne', 'LevelTwo', 'LevelThree', 'LevelFour'])
+def test_greedy_policy_wins_story_levels(level_name):
+    record = sweep.run_chunk(level_name, {}, 'greedy', 0, 1, 0.5, 600.0)
+    assert record['won'] == [1]
+    assert record['sold_cakes'][0] > 0
+
+def test_idle_policy_fails():
+    record = sweep.run_chunk('LevelOne', {}, 'idle', 0, 1, 0.5, 600.0)
+    assert record['won'] == [0]
+    assert record['sold_cakes'] == [0]
+
+def test_low_tick_rate_gives_equivalent_outcomes():
+    fast = sweep.run_chunk('LevelThree', {}, 'greedy', 0, 2, 0.5, 600.0)
+    slow = sweep.run_chunk('LevelThree', {}, 'greedy', 0, 2, 0.5, 600.0, tick_rate=10)
+    assert slow['tick_rate'] == 10
+    assert slow['won'] == fast['won']
+    assert slow['sold_cakes'] == fast['sold_cakes']
+
+def test_run_sweep_matches_serial_runs():
+    grid = sweep.make_grid({'customer_time_min': [2, 4]})
+    kwargs = dict(runs=3, seed=5, max_time=60.0, chunk_size=2)
+    serial = sweep.summarise(sweep.run_sweep('EndlessLevel', grid, workers=1, **kwargs))
+    parallel = sweep.summarise(sweep.run_sweep('EndlessLevel', grid, workers=2, **kwargs))
+    key = lambda summary: summary['parameters']['customer_time_min']
+    assert sorted(serial, key=key) == sorted(parallel, key=key)
+    assert [summary['runs'] for summary in serial] == [3, 3]
+
+def test_scripted_policy_is_read_from_a_file(tmp_path):
+    script_path = tmp_path / 'script.json'
+    script_path.write_text('[[30, "station_bin", 0], [0, "station_dough", 0]]')
+    scripted_policy = policy.get_policy(f'scripted:{script_path}')
+    assert isinstance(scripted_policy, policy.ScriptedPolicy)
+    assert scripted_policy.script == [(0, 'station_dough', 0), (30, 'station_bin', 0)]
+    new_level = level.LevelOne(seed=0)
+    scripted_policy(new_level)
+    assert new_level.held_item is not None
+    record = sweep.run_chunk('LevelOne', {}, f'scripted:{script_path}', 0, 1, 0.5, 600.0)
+    assert record['policy'] == f'scripted:{script_path}'
+    assert record['won'] == [0]
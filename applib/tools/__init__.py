@@ -1,6 +1,12 @@
 '''applib.tools -- simple application support modules
 
+The `policy` and `sweep` modules play levels without a window and are imported
+on demand rather than here.
+
 '''
 
-from . import command
-from . import settings
+from applib.constants import HEADLESS
+
+if not HEADLESS:
+    from . import command
+    from . import settings
@@ -40,6 +40,14 @@ def parse_arguments():
         action='store_true', dest='fullscreen', default=None,
         help='run in fullscreen mode')
 
+    parser.add_argument('--tick-rate',
+        action='store', dest='tick_rate', default=None, type=float,
+        metavar='HZ', help='run the game at HZ ticks per second')
+
+    parser.add_argument('--remote-level',
+        action='store_true', dest='remote_level', default=None,
+        help='simulate levels in a separate process')
+
     ## Debugging options
 
     if DEBUG:
@@ -0,0 +1,444 @@
+'''applib.tools.montecarlo -- vectorised survival simulation of endless levels
+
+Plays a great many runs of a level with random customers, such as
+`EndlessLevel`, side by side as NumPy arrays, each step of the simulation
+advancing every run by one tick at once. The player is replaced by a
+`ServiceModel`, which serves the customers one at a time in order of arrival,
+taking a set time for each ordered item. Everything else follows the level:
+the random arrivals between `customer_time_min` and `customer_time_max`, the
+orders drawn from `customer_things`, the patience of each customer type, the
+score for serving a customer, and the suspicion rate growing with every happy
+and sad customer until the run fails.
+
+The results are the distribution of the time each run survived for and the
+suspicion of the surviving runs over time. `play_level` plays a real `Level`
+with the same service model, one tick at a time, so that `validate` can check
+the simulation against the game on a sample of runs.
+
+NumPy is only needed by `simulate` and the command line tool, for example:
+
+    APPLIB_HEADLESS=1 python -m applib.tools.montecarlo EndlessLevel \\
+        -n 100000 --max-time 600 --validate 50
+
+'''
+
+import argparse
+import json
+import math
+import sys
+import types
+
+import applib
+
+from applib.constants import ENDLESS_HAPPY_GROWTH_RATE
+from applib.constants import ENDLESS_SAD_GROWTH_RATE
+from applib.constants import TICK_RATE
+from applib.model import level
+from applib.tools import recipes
+from applib.tools import sweep
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#: The least patience ratios of the score brackets (see `Customer.get_score_bracket`).
+PATIENCE_THRESHOLDS = (0.8, 0.4, 0.2, 0.05)
+
+#: The survival time quantiles reported by `SimulationResult.summary`.
+SUMMARY_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def get_work_ticks(seconds, tick_rate):
+    '''Return the whole ticks needed for the given work time, at least one.
+
+    '''
+    if math.isinf(seconds):
+        return math.inf
+    return max(1, math.ceil(seconds * tick_rate - 1e-9))
+
+
+class ServiceModel(object):
+    '''The time the player takes to serve each customer.
+
+    A customer takes `customer_time` seconds plus the time in `item_times` for
+    each item class in their order. Items missing from `item_times` are never
+    served, and the customer is lost.
+
+    '''
+
+    def __init__(self, item_times, customer_time=0.0):
+        self.item_times = dict(item_times)
+        self.customer_time = customer_time
+
+    @classmethod
+    def from_recipes(cls, level_class, action_time=0.5, customer_time=0.5):
+        '''Create a `ServiceModel` from the recipes of a level class.
+
+        Each item takes the time the busiest device, or the player, spends on
+        it (see `RecipeGraph.get_order_time`), which assumes that the player
+        keeps every device working while waiting on the others.
+
+        '''
+        graph = recipes.analyse(level_class, action_time).graph
+        return cls({item_class: graph.get_order_time((item_class,)) for item_class in graph.busy_times}, customer_time)
+
+    def get_seconds(self, item_classes):
+        '''Return the time (in seconds) to serve an order of the given item classes.
+
+        '''
+        return self.customer_time + sum(self.item_times.get(item_class, math.inf) for item_class in item_classes)
+
+
+def get_score_table(level_class):
+    '''Return the score reduction for serving a customer in each patience bracket.
+
+    The brackets are in the order of `PATIENCE_THRESHOLDS`, followed by the
+    bracket below the last threshold.
+
+    '''
+    if not level_class.alt_suspicion_mode:
+        raise ValueError(f'level {level_class.__name__!r} does not use suspicion')
+    table = []
+    for ratio in PATIENCE_THRESHOLDS + (0.0,):
+        customer = types.SimpleNamespace(level=level_class, get_patience_ratio=lambda ratio=ratio: ratio)
+        customer.get_score_bracket = lambda customer=customer: level.Customer.get_score_bracket(customer)
+        table.append(level.Customer.compute_score(customer))
+    return table
+
+
+## Simulation
+## ----------
+
+class SimulationResult(object):
+    '''The outcome of a batch of simulated runs.
+
+    '''
+
+    def __init__(self, level_class, runs, max_time, tick_rate, survival_times, sample_times, suspicion, alive):
+        self.level_class = level_class
+        self.runs = runs
+        self.max_time = max_time
+        self.tick_rate = tick_rate
+        #: The time (in seconds) at which each run failed, or infinite if it lasted `max_time`.
+        self.survival_times = survival_times
+        #: The times (in seconds) at which the suspicion was sampled.
+        self.sample_times = sample_times
+        #: The suspicion quantiles of the surviving runs at each sample time,
+        #: a row for each of `SUMMARY_QUANTILES` and then the mean.
+        self.suspicion = suspicion
+        #: The fraction of runs surviving at each sample time.
+        self.alive = alive
+
+    def summary(self):
+        '''Return the survival time distribution as a dictionary of plain values.
+
+        '''
+        survived = numpy.isinf(self.survival_times)
+        times = numpy.minimum(self.survival_times, self.max_time)
+        quantiles = numpy.quantile(times, SUMMARY_QUANTILES)
+        return {
+            'level': self.level_class.__name__,
+            'runs': self.runs,
+            'max_time': self.max_time,
+            'tick_rate': self.tick_rate,
+            'survival_rate': round(float(survived.mean()), 4),
+            'survival_time_mean': round(float(times.mean()), 4),
+            'survival_time_quantiles': {str(q): round(float(value), 4) for q, value in zip(SUMMARY_QUANTILES, quantiles)},
+        }
+
+    def curves(self):
+        '''Return the suspicion and survival curves as a dictionary of plain lists.
+
+        '''
+        curves = {
+            'time': [round(float(value), 4) for value in self.sample_times],
+            'alive': [round(float(value), 4) for value in self.alive],
+            'suspicion_mean': [round(float(value), 4) for value in self.suspicion[-1]],
+        }
+        for q, row in zip(SUMMARY_QUANTILES, self.suspicion):
+            curves[f'suspicion_{q}'] = [round(float(value), 4) for value in row]
+        return curves
+
+
+def _get_customer_tables(level_class, service_model, tick_rate):
+    '''Return the customer type tables used by `simulate`, as arrays.
+
+    '''
+    _, customer_types, order_tables = level_class.compile_customer_things()
+    patience = [level.seconds_to_ticks(level_class.customer_patience[customer_type], tick_rate)
+        for customer_type in customer_types]
+    order_min = [order_tables[customer_type][0] for customer_type in customer_types]
+    order_max = [order_tables[customer_type][1] for customer_type in customer_types]
+    option_counts = [len(order_tables[customer_type][2]) for customer_type in customer_types]
+    option_times = numpy.full((len(customer_types), max(option_counts)), math.inf)
+    for index, customer_type in enumerate(customer_types):
+        for option_index, option in enumerate(order_tables[customer_type][2]):
+            option_times[index, option_index] = service_model.get_seconds((option,)) - service_model.customer_time
+    return (
+        numpy.array(patience, dtype=numpy.int64),
+        numpy.array(order_min, dtype=numpy.int64),
+        numpy.array(order_max, dtype=numpy.int64),
+        numpy.array(option_counts, dtype=numpy.int64),
+        option_times,
+    )
+
+def _first_rows(mask, keys=None):
+    '''Return the row of each column of `mask` that is set, with the least key.
+
+    Ties go to the first row, and every column must have a row set.
+
+    '''
+    rows = numpy.zeros(mask.shape[1], dtype=numpy.int64)
+    if keys is None:
+        found = mask[0].copy()
+        for row in range(1, len(mask)):
+            rows[~found & mask[row]] = row
+            found |= mask[row]
+        return rows
+    best = numpy.where(mask[0], keys[0], numpy.iinfo(numpy.int64).max)
+    for row in range(1, len(mask)):
+        better = mask[row] & (keys[row] < best)
+        rows[better] = row
+        best = numpy.where(better, keys[row], best)
+    return rows
+
+def simulate(level_class=None, service_model=None, runs=100000, max_time=600.0, tick_rate=10.0, seed=0, sample_time=1.0):
+    '''Simulate many runs of a level with random customers in lockstep.
+
+    Every run plays the level at `tick_rate` ticks per second, exactly as
+    `Level.tick` would for that rate, for up to `max_time` seconds. The
+    suspicion is sampled every `sample_time` seconds.
+
+    '''
+    if numpy is None:
+        raise RuntimeError('the Monte Carlo simulation needs NumPy')
+    if level_class is None:
+        level_class = level.EndlessLevel
+    if service_model is None:
+        service_model = ServiceModel.from_recipes(level_class)
+    random_stream = numpy.random.default_rng(seed)
+
+    patience_table, order_min, order_max, option_counts, option_times = \
+        _get_customer_tables(level_class, service_model, tick_rate)
+    score_table = numpy.array(get_score_table(level_class))
+    thresholds = numpy.array(sorted(PATIENCE_THRESHOLDS))
+    spaces = level_class.customer_spaces_specification
+    tick_scale = TICK_RATE / tick_rate
+    base_rate = level_class.alt_suspicion_rate
+    arrival_min, arrival_max = level_class.customer_time_min, level_class.customer_time_max
+    max_ticks = level.seconds_to_ticks(max_time, tick_rate)
+    sample_ticks = max(1, int(round(sample_time * tick_rate)))
+
+    # The state of each run still going, which is compacted as runs fail.
+    # The customer arrays have a row for each customer space, since reducing
+    # over a short last axis is far slower than combining a few long rows.
+    run_ids = numpy.arange(runs)
+    score = numpy.zeros(runs)
+    happy = numpy.zeros(runs)
+    sad = numpy.zeros(runs)
+    next_arrival = numpy.full(runs, -1, dtype=numpy.int64)
+    occupied = numpy.zeros((spaces, runs), dtype=bool)
+    arrived = numpy.zeros((spaces, runs), dtype=numpy.int64)
+    patience_end = numpy.zeros((spaces, runs), dtype=numpy.int64)
+    patience_start = numpy.ones((spaces, runs), dtype=numpy.int64)
+    work = numpy.zeros((spaces, runs))
+
+    survival_times = numpy.full(runs, math.inf)
+    sample_times, suspicion, alive = [], [], []
+
+    for tick in range(1, max_ticks + 1):
+        # Runs caught at the start of the tick fail (see `Level.has_level_ended`).
+        rate = base_rate + ENDLESS_SAD_GROWTH_RATE * sad + ENDLESS_HAPPY_GROWTH_RATE * happy
+        failed = score >= level_class.alt_suspicion_time * rate * TICK_RATE
+        if failed.any():
+            survival_times[run_ids[failed]] = tick / tick_rate
+            keep = ~failed
+            run_ids, score, happy, sad, next_arrival = \
+                run_ids[keep], score[keep], happy[keep], sad[keep], next_arrival[keep]
+            occupied, arrived, patience_end, patience_start, work = \
+                occupied[:, keep], arrived[:, keep], patience_end[:, keep], patience_start[:, keep], work[:, keep]
+            if len(run_ids) == 0:
+                break
+
+        # Customers served last tick leave happy, the rest leave sad once out of patience.
+        served = occupied & (work <= 0.0)
+        lost = occupied & (work > 0.0) & (patience_end <= tick)
+        if served.any():
+            ratio = (patience_end - (tick - 1)) / patience_start
+            brackets = len(thresholds) - numpy.searchsorted(thresholds, ratio, side='right')
+            score -= numpy.where(served, score_table[brackets], 0.0).sum(axis=0)
+            happy += served.sum(axis=0)
+        if lost.any():
+            sad += lost.sum(axis=0)
+        occupied &= ~(served | lost)
+
+        rate = base_rate + ENDLESS_SAD_GROWTH_RATE * sad + ENDLESS_HAPPY_GROWTH_RATE * happy
+        score = numpy.maximum(0.0, score + rate * tick_scale)
+
+        # Customers arrive as in `RandomCustomerLevel.check_and_add_customer`.
+        unset = next_arrival < 0
+        if unset.any():
+            delays = random_stream.random(unset.sum()) * (arrival_max - arrival_min) + arrival_min
+            next_arrival[unset] = tick + numpy.ceil(delays * tick_rate - 1e-9).astype(numpy.int64)
+        free = ~occupied
+        arriving = numpy.flatnonzero(free.any(axis=0) & (tick >= next_arrival))
+        if len(arriving) > 0:
+            count = len(arriving)
+            slots = _first_rows(free[:, arriving])
+            customer_types = random_stream.integers(0, len(patience_table), count)
+            sizes = random_stream.integers(order_min[customer_types], order_max[customer_types] + 1)
+            seconds = numpy.full(count, service_model.customer_time)
+            for position in range(int(order_max.max())):
+                options = (random_stream.random(count) * option_counts[customer_types]).astype(numpy.int64)
+                seconds += numpy.where(position < sizes, option_times[customer_types, options], 0.0)
+            occupied[slots, arriving] = True
+            arrived[slots, arriving] = tick
+            patience_start[slots, arriving] = patience_table[customer_types]
+            patience_end[slots, arriving] = tick + patience_table[customer_types]
+            work[slots, arriving] = numpy.maximum(1.0, numpy.ceil(seconds * tick_rate - 1e-9))
+            next_arrival[arriving] = -1
+
+        # The player works on the first customer to arrive who is still waiting.
+        waiting = occupied & (work > 0.0)
+        serving = numpy.flatnonzero(waiting.any(axis=0))
+        if len(serving) > 0:
+            slots = _first_rows(waiting[:, serving], arrived[:, serving])
+            work[slots, serving] -= 1.0
+
+        if tick % sample_ticks == 0:
+            sample_times.append(tick / tick_rate)
+            alive.append(len(run_ids) / runs)
+            suspicion.append(numpy.append(numpy.quantile(score, SUMMARY_QUANTILES), score.mean()))
+
+    suspicion = numpy.array(suspicion).T if suspicion else numpy.zeros((len(SUMMARY_QUANTILES) + 1, 0))
+    return SimulationResult(level_class, runs, max_time, tick_rate, survival_times,
+        numpy.array(sample_times), suspicion, numpy.array(alive))
+
+
+## Validation
+## ----------
+
+def play_level(new_level, service_model, max_ticks):
+    '''Play a real level with a service model, and return the time it survived.
+
+    The level is ticked one tick at a time, and after each tick the first
+    customer to arrive who is still waiting is given one tick of work, their
+    order being filled once the work is done. Returns infinity if the level
+    lasted `max_ticks` ticks.
+
+    '''
+    outcome = []
+    new_level.push_handlers(
+        on_level_success=lambda: outcome.append(1),
+        on_level_fail=lambda: outcome.append(0),
+    )
+    work = {}
+    while (len(outcome) == 0) and (new_level.tick_running < max_ticks):
+        new_level.tick()
+        if outcome:
+            break
+        for customer in new_level.customers:
+            if customer not in work:
+                item_classes = [type(order_item) for order_item in customer.order.items]
+                work[customer] = get_work_ticks(service_model.get_seconds(item_classes), new_level.tick_rate)
+            if work[customer] > 0:
+                work[customer] -= 1
+                if work[customer] <= 0:
+                    for order_item in list(customer.order.items):
+                        customer.interact(type(order_item)(new_level))
+                break
+        for customer in [customer for customer in work if customer.level is None]:
+            del work[customer]
+    if outcome and (outcome[0] == 0):
+        return new_level.tick_running / new_level.tick_rate
+    return math.inf
+
+def validate(level_class=None, service_model=None, runs=50, max_time=600.0, tick_rate=10.0, seed=0, simulated_runs=10000):
+    '''Compare the survival times of simulated runs with those of real levels.
+
+    Returns the summaries of `runs` real levels, played with consecutive
+    seeds from `seed`, and of `simulated_runs` simulated ones.
+
+    '''
+    if level_class is None:
+        level_class = level.EndlessLevel
+    if service_model is None:
+        service_model = ServiceModel.from_recipes(level_class)
+    max_ticks = level.seconds_to_ticks(max_time, tick_rate)
+    survival_times = [play_level(level_class(seed=run_seed, tick_rate=tick_rate), service_model, max_ticks)
+        for run_seed in range(seed, seed + runs)]
+    played = SimulationResult(level_class, runs, max_time, tick_rate, numpy.array(survival_times),
+        numpy.zeros(0), numpy.zeros((len(SUMMARY_QUANTILES) + 1, 0)), numpy.zeros(0))
+    simulated = simulate(level_class, service_model, simulated_runs, max_time, tick_rate, seed)
+    return {'played': played.summary(), 'simulated': simulated.summary()}
+
+
+def parse_arguments(arguments=None):
+    '''Parse the command line arguments for the Monte Carlo tool.
+
+    '''
+
+    parser = argparse.ArgumentParser(prog='python -m applib.tools.montecarlo',
+        description='Simulate many runs of an endless level at once.')
+
+    parser.add_argument('level',
+        nargs='?', default='EndlessLevel',
+        help='name of the level class, or its dotted path')
+
+    parser.add_argument('-n', '--runs',
+        action='store', dest='runs', default=100000, type=int,
+        help='number of runs to simulate')
+
+    parser.add_argument('--seed',
+        action='store', dest='seed', default=0, type=int,
+        help='seed of the simulation')
+
+    parser.add_argument('--max-time',
+        action='store', dest='max_time', default=600.0, type=float,
+        metavar='SECONDS', help='time after which a run counts as survived')
+
+    parser.add_argument('--tick-rate',
+        action='store', dest='tick_rate', default=10.0, type=float,
+        metavar='HZ', help='ticks per second of the simulation')
+
+    parser.add_argument('--action-time',
+        action='store', dest='action_time', default=0.5, type=float,
+        metavar='SECONDS', help='time taken by each interaction with a device')
+
+    parser.add_argument('--customer-time',
+        action='store', dest='customer_time', default=0.5, type=float,
+        metavar='SECONDS', help='time taken to serve each customer on top of their items')
+
+    parser.add_argument('--validate',
+        action='store', dest='validate', default=0, type=int, metavar='RUNS',
+        help='also play this many real levels and compare their survival times')
+
+    parser.add_argument('--curves',
+        action='store_true', dest='curves',
+        help='print the suspicion and survival curves')
+
+    return parser.parse_args(arguments)
+
+def main(arguments=None):
+    '''Run a simulation from the command line.
+
+    '''
+    if numpy is None:
+        sys.exit('the Monte Carlo tool needs NumPy installed')
+    arguments = parse_arguments(arguments)
+    level_class = sweep.get_level_class(arguments.level)
+    service_model = ServiceModel.from_recipes(level_class, arguments.action_time, arguments.customer_time)
+    result = simulate(level_class, service_model, arguments.runs, arguments.max_time,
+        arguments.tick_rate, arguments.seed)
+    print(json.dumps(result.summary()))
+    if arguments.curves:
+        print(json.dumps(result.curves()))
+    if arguments.validate:
+        print(json.dumps(validate(level_class, service_model, arguments.validate, arguments.max_time,
+            arguments.tick_rate, arguments.seed, min(arguments.runs, 10000))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+'''applib.tools.policy -- automatic players for levels
+
+A policy is a callable which is given a `Level` and may interact with it once.
+Tools such as `applib.tools.sweep` call a policy repeatedly, advancing the
+level between calls, to play through a level without a human.
+
+'''
+
+import importlib
+import json
+
+import applib
+
+from applib.model import device
+from applib.model import item
+
+
+class IdlePolicy(object):
+    '''Policy which never does anything.
+
+    '''
+
+    def __call__(self, level):
+        pass
+
+
+class ScriptedPolicy(object):
+    '''Policy which performs a fixed list of interactions.
+
+    The script is a sequence of `(tick, name, index)` entries. The `name` is
+    either a device name or `'customer'`, and `index` picks between several
+    devices with the same name or between the customers in the queue.
+
+    '''
+
+    def __init__(self, script):
+        self.script = sorted(script, key=lambda entry: entry[0])
+        self.position = 0
+
+    @classmethod
+    def from_file(cls, path):
+        '''Create a policy from a JSON file holding a list of script entries.
+
+        '''
+        with open(path) as script_file:
+            return cls([tuple(entry) for entry in json.load(script_file)])
+
+    def __call__(self, level):
+        while self.position < len(self.script):
+            tick, name, index = self.script[self.position]
+            if tick > level.tick_running:
+                break
+            self.position += 1
+            if name == 'customer':
+                targets = list(level.customers)
+            else:
+                targets = level.get_devices(name)
+            if index < len(targets):
+                level.interact(targets[index])
+
+
+class GreedyPolicy(object):
+    '''Policy which works towards the most urgent order item it can progress.
+
+    The rules are derived from the recipes of the devices in the level, so the
+    policy plays any level without being told how items are made.
+
+    '''
+
+    #: The maximum depth of the search for a way to make an item.
+    max_depth = 16
+
+    def __init__(self):
+        self._rules_key = None
+
+    def __call__(self, level):
+        target = self.choose(level)
+        if target is not None:
+            level.interact(target)
+
+    ## Rules
+    ## -----
+
+    def _prepare_rules(self, level):
+        '''Derive the production rules for the devices in the level.
+
+        '''
+        device_classes = []
+        for level_device in level.devices:
+            if type(level_device) not in device_classes:
+                device_classes.append(type(level_device))
+        if self._rules_key == device_classes:
+            return
+        self._rules_key = device_classes
+
+        #: The automatic device classes giving out each item class.
+        self.products = {}
+        #: The item classes that may be thrown away with each device class.
+        self.bins = []
+        #: The ways of making each item class on each device class.
+        self.rules = {}
+        #: The item classes that may be picked up while a device is running.
+        self.pickups = {}
+
+        for device_class in device_classes:
+            if issubclass(device_class, device.AutomaticDevice):
+                if device_class.product is None:
+                    self.bins.append(device_class)
+                else:
+                    self.products.setdefault(device_class.product, device_class)
+                continue
+            rules = self.rules.setdefault(device_class, {})
+            pickups = self.pickups.setdefault(device_class, set())
+            for (input_class, current_class), recipe in device_class.recipes.items():
+                output_class, new_class = recipe[:2]
+                if (input_class is None) and (output_class is current_class):
+                    pickups.add(current_class)
+                elif (output_class is None) and (new_class is not None):
+                    rules.setdefault(new_class, []).append((input_class, current_class))
+
+    def _get_devices(self, level, device_class, reserved):
+        for level_device in level.devices_by_class.get(device_class, ()):
+            if level_device not in reserved:
+                yield level_device
+
+    def _can_pick_up(self, level_device):
+        pickups = self.pickups.get(type(level_device), ())
+        return (type(level_device.current_item) in pickups) or not level_device.is_running
+
+    def _get_ingredients(self, item_classes):
+        '''Return every item class that goes into making the given classes.
+
+        '''
+        pending = list(item_classes)
+        ingredients = set(pending)
+        while len(pending) > 0:
+            item_class = pending.pop()
+            for rules in self.rules.values():
+                for input_class, current_class in rules.get(item_class, ()):
+                    for ingredient in (input_class, current_class):
+                        if ingredient not in ingredients:
+                            ingredients.add(ingredient)
+                            pending.append(ingredient)
+        return ingredients
+
+    ## Planning
+    ## --------
+
+    # Plans are tuples whose first element says what should happen next:
+    # `('click', target)`, `('wait', device)`, `('ready', device)` or `('held',)`.
+
+    def _reach(self, level, device_class, target_class, depth, pending, reserved):
+        '''Plan how to get a device of the given class holding the target class.
+
+        '''
+        for level_device in self._get_devices(level, device_class, reserved):
+            if type(level_device.current_item) is (target_class or type(None)):
+                return ('ready', level_device)
+        if depth == 0:
+            return None
+        for input_class, current_class in self.rules[device_class].get(target_class, ()):
+            if input_class in pending:
+                continue
+            plan = self._reach(level, device_class, current_class, depth - 1, pending, reserved)
+            if plan is None:
+                continue
+            elif plan[0] != 'ready':
+                return plan
+            elif input_class is item.Time:
+                return ('wait', plan[1])
+            elif type(level.held_item) is input_class:
+                return ('click', plan[1])
+            else:
+                plan = self._acquire(level, input_class, depth - 1, pending, reserved)
+                if plan is not None:
+                    return plan
+        return None
+
+    def _acquire(self, level, item_class, depth, pending, reserved):
+        '''Plan how to get an item of the given class into the hand.
+
+        '''
+        if type(level.held_item) is item_class:
+            return ('held',)
+        pending = pending + (item_class,)
+
+        # Pick it up from wherever it is already waiting.
+        if level.held_item is None:
+            for device_class in self.rules:
+                for level_device in self._get_devices(level, device_class, reserved):
+                    if type(level_device.current_item) is item_class:
+                        if self._can_pick_up(level_device):
+                            return ('click', level_device)
+
+        # Take it from an automatic device.
+        if (level.held_item is None) and (item_class in self.products):
+            for level_device in self._get_devices(level, self.products[item_class], ()):
+                return ('click', level_device)
+
+        # Make it on a device and then pick it up, possibly using the held item.
+        if depth > 0:
+            for device_class, rules in self.rules.items():
+                if item_class in rules:
+                    plan = self._reach(level, device_class, item_class, depth - 1, pending, reserved)
+                    if (plan is not None) and (plan[0] == 'ready'):
+                        if level.held_item is not None:
+                            continue
+                        return ('wait', plan[1])
+                    elif plan is not None:
+                        return plan
+        return None
+
+    def choose(self, level):
+        '''Return the entity that the policy would interact with next, if any.
+
+        '''
+        self._prepare_rules(level)
+        held_item = level.held_item
+
+        # Work out what is wanted, most urgent first.
+        goals = []
+        customers = sorted(level.customers, key=lambda c: c.patience_ticks)
+        for customer in customers:
+            for order_item in customer.order.items:
+                goals.append((customer, type(order_item)))
+
+        # Serve the held item if anyone wants it.
+        if held_item is not None:
+            for customer in customers:
+                if customer.wants(held_item):
+                    return customer
+
+        # Progress the most urgent goal that can be progressed.
+        reserved = set()
+        for customer, goal_class in goals:
+            plan = self._acquire(level, goal_class, self.max_depth, (), reserved)
+            if plan is None:
+                continue
+            elif plan[0] == 'click':
+                return plan[1]
+            elif plan[0] == 'wait':
+                reserved.add(plan[1])
+
+        # Throw away anything held that is of no use.
+        if held_item is not None:
+            if type(held_item) not in self._get_ingredients(goal for _, goal in goals):
+                for bin_class in self.bins:
+                    for level_device in self._get_devices(level, bin_class, ()):
+                        return level_device
+        return None
+
+
+#: The policies by name; a dotted path is imported when the policy is first used.
+policies = {
+    'greedy': GreedyPolicy,
+    'idle': IdlePolicy,
+    'scripted': ScriptedPolicy.from_file,
+    'solver': 'applib.tools.solver.SolverPolicy',
+}
+
+def get_policy(spec):
+    '''Create a policy from its name or the dotted path of a policy class.
+
+    A policy taking an argument is given it after a colon, such as
+    `scripted:script.json` for a `ScriptedPolicy` read from a file.
+
+    '''
+    name, colon, argument = spec.partition(':')
+    policy_class = policies.get(name, name)
+    if isinstance(policy_class, str):
+        module_name, class_name = policy_class.rsplit('.', 1)
+        policy_class = getattr(importlib.import_module(module_name), class_name)
+    if colon:
+        return policy_class(argument)
+    return policy_class()
@@ -0,0 +1,360 @@
+'''applib.tools.recipes -- production graph analysis for levels
+
+The recipes of the devices in a level make up a production graph: which
+items each device makes out of which others, and how long it takes. A
+`RecipeGraph` builds that graph for a device specification and works out the
+quickest way of making every item, the critical path of which is the item's
+production time, along with how long each device is kept busy on the way and
+so the most of the item that the level's devices can turn out per second.
+
+A `LevelAnalysis` applies the graph to a level's customers, giving a lower
+bound on the gap before each customer which lets the devices keep up with
+their orders. Any customer following the previous one more closely than that
+must be served from items made earlier, or not in time.
+
+Graphs are built once per device specification and analyses once per level
+class, so analysing every level takes milliseconds. The command line tool
+prints the analyses, for example:
+
+    python -m applib.tools.recipes LevelFour --action-time 0.5
+
+'''
+
+import argparse
+import json
+import math
+
+import applib
+
+from applib.model import device
+from applib.model import item
+from applib.model import level
+from applib.model import leveldata
+from applib.tools import sweep
+
+
+class Step(object):
+    '''One interaction with a device on the way to making an item.
+
+    '''
+
+    __slots__ = ('device_class', 'input_class', 'current_class', 'result_class', 'seconds')
+
+    def __init__(self, device_class, input_class, current_class, result_class, seconds):
+        self.device_class = device_class
+        self.input_class = input_class
+        self.current_class = current_class
+        #: The item made, either in the hand or in the device.
+        self.result_class = result_class
+        #: The time (in seconds) the device spends on the step.
+        self.seconds = seconds
+
+    def __repr__(self):
+        names = [getattr(cls, '__name__', None) for cls in
+            (self.device_class, self.input_class, self.current_class, self.result_class)]
+        return '<Step {}: {}, {} -> {}>'.format(*names)
+
+
+def get_device_counts(device_specification):
+    '''Return the number of each device class in a device specification.
+
+    Devices made of several others, such as `MultiPlating`, count as their parts.
+
+    '''
+    counts = {}
+    for device_class, _, _ in device_specification:
+        if issubclass(device_class, device.MultiPlating):
+            counts[device.Plating] = counts.get(device.Plating, 0) + len(device_class.subpositions)
+        else:
+            counts[device_class] = counts.get(device_class, 0) + 1
+    return counts
+
+
+class RecipeGraph(object):
+    '''The production graph of a set of devices.
+
+    Each interaction takes `action_time` seconds on top of any device timer,
+    and keeps both the player and the device busy for that long. With an
+    `action_time` of zero only the device timers count.
+
+    '''
+
+    def __init__(self, device_counts, action_time=0.0):
+        '''Create a `RecipeGraph` for the given number of each device class.
+
+        '''
+        self.device_counts = dict(device_counts)
+        self.action_time = action_time
+
+        #: The least time (in seconds) to get each item class into the hand, and the steps taken.
+        self.production_times = {}
+        self.routes = {}
+
+        # Nodes are an item in the hand, `(None, item class)`, or in a device,
+        # `(device class, item class)`, with the time to get there and how.
+        nodes = {}
+        for device_class in self.device_counts:
+            if issubclass(device_class, device.AutomaticDevice):
+                if device_class.product is not None:
+                    step = Step(device_class, None, None, device_class.product, 0.0)
+                    self._improve(nodes, (None, device_class.product), action_time, (step,))
+            else:
+                nodes[device_class, None] = (0.0, ())
+        changed = True
+        while changed:
+            changed = False
+            inputs = [(item_class, value) for (node_class, item_class), value in nodes.items() if node_class is None]
+            inputs.extend([(None, (0.0, ())), (item.Time, (0.0, ()))])
+            for (device_class, current_class), (current_time, current_route) in list(nodes.items()):
+                if device_class is None:
+                    continue
+                for input_class, (input_time, input_route) in inputs:
+                    output_class, new_class, _ = device_class.compute_transition(input_class, current_class)
+                    if input_class is item.Time:
+                        seconds = device_class.duration if new_class is not current_class else 0.0
+                        time = current_time + seconds
+                    else:
+                        seconds = 0.0
+                        time = max(input_time, current_time) + action_time
+                    route = input_route + current_route
+                    if (new_class is not None) and (new_class is not current_class) and (new_class is not item.Time):
+                        step = Step(device_class, input_class, current_class, new_class, seconds)
+                        changed |= self._improve(nodes, (device_class, new_class), time, route + (step,))
+                    if (output_class is not None) and (output_class is not input_class):
+                        step = Step(device_class, input_class, current_class, output_class, seconds)
+                        changed |= self._improve(nodes, (None, output_class), time, route + (step,))
+
+        for (node_class, item_class), (time, route) in nodes.items():
+            if node_class is None:
+                self.production_times[item_class] = time
+                self.routes[item_class] = route
+
+        #: The time (in seconds) each device class is kept busy making each
+        #: item class, where `None` stands for the player.
+        self.busy_times = {item_class: self._get_busy_times(route) for item_class, route in self.routes.items()}
+
+    @staticmethod
+    def _improve(nodes, node, time, route):
+        old = nodes.get(node)
+        if (old is None) or ((time, len(route)) < (old[0], len(old[1]))):
+            nodes[node] = (time, route)
+            return True
+        return False
+
+    def _get_busy_times(self, route):
+        busy_times = {}
+        for step in route:
+            busy_time = step.seconds if step.input_class is item.Time else self.action_time
+            if (busy_time > 0.0) and not issubclass(step.device_class, device.AutomaticDevice):
+                busy_times[step.device_class] = busy_times.get(step.device_class, 0.0) + busy_time
+        if self.action_time > 0.0:
+            # The player makes every interaction in turn.
+            busy_times[None] = self.action_time * len([step for step in route if step.input_class is not item.Time])
+        return busy_times
+
+    def get_gap(self, busy_times):
+        '''Return the longest time (in seconds) any one device is kept busy, given the busy times of each class.
+
+        '''
+        return max((busy_time / self.device_counts.get(device_class, 1)
+            for device_class, busy_time in busy_times.items()), default=0.0)
+
+    def get_order_time(self, item_classes):
+        '''Return the busiest time (in seconds) for any device making the given items.
+
+        This is the least average time between orders for the items that the
+        devices can keep up with, or infinite if an item cannot be made.
+
+        '''
+        busy_times = {}
+        for item_class in item_classes:
+            if item_class not in self.busy_times:
+                return math.inf
+            for device_class, busy_time in self.busy_times[item_class].items():
+                busy_times[device_class] = busy_times.get(device_class, 0.0) + busy_time
+        return self.get_gap(busy_times)
+
+    def get_throughput(self, item_class):
+        '''Return the most of an item class that the devices can make per second.
+
+        '''
+        order_time = self.get_order_time((item_class,))
+        return 1.0 / order_time if order_time > 0.0 else math.inf
+
+    def get_bottleneck(self, item_class):
+        '''Return the device class that limits the throughput of an item class.
+
+        Returns `None` if the player limits it, or if nothing does.
+
+        '''
+        busy_times = self.busy_times.get(item_class, {})
+        return max(busy_times, default=None,
+            key=lambda device_class: busy_times[device_class] / self.device_counts.get(device_class, 1))
+
+
+#: The graphs built for each `(device counts, action time)` pair.
+_graphs = {}
+
+def get_graph(device_specification, action_time=0.0):
+    '''Return the `RecipeGraph` for a device specification, building it the first time.
+
+    '''
+    counts = get_device_counts(device_specification)
+    key = (frozenset(counts.items()), action_time)
+    graph = _graphs.get(key)
+    if graph is None:
+        graph = _graphs[key] = RecipeGraph(counts, action_time)
+    return graph
+
+
+class LevelAnalysis(object):
+    '''Production bounds for the customers of a level class.
+
+    '''
+
+    def __init__(self, level_class, action_time=0.0):
+        '''Create a `LevelAnalysis` for the level class.
+
+        '''
+        self.level_class = level_class
+        self.graph = get_graph(level_class.device_specification, action_time)
+
+        #: The ordered item classes which cannot be made in the level.
+        self.missing_items = []
+        #: The `(arrival time, gap, least gap)` of each specified customer, in
+        #: seconds, where the least gap is the busiest device time for their
+        #: order that the devices need before the customer arrives.
+        self.spacing = []
+        #: The least average gap between customers, and the level's own.
+        self.least_mean_gap = 0.0
+        self.mean_gap = None
+
+        specification = [entry for entry in level_class.customer_specification if entry is not None]
+        previous_time = 0.0
+        for time, _, order in specification:
+            self._check_items(order)
+            self.spacing.append((time, time - previous_time, self.graph.get_order_time(order)))
+            previous_time = time
+        if specification:
+            self.least_mean_gap = self.graph.get_order_time(
+                [item_class for _, _, order in specification for item_class in order]) / len(specification)
+            self.mean_gap = previous_time / len(specification)
+
+        # Random customers are costed by the busy times of their expected orders.
+        customer_things = getattr(level_class, 'customer_things', None)
+        if customer_things and (None in level_class.customer_specification):
+            _, customer_types, order_tables = level_class.compile_customer_things()
+            busy_times = {}
+            for customer_type in customer_types:
+                order_min, order_max, options = order_tables[customer_type]
+                self._check_items(options)
+                weight = (order_min + order_max) / 2 / len(options) / len(customer_types)
+                for option in options:
+                    for device_class, busy_time in self.graph.busy_times.get(option, {}).items():
+                        busy_times[device_class] = busy_times.get(device_class, 0.0) + weight * busy_time
+            self.least_mean_gap = self.graph.get_gap(busy_times)
+            self.mean_gap = (level_class.customer_time_min + level_class.customer_time_max) / 2
+
+    def _check_items(self, item_classes):
+        for item_class in item_classes:
+            if (item_class not in self.graph.production_times) and (item_class not in self.missing_items):
+                self.missing_items.append(item_class)
+
+    @property
+    def tight_customers(self):
+        '''The indices of the specified customers who arrive sooner than their least gap.
+
+        '''
+        return [index for index, (_, gap, least_gap) in enumerate(self.spacing) if gap < least_gap]
+
+    def as_dict(self):
+        '''Return the analysis as a dictionary of plain values.
+
+        '''
+        ordered = []
+        for entry in self.level_class.customer_specification:
+            if entry is not None:
+                ordered.extend(item_class for item_class in entry[2] if item_class not in ordered)
+        for _, _, options in getattr(self.level_class, 'customer_things', {}).values():
+            ordered.extend(option for _, option in options if option not in ordered)
+        graph = self.graph
+        items = {}
+        for item_class in ordered:
+            if item_class in graph.production_times:
+                bottleneck = graph.get_bottleneck(item_class)
+                items[item_class.__name__] = {
+                    'production_time': round(graph.production_times[item_class], 4),
+                    'route': [step.device_class.__name__ for step in graph.routes[item_class]],
+                    'throughput': round(graph.get_throughput(item_class), 4),
+                    'bottleneck': 'player' if bottleneck is None else bottleneck.__name__,
+                }
+        return {
+            'level': self.level_class.__name__,
+            'items': items,
+            'missing_items': [item_class.__name__ for item_class in self.missing_items],
+            'spacing': [[time, round(gap, 4), round(least_gap, 4)] for time, gap, least_gap in self.spacing],
+            'tight_customers': self.tight_customers,
+            'least_mean_gap': round(self.least_mean_gap, 4),
+            'mean_gap': None if self.mean_gap is None else round(self.mean_gap, 4),
+        }
+
+
+#: The analyses made for each `(level class, action time)` pair, with the
+#: device and customer specifications they were made for.
+_analyses = {}
+
+def analyse(level_class, action_time=0.0):
+    '''Return the `LevelAnalysis` for a level class, making it the first time.
+
+    The analysis is made again if the level class is given a new device or
+    customer specification.
+
+    '''
+    key = (level_class, action_time)
+    cached = _analyses.get(key)
+    if (cached is None) or (cached[0] is not level_class.device_specification) \
+            or (cached[1] is not level_class.customer_specification):
+        analysis = LevelAnalysis(level_class, action_time)
+        cached = _analyses[key] = (level_class.device_specification, level_class.customer_specification, analysis)
+    return cached[2]
+
+def get_level_classes():
+    '''Return every level class declared in the level data files.
+
+    '''
+    return [level.get_level_class(name) for name in leveldata.list_levels()]
+
+
+def parse_arguments(arguments=None):
+    '''Parse the command line arguments for the recipe tool.
+
+    '''
+
+    parser = argparse.ArgumentParser(prog='python -m applib.tools.recipes',
+        description='Work out production bounds from the recipes of each level.')
+
+    parser.add_argument('levels',
+        nargs='*', metavar='level',
+        help='name of a level class, or its dotted path (default: every level)')
+
+    parser.add_argument('--action-time',
+        action='store', dest='action_time', default=0.0, type=float,
+        metavar='SECONDS', help='time taken by each interaction with a device')
+
+    return parser.parse_args(arguments)
+
+def main(arguments=None):
+    '''Print the analyses of levels from the command line.
+
+    '''
+    arguments = parse_arguments(arguments)
+    if arguments.levels:
+        level_classes = [sweep.get_level_class(name) for name in arguments.levels]
+    else:
+        level_classes = get_level_classes()
+    for level_class in level_classes:
+        print(json.dumps(analyse(level_class, arguments.action_time).as_dict()))
+
+
+if __name__ == '__main__':
+    main()
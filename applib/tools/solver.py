@@ -0,0 +1,993 @@
+'''applib.tools.solver -- search based automatic player
+
+`SolverPolicy` plays a level by searching ahead over the interactions open to
+it. The search runs on a `LevelModel`, a compact copy of the level which adds
+items using each device class's own `transitions` table, where a state is just
+the held item, the contents and timers of every device with recipes, the
+outstanding orders and the next customer due from the level's customer
+specification. Times in a state are counted from the state itself, so the same
+situation at two different ticks is the same state, and a transposition table
+keyed on the states keeps the search from exploring any of them twice. For the
+same reason the customers and device contents of different states repeat a
+lot, and the model keeps what it works out for them.
+
+The search is a weighted best-first search for the quickest way to serve
+every customer, where each interaction takes `action_time` seconds and each
+customer who runs out of patience costs `lost_time`, leaving out any plan in
+which the score would fail the level. It is guided by an estimate of the work
+left, from the shortest ways of making each ordered item out of whatever is
+already in the level. The policy follows the plan it finds for as long as the
+level does what the model predicted, and searches again when it does not, for
+example when a customer arrives in an endless level.
+
+The `solve` function plays a whole level with the solver and records the run,
+and the command line tool uses it to rate how hard a level is and to save the
+recordings as replay fixtures, for example:
+
+    APPLIB_HEADLESS=1 python -m applib.tools.solver LevelFour -n 8 -o fixtures
+
+'''
+
+import argparse
+import heapq
+import json
+import math
+import os
+import statistics
+import sys
+
+import applib
+
+from applib.constants import HEADLESS
+from applib.constants import MAX_SCORE_FROM_CUSTOMER
+from applib.constants import PLATE_EFFICIENCY
+from applib.model import device
+from applib.model import item
+from applib.model import level
+from applib.model import replay
+from applib.tools import sweep
+
+
+#: The kinds of step in a plan.
+ACTION_DEVICE = 0
+ACTION_SERVE = 1
+ACTION_WAIT = 2
+
+_PLATE_ID = item.Plate.item_id
+_TIME_ID = item.Time.item_id
+
+def _id_of(item_class):
+    return 0 if item_class is None else item_class.item_id
+
+def _code_of(level_item):
+    '''Return the code of an item: its `item_id`, plus that of any held item shifted by 8 bits.
+
+    '''
+    if level_item is None:
+        return 0
+    elif level_item.holds is None:
+        return level_item.item_id
+    return level_item.item_id | (level_item.holds.item_id << 8)
+
+def _schedule(end, now, ruined_ticks):
+    # Mirrors `Device.get_next_tick`.
+    if end is None:
+        return None
+    elif end > now:
+        return end
+    elif ruined_ticks > 0:
+        return end + ruined_ticks
+    return None
+
+
+class _ScoredCustomer(object):
+    # Stands in for a customer with the given patience ratio, to score them
+    # with the level's own rules.
+
+    get_score_bracket = level.Customer.get_score_bracket
+    compute_score = level.Customer.compute_score
+
+    def __init__(self, scored_level, patience_ratio):
+        self.level = scored_level
+        self.patience_ratio = patience_ratio
+
+    def get_patience_ratio(self):
+        return self.patience_ratio
+
+
+class LevelModel(object):
+    '''Compact model of a level, used by the search.
+
+    A state is a `(held, slots, customers, arrival)` tuple. The held item is
+    an item code (see `_code_of`). Each slot is the `(item code, timer end,
+    scheduled tick)` of a device with recipes, each customer is `(number,
+    patience, ordered item ids)`, numbering the customers in the order they
+    arrive, and the arrival is the `(index, tick)` of the next customer due
+    from `arrivals`, or `None`. All of the ticks are counted from the state.
+
+    Automatic devices have no state, and only the first device giving out
+    each product and the first bin are kept as targets.
+
+    '''
+
+    def __init__(self, new_level, action_ticks, lost_penalty):
+        '''Create a `LevelModel` for the devices, customers and scoring of the level.
+
+        '''
+        self.action_ticks = action_ticks
+        self.lost_penalty = lost_penalty
+
+        #: The devices interacted with by `ACTION_DEVICE` steps; the slots come first.
+        self.targets = []
+        #: The `transitions` table, duration and ruin time (in ticks) of each slot.
+        self.tables = []
+        self.durations = []
+        self.ruins = []
+        #: The `(target index, item id)` of each automatic device giving out a product.
+        self.products = []
+        #: The target index of a bin, if there is one.
+        self.bin = None
+        #: The starting patience (in ticks) of each customer number seen so far.
+        self.start_patience = {}
+
+        automatic_devices = []
+        for level_device in new_level.devices:
+            if getattr(level_device, 'subdevices', None):
+                continue
+            elif isinstance(level_device, device.AutomaticDevice):
+                automatic_devices.append(level_device)
+            else:
+                self.targets.append(level_device)
+                self.tables.append(level_device.transitions)
+                self.durations.append(level_device.duration_ticks)
+                self.ruins.append(level_device.ruined_ticks)
+        self.slot_count = len(self.targets)
+        seen_products = set()
+        for level_device in automatic_devices:
+            product_id = _id_of(level_device.product)
+            if product_id in seen_products:
+                continue
+            seen_products.add(product_id)
+            if product_id == 0:
+                self.bin = len(self.targets)
+            else:
+                self.products.append((len(self.targets), product_id))
+            self.targets.append(level_device)
+
+        #: The `(tick, patience, ordered item ids)` of each customer still to
+        #: come, if the level says who they are; customers of an unknown type
+        #: are given the least patience of any.
+        self.arrivals = []
+        self.customer_spaces = new_level.customer_spaces_specification
+        specification = new_level.customer_specification
+        if None not in specification:
+            patience_table = new_level.customer_patience
+            for time, customer_type, order in specification:
+                patience = patience_table[customer_type] if customer_type is not None else min(patience_table.values())
+                self.arrivals.append((new_level.get_ticks(time), new_level.get_ticks(patience),
+                    tuple(sorted(item_class.item_id for item_class in order))))
+        #: The number given to each customer entity seen so far, and the entity of each number.
+        self.numbers = {}
+        self.entity_ids = []
+        #: The number of the first customer in `arrivals`.
+        self.first_number = len(new_level.customers)
+        for number, (_, patience, _) in enumerate(self.arrivals, self.first_number):
+            self.start_patience[number] = patience
+
+        # Work out the score as the level would, so that plans which fail the level can be left out.
+        alt_mode = new_level.alt_suspicion_mode
+        sign = -1 if alt_mode else 1
+        #: The change in the score from serving a customer at each whole
+        #: percentage of their patience left, from losing a customer, and
+        #: from each tick that the level runs.
+        self.serve_values = [sign * _ScoredCustomer(new_level, percentage / 100).compute_score() for percentage in range(101)]
+        self.lost_value = 0 if alt_mode else MAX_SCORE_FROM_CUSTOMER
+        self.tick_value = new_level.suspicion_per_tick if alt_mode else 0.0
+        #: The score at which the level is failed.
+        self.fail_score = new_level.fail_score
+
+        #: The results of `advance_customers`, by their arguments, and of
+        #: interacting with each slot in `expand`; there are few of them,
+        #: since times are counted from each state.
+        self._advanced_customers = {}
+        self._interactions = {}
+        self._prepare_estimates()
+
+    ## States
+    ## ------
+
+    def observe(self, current_level):
+        '''Return the current state of the level.
+
+        '''
+        now = current_level.tick_running
+        slots = []
+        for level_device in self.targets[:self.slot_count]:
+            end = level_device.timer_end_tick
+            due = current_level.scheduler.get_scheduled_tick(level_device)
+            slots.append((
+                _code_of(level_device.current_item),
+                None if end is None else end - now,
+                None if due is None else due - now,
+            ))
+        customers = []
+        for customer in current_level.customers:
+            number = self.numbers.get(customer.entity_id)
+            if number is None:
+                # Customers arrive in order, and so are numbered when first seen.
+                number = self.numbers[customer.entity_id] = len(self.entity_ids)
+                self.entity_ids.append(customer.entity_id)
+            if customer.order.items:
+                self.start_patience[number] = customer.start_patience_ticks
+                customers.append((
+                    number,
+                    customer.patience_end_tick - now,
+                    tuple(sorted(order_item.item_id for order_item in customer.order.items)),
+                ))
+        index = len(self.arrivals) - len(current_level.customer_specification)
+        if 0 <= index < len(self.arrivals):
+            arrival = (index, self.arrivals[index][0] - now)
+        else:
+            arrival = None
+        return (_code_of(current_level.held_item), tuple(slots), tuple(customers), arrival)
+
+    def get_transition(self, index, input_id, current_id):
+        '''Return the `Transition` for adding one item id to another in a slot.
+
+        This is the entry in the device's own `transitions` table, which
+        `Device.add_item` uses too.
+
+        '''
+        try:
+            return self.tables[index][input_id][current_id]
+        except IndexError:
+            # Item classes created after the device class have no table entry.
+            item_classes = item.Item.item_classes
+            return type(self.targets[index]).compile_transition(item_classes[input_id], item_classes[current_id])
+
+    def add_item(self, index, input_code, slot, now):
+        '''Return the output code and new slot for adding an item to a slot.
+
+        This mirrors `Device.add_item`, at `now` ticks from the state.
+
+        '''
+        code, end, due = slot
+        input_id = input_code & 0xff
+        holds_id = code >> 8
+        modifying_holds = input_id and ((code & 0xff) == _PLATE_ID) and holds_id
+        target = holds_id if modifying_holds else code
+        transition = self.get_transition(index, input_id, target & 0xff)
+
+        timer = transition.timer
+        if timer == device.TIMER_START:
+            end = now + self.durations[index]
+            due = _schedule(end, now, self.ruins[index])
+        elif timer == device.TIMER_STOP:
+            end = due = None
+
+        if transition.plate_holds and not (target >> 8):
+            target |= input_id << 8
+
+        output_source = transition.output_source
+        if output_source == device.SOURCE_NONE:
+            output = 0
+        elif output_source == device.SOURCE_INPUT:
+            output = input_code
+        elif output_source == device.SOURCE_CURRENT:
+            output = target
+        else:
+            output = transition.output_class.item_id
+
+        new_source = transition.new_source
+        if new_source == device.SOURCE_NONE:
+            new = 0
+        elif new_source == device.SOURCE_INPUT:
+            new = input_code
+        elif new_source == device.SOURCE_CURRENT:
+            new = target
+        else:
+            new = transition.new_class.item_id
+        if modifying_holds:
+            new = _PLATE_ID | ((new & 0xff) << 8)
+        return output, (new, end, due)
+
+    def _fire(self, index, slot, now):
+        # Mirrors `Device.tick`.
+        end = slot[1]
+        if end == now:
+            slot = self.add_item(index, _TIME_ID, slot, now)[1]
+            end = slot[1]
+        ruined_ticks = self.ruins[index]
+        if (end is not None) and (end - now <= -ruined_ticks < 0):
+            slot = self.add_item(index, _TIME_ID, slot, now)[1]
+            end = None
+        return (slot[0], end, _schedule(end, now, ruined_ticks))
+
+    def advance(self, slots, customers, arrival, ticks):
+        '''Return the state after the given ticks without any interaction, and the cost of the ticks.
+
+        Returns the `(slots, customers, arrival, cost, change)` of the new
+        state, with the cost as for `expand` and the change in the score from
+        the ticks and any lost customers.
+
+        '''
+        return (self.advance_slots(slots, ticks),) + self.advance_customers(customers, arrival, ticks)
+
+    def advance_slots(self, slots, ticks):
+        '''Return the slots after the given ticks.
+
+        '''
+        # Fire the timers which fall due, in the order the level would.
+        while True:
+            dues = [(slot[2], index) for index, slot in enumerate(slots) if (slot[2] is not None) and (slot[2] <= ticks)]
+            if not dues:
+                break
+            due, first = min(dues)
+            slots = slots[:first] + (self._fire(first, slots[first], due),) + slots[first + 1:]
+        # Only slots with a timer change as time passes.
+        return tuple([
+            slot if slot[1] is None else (slot[0], slot[1] - ticks, None if slot[2] is None else slot[2] - ticks)
+            for slot in slots
+        ])
+
+    def advance_customers(self, customers, arrival, ticks):
+        '''Return the `(customers, arrival, cost, change)` after the given ticks, as for `advance`.
+
+        '''
+        key = (customers, arrival, ticks)
+        result = self._advanced_customers.get(key)
+        if result is not None:
+            return result
+        running = bool(customers) or (arrival is not None)
+        # Customers leave at the first tick at which they have no patience left.
+        leaving = [max(1, math.ceil(patience)) for _, patience, _ in customers]
+        starts = [0] * len(customers)
+        if arrival is not None:
+            # One customer may arrive each tick, once they are due and there is space for them.
+            customers = list(customers)
+            arrivals = self.arrivals
+            index, arrival_tick = arrival
+            offset = arrival_tick - arrivals[index][0]
+            previous = 0
+            while index < len(arrivals):
+                tick, patience, order = arrivals[index]
+                tick = max(tick + offset, previous + 1)
+                while True:
+                    present = [leave for leave in leaving if leave > tick]
+                    if len(present) < self.customer_spaces:
+                        break
+                    tick = min(present)
+                if tick > ticks:
+                    break
+                customers.append((self.first_number + index, tick + patience, order))
+                leaving.append(max(tick + 1, math.ceil(tick + patience)))
+                starts.append(tick)
+                previous = tick
+                index += 1
+            arrival = (index, arrivals[index][0] + offset - ticks) if index < len(arrivals) else None
+
+        cost = 0
+        remaining = []
+        for (number, patience, order), start, leave in zip(customers, starts, leaving):
+            if leave <= ticks:
+                cost += leave - start + self.lost_penalty
+            else:
+                cost += ticks - start
+                remaining.append((number, patience - ticks, order))
+        lost = len(customers) - len(remaining)
+        change = (ticks * self.tick_value if running else 0) + lost * self.lost_value
+        result = self._advanced_customers[key] = (tuple(remaining), arrival, cost, change)
+        return result
+
+    def get_percentage(self, patience, start_patience):
+        '''Return the whole percentage of their patience that a customer has left.
+
+        '''
+        return min(100, max(0, int(patience / start_patience * 100)))
+
+    def get_score(self, score, change, served_value=0.0):
+        '''Return the score after an action, from the score before it.
+
+        The change is that from `advance`, and the served value is that of
+        any customer served by the action at its start. The level stops the
+        score going below zero at every tick, so serving a customer with a
+        low score can save less than their value.
+
+        '''
+        if score is None:
+            return None
+        next_score = score + served_value + change
+        if served_value < 0 < change:
+            next_score = max(next_score, change - self.tick_value)
+        return next_score
+
+    def expand(self, state, score=None):
+        '''Yield `(step, cost, next score, next state)` for each useful action in the state.
+
+        A step is `(kind, target, ticks)`, where the target is an index into
+        `targets` or the number of a customer. The cost is the total of the
+        ticks waited by each customer at the counter, plus `lost_penalty` for
+        each customer who runs out of patience. The next score is `None` if
+        the score is.
+
+        '''
+        held, slots, customers, arrival = state
+        action_ticks = self.action_ticks
+
+        # Interacting with a device leaves the customers to wait as they would
+        # anyway, and any other action leaves the slots to run as they would.
+        next_customers, next_arrival, cost, change = self.advance_customers(customers, arrival, action_ticks)
+        next_score = self.get_score(score, change)
+        idle_slots = self.advance_slots(slots, action_ticks)
+
+        # Interact with a device with recipes.
+        interactions = self._interactions
+        for index, slot in enumerate(slots):
+            key = (index, held, slot)
+            interaction = interactions.get(key)
+            if interaction is None:
+                interaction = interactions[key] = self.add_item(index, held, slot, 0)
+            output, new_slot = interaction
+            if (output == held) and (new_slot == slot):
+                continue
+            next_slots = self.advance_slots(slots[:index] + (new_slot,) + slots[index + 1:], action_ticks)
+            yield ((ACTION_DEVICE, index, action_ticks), cost, next_score, (output, next_slots, next_customers, next_arrival))
+
+        # Interact with an automatic device.
+        if held == 0:
+            for index, product_id in self.products:
+                yield ((ACTION_DEVICE, index, action_ticks), cost, next_score,
+                    (product_id, idle_slots, next_customers, next_arrival))
+        elif self.bin is not None:
+            yield ((ACTION_DEVICE, self.bin, action_ticks), cost, next_score, (0, idle_slots, next_customers, next_arrival))
+
+        # Serve a customer.
+        if held != 0:
+            held_id = held & 0xff
+            holds_id = held >> 8
+            for position, (number, patience, order) in enumerate(customers):
+                served_id = holds_id if holds_id in order else held_id
+                if served_id not in order:
+                    continue
+                served = order.index(served_id)
+                order = order[:served] + order[served + 1:]
+                if held_id == _PLATE_ID:
+                    start_patience = self.start_patience[number]
+                    patience = min(start_patience, patience + PLATE_EFFICIENCY * start_patience)
+                if order:
+                    served_customers = customers[:position] + ((number, patience, order),) + customers[position + 1:]
+                    percentage = None
+                else:
+                    served_customers = customers[:position] + customers[position + 1:]
+                    percentage = self.get_percentage(patience, self.start_patience[number])
+                served_customers, served_arrival, served_cost, served_change = self.advance_customers(
+                    served_customers, arrival, action_ticks)
+                served_value = 0.0 if percentage is None else self.serve_values[percentage]
+                yield ((ACTION_SERVE, number, action_ticks), served_cost, self.get_score(score, served_change, served_value),
+                    (0, idle_slots, served_customers, served_arrival))
+
+        # Wait for the next timer or customer, in whole actions.
+        dues = [slot[2] for slot in slots if slot[2] is not None]
+        if arrival is not None:
+            dues.append(max(1, arrival[1]))
+        if dues:
+            ticks = int(math.ceil(min(dues) / action_ticks)) * action_ticks
+            next_slots, next_customers, next_arrival, cost, change = self.advance(slots, customers, arrival, ticks)
+            yield ((ACTION_WAIT, None, ticks), cost, self.get_score(score, change),
+                (held, next_slots, next_customers, next_arrival))
+
+    ## Estimates
+    ## ---------
+
+    # The estimate relaxes the level into a graph whose nodes are an item in
+    # the hand, `(None, item id)`, or in a slot, `(slot index, item id)`. Any
+    # other ingredient an edge needs is made from scratch alongside, and costs
+    # are `(actions, wait)` pairs, since timers run while the player does
+    # other things.
+
+    def _get_edges(self, index, input_id, current_id):
+        '''Return the `(node, actions, wait)` edges for adding an item to a slot.
+
+        '''
+        transition = self.get_transition(index, input_id, current_id)
+        timer = transition.timer
+        output_id = _id_of(transition.output_class)
+        new_id = _id_of(transition.new_class)
+        if input_id == _TIME_ID:
+            if (timer != device.TIMER_START) or (new_id == current_id) or (self.durations[index] <= 0):
+                return ()
+            return (((index, new_id), 0, self.durations[index]),)
+        edges = []
+        if transition.plate_holds:
+            # The item on a plate counts as the item itself.
+            edges.append(((index, input_id), 1, 0))
+        elif new_id not in (0, current_id):
+            edges.append(((index, new_id), 1, 0))
+        if output_id not in (0, input_id):
+            edges.append(((None, output_id), 1, 0))
+        return edges
+
+    def _prepare_estimates(self):
+        '''Work out the cost of making each item from scratch.
+
+        '''
+        action_ticks = self.action_ticks
+        item_count = len(item.Item.item_classes)
+        hand = [None] * item_count
+        hand[0] = hand[_TIME_ID] = (0, 0)
+        for _, product_id in self.products:
+            hand[product_id] = (1, 0)
+        slots = [[(0, 0)] + [None] * (item_count - 1) for _ in range(self.slot_count)]
+        changed = True
+        while changed:
+            changed = False
+            for index, contents in enumerate(slots):
+                for current_id, current_cost in enumerate(contents):
+                    if current_cost is None:
+                        continue
+                    for input_id, input_cost in enumerate(hand):
+                        if input_cost is None:
+                            continue
+                        for (node_index, item_id), actions, wait in self._get_edges(index, input_id, current_id):
+                            cost = (current_cost[0] + input_cost[0] + actions, max(current_cost[1], input_cost[1]) + wait)
+                            costs = hand if node_index is None else contents
+                            old_cost = costs[item_id]
+                            if (old_cost is None) or (cost[0] * action_ticks + cost[1] < old_cost[0] * action_ticks + old_cost[1]):
+                                costs[item_id] = cost
+                                changed = True
+        hand[_TIME_ID] = None
+
+        #: The cost of making each item from scratch, in the hand and in each slot.
+        self.scratch_hand = hand
+        self.scratch_slots = slots
+        self._distances = {}
+        #: The options found by `get_options`, by their arguments.
+        self._group_options = {}
+        #: The results of `get_waiting`, by their arguments, and of `estimate`
+        #: by what they depend on, which is only kept during a search.
+        self._waiting = {}
+        self._estimates = {}
+        self._scratch = self.get_distances((None, 0))
+        self._scratch_totals = [
+            math.inf if cost is None else cost[0] * action_ticks + cost[1]
+            for cost in self._scratch
+        ]
+        #: The ticks needed to serve any customer in `arrivals` from scratch,
+        #: and the least cost of serving the customers from each index onwards.
+        self._horizon = 0
+        self._arrival_floors = [0]
+        for _, _, order in reversed(self.arrivals):
+            actions = len(order)
+            wait = 0
+            for item_id in order:
+                cost = self.get_distances((None, 0))[item_id]
+                if cost is not None:
+                    actions += cost[0]
+                    wait = max(wait, cost[1])
+            self._horizon = max(self._horizon, actions * action_ticks + wait)
+            self._arrival_floors.append(self._arrival_floors[-1] + len(order) * action_ticks)
+        self._arrival_floors.reverse()
+
+    def get_distances(self, node):
+        '''Return the `(actions, wait)` cost of getting each item into the hand from the node.
+
+        Items which cannot be reached have a cost of `None`.
+
+        '''
+        distances = self._distances.get(node)
+        if distances is not None:
+            return distances
+        action_ticks = self.action_ticks
+        costs = {node: (0, 0)}
+        pending = [(0, 0, 0, node)]
+        while pending:
+            total, actions, wait, (index, item_id) = heapq.heappop(pending)
+            if (actions, wait) != costs[index, item_id]:
+                continue
+            edges = []
+            if index is None:
+                # Swap an empty hand for a product, or add the held item to a slot.
+                if item_id == 0:
+                    edges.extend(((None, product_id), 1, 0, (0, 0)) for _, product_id in self.products)
+                else:
+                    for slot_index, contents in enumerate(self.scratch_slots):
+                        for current_id, current_cost in enumerate(contents):
+                            if current_cost is not None:
+                                edges.extend(edge + (current_cost,) for edge in self._get_edges(slot_index, item_id, current_id))
+            else:
+                # Add time or another ingredient to the item in the slot.
+                edges.extend(edge + ((0, 0),) for edge in self._get_edges(index, _TIME_ID, item_id))
+                for input_id, input_cost in enumerate(self.scratch_hand):
+                    if input_cost is not None:
+                        edges.extend(edge + (input_cost,) for edge in self._get_edges(index, input_id, item_id))
+            for next_node, edge_actions, edge_wait, (other_actions, other_wait) in edges:
+                next_cost = (actions + edge_actions + other_actions, max(wait, other_wait) + edge_wait)
+                next_total = next_cost[0] * action_ticks + next_cost[1]
+                old_cost = costs.get(next_node)
+                if (old_cost is None) or (next_total < old_cost[0] * action_ticks + old_cost[1]):
+                    costs[next_node] = next_cost
+                    heapq.heappush(pending, (next_total, next_cost[0], next_cost[1], next_node))
+        distances = [None] * len(item.Item.item_classes)
+        for (index, item_id), cost in costs.items():
+            if index is None:
+                distances[item_id] = cost
+        distances = self._distances[node] = tuple(distances)
+        return distances
+
+    def get_options(self, source, code, progress, item_ids):
+        '''Return the ways in which a group of items could save work on the given items.
+
+        The group is the held item if the source is -1, and otherwise the
+        contents of the slot with that index, where `progress` ticks of any
+        timer have run. Each option is `(total, item id, source, actions,
+        wait)`, for the items which the group makes in fewer ticks than
+        making them from scratch would take.
+
+        '''
+        action_ticks = self.action_ticks
+        scratch_totals = self._scratch_totals
+        index = None if source < 0 else source
+        options = []
+        for item_id in (code & 0xff, code >> 8) if code >> 8 else (code,):
+            distances = self.get_distances((index, item_id))
+            for wanted_id in item_ids:
+                cost = distances[wanted_id]
+                if cost is not None:
+                    actions, wait = cost
+                    wait = wait - progress if wait > progress else 0
+                    total = actions * action_ticks + wait
+                    if total < scratch_totals[wanted_id]:
+                        options.append((total, wanted_id, source, actions, wait))
+        return tuple(options)
+
+    def get_waiting(self, customers, arrival):
+        '''Return the customers which the estimate counts as waiting to be served.
+
+        Returns `(waiting, floor, wanted, wanted items)`, where each waiting
+        customer is `(patience, order, start)` and the floor is the least cost
+        of the customers arriving too late to be counted. The wanted items
+        are counted in `wanted`, and are also given as a tuple.
+
+        '''
+        result = self._waiting.get((customers, arrival))
+        if result is not None:
+            return result
+        waiting = [(patience, order, 0) for _, patience, order in customers]
+        total = 0
+        if arrival is not None:
+            # Customers arriving after anything could be made from scratch
+            # only wait to be served.
+            index, arrival_tick = arrival
+            offset = arrival_tick - self.arrivals[index][0]
+            horizon = self._horizon - offset
+            for tick, patience, order in self.arrivals[index:]:
+                if tick >= horizon:
+                    break
+                waiting.append((patience, order, max(0, tick + offset)))
+                index += 1
+            total = self._arrival_floors[index]
+        wanted = {}
+        for _, order, _ in waiting:
+            for item_id in order:
+                wanted[item_id] = wanted.get(item_id, 0) + 1
+        result = self._waiting[customers, arrival] = (waiting, total, wanted, tuple(wanted))
+        return result
+
+    def estimate(self, state):
+        '''Return an estimate of the cost of serving every customer.
+
+        Each item already in the level may go towards one ordered item, and
+        everything else is made from scratch.
+
+        '''
+        held, slots, customers, arrival = state
+        action_ticks = self.action_ticks
+        waiting, total, wanted, wanted_items = self.get_waiting(customers, arrival)
+        if not waiting:
+            return total
+
+        # Group the items in the level with anything they hold, since they
+        # move together. Only the contents of each group and the progress of
+        # any timer on it matter, so states differing in nothing else share
+        # their estimate.
+        groups = [(-1, held, 0, wanted_items)] if held else []
+        for index, (code, end, _) in enumerate(slots):
+            if code:
+                # Credit the time already spent on a running timer.
+                groups.append((index, code, self.durations[index] - end if (end is not None) and (end > 0) else 0, wanted_items))
+        key = (tuple(groups), customers, arrival)
+        estimate = self._estimates.get(key)
+        if estimate is not None:
+            return estimate
+
+        # Find where each group could save work.
+        scratch = self._scratch
+        options = []
+        group_options = self._group_options
+        for group in groups:
+            found_options = group_options.get(group)
+            if found_options is None:
+                found_options = group_options[group] = self.get_options(*group)
+            options += found_options
+
+        # Hand each group to the first customer wanting the item it saves most on.
+        found = {}
+        if options:
+            options.sort()
+            used = set()
+            for _, item_id, source, actions, wait in options:
+                if source not in used:
+                    costs = found.setdefault(item_id, [])
+                    if len(costs) < wanted[item_id]:
+                        costs.append((actions, wait))
+                        used.add(source)
+            for costs in found.values():
+                costs.reverse()
+
+        # Each customer waits at least for their own items, whose timers run
+        # alongside each other, less any work done before they arrive, or is
+        # lost if that is longer than they have.
+        for patience, order, start in waiting:
+            actions = len(order)
+            wait = 0
+            for item_id in order:
+                costs = found.get(item_id)
+                cost = costs.pop() if costs else scratch[item_id]
+                if cost is None:
+                    actions = math.inf
+                    break
+                actions += cost[0]
+                if cost[1] > wait:
+                    wait = cost[1]
+            ticks = actions * action_ticks + wait - start
+            if ticks < len(order) * action_ticks:
+                ticks = len(order) * action_ticks
+            total += ticks if ticks < patience else patience + self.lost_penalty
+        self._estimates[key] = total
+        return total
+
+    ## Search
+    ## ------
+
+    def search(self, state, score=None, max_expansions=20000, weight=3.0):
+        '''Return the best plan found from the state, and the number of states expanded.
+
+        The plan is a list of `(step, state)` pairs, giving each step and the
+        state it is taken in. It serves every customer still to come if that
+        was found within `max_expansions` expanded states, and otherwise leads
+        to the unexpanded state with the least estimated total cost, as far
+        into the level as possible. Given the current
+        score, plans in which the score would reach `fail_score` are left out.
+
+        '''
+        self._estimates = {}
+        estimate = self.estimate(state)
+        nodes = [(state, None, None, score, 0)]
+        best_costs = {state: 0}
+        pending = [(weight * estimate, estimate, 0, 0)]
+        best = (math.inf, 0, 0)
+        expansions = 0
+        while pending and (expansions < max_expansions):
+            _, estimate, cost, node_index = heapq.heappop(pending)
+            state, _, _, score, elapsed = nodes[node_index]
+            if best_costs[state] < cost:
+                continue
+            if (not state[2]) and (state[3] is None):
+                best = (cost, 0, node_index)
+                break
+            expansions += 1
+            for step, step_cost, next_score, next_state in self.expand(state, score):
+                next_cost = cost + step_cost
+                if ((next_score is not None) and (next_score >= self.fail_score)) \
+                        or (best_costs.get(next_state, math.inf) <= next_cost):
+                    continue
+                best_costs[next_state] = next_cost
+                next_estimate = self.estimate(next_state)
+                next_elapsed = elapsed + step[2]
+                nodes.append((next_state, node_index, step, next_score, next_elapsed))
+                heapq.heappush(pending, (next_cost + weight * next_estimate, next_estimate, next_cost, len(nodes) - 1))
+        else:
+            # Head for the unexpanded state with the best estimated total cost.
+            for _, estimate, cost, node_index in pending:
+                state, _, _, _, elapsed = nodes[node_index]
+                if (best_costs[state] == cost) and ((cost + estimate, -elapsed) < best[:2]):
+                    best = (cost + estimate, -elapsed, node_index)
+
+        plan = []
+        node_index = best[2]
+        while nodes[node_index][1] is not None:
+            _, parent_index, step, _, _ = nodes[node_index]
+            plan.append((step, nodes[parent_index][0]))
+            node_index = parent_index
+        plan.reverse()
+        return plan, expansions
+
+
+class SolverPolicy(object):
+    '''Policy which follows plans found by searching a model of the level.
+
+    '''
+
+    #: The time (in seconds) taken by each interaction, which should match the
+    #: time between the calls to the policy.
+    action_time = 0.5
+
+    #: The time (in seconds) that losing a customer is worth to the search.
+    lost_time = 60.0
+
+    #: The number of states each search may expand.
+    max_expansions = 20000
+
+    #: The weight given to the estimate of the work left (1.0 searches for the best plan).
+    weight = 3.0
+
+    def __init__(self):
+        self.model = None
+        self._model_level = None
+        self.plan = []
+        self._plan_tick = None
+        #: The number of searches made and states expanded by them.
+        self.searches = 0
+        self.expansions = 0
+
+    def get_model(self, current_level):
+        '''Return the model of the level, creating it for a new level.
+
+        '''
+        if self._model_level is not current_level:
+            self.model = LevelModel(current_level, max(1, current_level.get_ticks(self.action_time)),
+                current_level.get_ticks(self.lost_time))
+            self._model_level = current_level
+            self.plan = []
+        return self.model
+
+    def __call__(self, current_level):
+        model = self.get_model(current_level)
+        state = model.observe(current_level)
+        now = current_level.tick_running
+
+        # Keep following the plan while the level matches the model.
+        if self.plan:
+            (kind, target, ticks), planned_state = self.plan[0]
+            elapsed = now - self._plan_tick
+            if (kind == ACTION_WAIT) and (0 < elapsed < ticks) and (state[0] == planned_state[0]) \
+                    and (model.advance(planned_state[1], planned_state[2], planned_state[3], elapsed)[:3] == state[1:]):
+                return
+            elif (elapsed == ticks) and (len(self.plan) > 1) and (self.plan[1][1] == state):
+                del self.plan[0]
+                self._plan_tick = now
+            else:
+                self.plan = []
+        if not self.plan:
+            self.plan, expansions = model.search(state, current_level.score, self.max_expansions, self.weight)
+            self.searches += 1
+            self.expansions += expansions
+            if not self.plan:
+                # Every plan seems to fail, so look for the best of them instead.
+                self.plan, expansions = model.search(state, None, self.max_expansions, self.weight)
+                self.searches += 1
+                self.expansions += expansions
+            self._plan_tick = now
+            if not self.plan:
+                return
+
+        (kind, target, ticks), _ = self.plan[0]
+        if kind == ACTION_DEVICE:
+            current_level.interact(model.targets[target])
+        elif kind == ACTION_SERVE:
+            current_level.interact(current_level.get_entity(model.entity_ids[target]))
+
+
+class Solution(object):
+    '''The outcome of playing a level with the solver.
+
+    '''
+
+    def __init__(self, new_level, recording, result, patience_used, policy):
+        self.level = new_level
+        #: The recording which replays the run.
+        self.recording = recording
+        #: The result columns of the run, as in `applib.tools.sweep.RESULT_COLUMNS`.
+        self.won, self.score, self.sold_cakes, self.ticks = result
+        #: The fraction of their patience used by each customer who left.
+        self.patience_used = patience_used
+        self.searches = policy.searches
+        self.expansions = policy.expansions
+
+    @property
+    def difficulty(self):
+        '''How hard the level was for the solver, from 0.0 to 1.0.
+
+        This is the mean fraction of their patience used by the customers,
+        where a lost customer uses all of it, and is 1.0 if the run failed.
+
+        '''
+        if (self.won == 0) or not self.patience_used:
+            return 1.0
+        return statistics.mean(self.patience_used)
+
+
+def solve(new_level, max_time=600.0, solver=None):
+    '''Play a level to the end with a `SolverPolicy` and return the `Solution`.
+
+    '''
+    if solver is None:
+        solver = SolverPolicy()
+    recording = replay.Recording.start(new_level)
+    patience_used = []
+
+    def on_customer_leaves(customer):
+        if customer.order.is_complete:
+            patience_used.append(1.0 - max(0.0, min(1.0, customer.get_patience_ratio())))
+        else:
+            patience_used.append(1.0)
+
+    new_level.push_handlers(on_customer_leaves=on_customer_leaves)
+    result = sweep.play_level(new_level, solver, max(1, new_level.get_ticks(solver.action_time)), new_level.get_ticks(max_time))
+    recording.stop(new_level)
+    return Solution(new_level, recording, result, patience_used, solver)
+
+
+def parse_arguments(arguments=None):
+    '''Parse the command line arguments for the solver tool.
+
+    '''
+
+    parser = argparse.ArgumentParser(prog='python -m applib.tools.solver',
+        description='Play a level with the solver and rate how hard it is.')
+
+    parser.add_argument('level',
+        help='name of the level class, or its dotted path')
+
+    parser.add_argument('-n', '--runs',
+        action='store', dest='runs', default=8, type=int,
+        help='number of runs, with consecutive seeds')
+
+    parser.add_argument('--seed',
+        action='store', dest='seed', default=0, type=int,
+        help='seed of the first run')
+
+    parser.add_argument('--max-time',
+        action='store', dest='max_time', default=600.0, type=float,
+        metavar='SECONDS', help='time after which a run is cut short')
+
+    parser.add_argument('--tick-rate',
+        action='store', dest='tick_rate', default=None, type=float,
+        metavar='HZ', help='ticks per second of the simulation (default: the game rate)')
+
+    parser.add_argument('-o', '--output',
+        action='store', dest='output', default=None,
+        metavar='DIRECTORY', help='directory in which to save a recording of each run')
+
+    return parser.parse_args(arguments)
+
+def main(arguments=None):
+    '''Run the solver from the command line.
+
+    '''
+    if not HEADLESS:
+        sys.exit('the solver tool must be run with APPLIB_HEADLESS=1 set')
+    arguments = parse_arguments(arguments)
+    level_class = sweep.get_level_class(arguments.level)
+    if arguments.output is not None:
+        os.makedirs(arguments.output, exist_ok=True)
+    difficulties = []
+    for seed in range(arguments.seed, arguments.seed + arguments.runs):
+        solution = solve(level_class(seed=seed, tick_rate=arguments.tick_rate), arguments.max_time)
+        difficulties.append(solution.difficulty)
+        if arguments.output is not None:
+            solution.recording.save(os.path.join(arguments.output, f'{level_class.__name__}-{seed}.rec'))
+        print(json.dumps({
+            'seed': seed,
+            'won': solution.won,
+            'score': round(solution.score, 4),
+            'sold_cakes': solution.sold_cakes,
+            'ticks': solution.ticks,
+            'difficulty': round(solution.difficulty, 4),
+            'expansions': solution.expansions,
+        }))
+    print(json.dumps({'level': arguments.level, 'difficulty': round(statistics.mean(difficulties), 4)}))
+
+
+if __name__ == '__main__':
+    main()
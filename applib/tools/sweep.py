@@ -0,0 +1,344 @@
+'''applib.tools.sweep -- parallel level balancing sweeps
+
+Plays a level many times for every point of a grid of parameter values, using
+a policy from `applib.tools.policy`, and streams the outcomes to a result file.
+The runs are spread over all cores with a process pool, and each run uses
+`Level.advance_to` to skip the ticks where the policy is waiting to react.
+Levels may be played at a lower tick rate than the game's to make runs
+cheaper, at the cost of rounding every duration to the longer ticks.
+
+Parameter names are either attributes of the level class, such as
+`alt_suspicion_rate` or `customer_time_min`, `patience.<customer name>` for
+the entries of `Level.customer_patience`, or `<device name>.duration` and
+`<device name>.ruined_time` for every device with that name.
+
+The result file holds one JSON object per line. Each line covers a chunk of
+runs at one parameter point, played with consecutive seeds from `seed`, and
+stores the outcomes as columns, with `won` being 1 for a success, 0 for a
+failure and `null` if the run was cut short.
+
+This tool must be run headless, for example:
+
+    APPLIB_HEADLESS=1 python -m applib.tools.sweep LevelThree \\
+        -p alt_suspicion_rate=0.03,0.04,0.05 -p station_cooking.duration=4,5 \\
+        -n 1000 -o sweep.jsonl
+
+'''
+
+import argparse
+import concurrent.futures
+import importlib
+import itertools
+import json
+import statistics
+import sys
+
+import applib
+
+from applib.constants import HEADLESS
+from applib.model import level
+from applib.tools import policy
+
+
+#: The entity attributes which may be swept for each device.
+DEVICE_PARAMETERS = ('duration', 'ruined_time')
+
+#: The columns stored for each run.
+RESULT_COLUMNS = ('won', 'score', 'sold_cakes', 'ticks')
+
+
+def get_level_class(name):
+    '''Return the level class with the given name or dotted path.
+
+    '''
+    if '.' not in name:
+        name = f'applib.model.level.{name}'
+    module_name, class_name = name.rsplit('.', 1)
+    level_class = getattr(importlib.import_module(module_name), class_name, None)
+    if not (isinstance(level_class, type) and issubclass(level_class, level.Level)):
+        raise ValueError(f'level not found: {name!r}')
+    return level_class
+
+def parse_value(text):
+    '''Parse a single parameter value from the command line.
+
+    '''
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def make_grid(parameters):
+    '''Return every combination of the given parameter values.
+
+    The parameters are a mapping from each name to a sequence of values.
+
+    '''
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*parameters.values())]
+
+
+class LevelFactory(object):
+    '''Creates levels with the given parameters applied.
+
+    '''
+
+    def __init__(self, level_class, parameters, tick_rate=None):
+        self.level_class = level_class
+        self.parameters = dict(parameters)
+        self.tick_rate = tick_rate
+        self.level_attributes = {}
+        self.patience = {}
+        self.device_attributes = {}
+        for name, value in self.parameters.items():
+            if '.' not in name:
+                if not hasattr(level_class, name):
+                    raise ValueError(f'unknown level parameter: {name!r}')
+                self.level_attributes[name] = value
+            else:
+                owner, attribute = name.split('.', 1)
+                if owner == 'patience':
+                    if attribute not in level_class.customer_patience:
+                        raise ValueError(f'unknown customer: {attribute!r}')
+                    self.patience[attribute] = value
+                elif attribute in DEVICE_PARAMETERS:
+                    self.device_attributes.setdefault(owner, {})[attribute] = value
+                else:
+                    raise ValueError(f'unknown device parameter: {name!r}')
+        if self.level_attributes:
+            self.level_class = type(level_class.__name__, (level_class,), self.level_attributes)
+
+    def __call__(self, seed=None):
+        '''Create a new level.
+
+        '''
+        new_level = self.level_class(seed=seed, tick_rate=self.tick_rate)
+        if self.patience:
+            new_level.customer_patience = dict(new_level.customer_patience, **self.patience)
+        for name, attributes in self.device_attributes.items():
+            devices = new_level.get_devices(name)
+            if len(devices) == 0:
+                raise ValueError(f'device not found: {name!r}')
+            for level_device in devices:
+                for attribute, value in attributes.items():
+                    setattr(level_device, attribute, value)
+                level_device.retime()
+        return new_level
+
+
+def play_level(new_level, level_policy, reaction_ticks, max_ticks):
+    '''Play a level with a policy and return the run's result columns.
+
+    The policy is consulted every `reaction_ticks` ticks, and the run stops as
+    soon as the level ends or after `max_ticks` ticks.
+
+    '''
+    outcome = []
+    new_level.push_handlers(
+        on_level_success=lambda: outcome.append(1),
+        on_level_fail=lambda: outcome.append(0),
+    )
+    while (len(outcome) == 0) and (new_level.tick_running < max_ticks):
+        level_policy(new_level)
+        target_tick = min(new_level.tick_running + reaction_ticks, max_ticks)
+        # Step from event to event so that nothing runs past the end of the level.
+        while (len(outcome) == 0) and (new_level.tick_running < target_tick):
+            next_event_tick = new_level.get_next_event_tick()
+            if next_event_tick is None:
+                next_event_tick = target_tick
+            new_level.advance_to(min(next_event_tick, target_tick))
+    return (
+        outcome[0] if outcome else None,
+        round(new_level.score, 4),
+        new_level.sold_cakes,
+        new_level.tick_running,
+    )
+
+def run_chunk(level_name, parameters, policy_name, seed, runs, reaction_time, max_time, tick_rate=None):
+    '''Play a chunk of runs at one parameter point and return the result record.
+
+    The runs use the consecutive seeds starting from `seed`.
+
+    '''
+    factory = LevelFactory(get_level_class(level_name), parameters, tick_rate)
+    if tick_rate is None:
+        tick_rate = factory.level_class.tick_rate
+    reaction_ticks = max(1, int(round(reaction_time * tick_rate)))
+    max_ticks = level.seconds_to_ticks(max_time, tick_rate)
+    columns = {name: [] for name in RESULT_COLUMNS}
+    for run_seed in range(seed, seed + runs):
+        results = play_level(factory(run_seed), policy.get_policy(policy_name), reaction_ticks, max_ticks)
+        for name, value in zip(RESULT_COLUMNS, results):
+            columns[name].append(value)
+    record = {
+        'level': level_name,
+        'parameters': parameters,
+        'policy': policy_name,
+        'seed': seed,
+        'tick_rate': tick_rate,
+    }
+    record.update(columns)
+    return record
+
+def run_sweep(level_name, grid, runs, policy_name='greedy', seed=0,
+        reaction_time=0.5, max_time=600.0, workers=None, chunk_size=50, tick_rate=None):
+    '''Run a sweep over the given grid, yielding result records as they finish.
+
+    Every parameter point is played with the same `runs` seeds, so that points
+    can be compared without the noise of different customers.
+
+    '''
+    if runs < 1:
+        raise ValueError(f'the number of runs must be at least 1, not {runs}')
+    # Fail early on bad names rather than in every worker.
+    for parameters in grid:
+        LevelFactory(get_level_class(level_name), parameters)
+    policy.get_policy(policy_name)
+
+    tasks = []
+    for parameters in grid:
+        for start in range(0, runs, chunk_size):
+            tasks.append((level_name, parameters, policy_name, seed + start,
+                min(chunk_size, runs - start), reaction_time, max_time, tick_rate))
+
+    if workers == 1:
+        for task in tasks:
+            yield run_chunk(*task)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_chunk, *task) for task in tasks]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+def load_results(path):
+    '''Load the result records from a result file.
+
+    '''
+    with open(path) as result_file:
+        return [json.loads(line) for line in result_file if line.strip()]
+
+def summarise(records):
+    '''Merge result records by parameter point and summarise each point.
+
+    '''
+    points = {}
+    for record in records:
+        key = json.dumps([record['level'], record['policy'], record['parameters']], sort_keys=True)
+        point = points.setdefault(key, {
+            'level': record['level'],
+            'policy': record['policy'],
+            'parameters': record['parameters'],
+            'columns': {name: [] for name in RESULT_COLUMNS},
+        })
+        for name in RESULT_COLUMNS:
+            point['columns'][name].extend(record[name])
+    summaries = []
+    for point in points.values():
+        columns = point.pop('columns')
+        runs = len(columns['won'])
+        point.update({
+            'runs': runs,
+            'win_rate': columns['won'].count(1) / runs,
+            'fail_rate': columns['won'].count(0) / runs,
+            'score_mean': statistics.mean(columns['score']),
+            'score_stdev': statistics.pstdev(columns['score']),
+            'sold_cakes_mean': statistics.mean(columns['sold_cakes']),
+            'sold_cakes_min': min(columns['sold_cakes']),
+            'sold_cakes_max': max(columns['sold_cakes']),
+        })
+        summaries.append(point)
+    return summaries
+
+
+def parse_arguments(arguments=None):
+    '''Parse the command line arguments for the sweep tool.
+
+    '''
+
+    parser = argparse.ArgumentParser(prog='python -m applib.tools.sweep',
+        description='Play a level many times over a grid of parameter values.')
+
+    parser.add_argument('level',
+        help='name of the level class, or its dotted path')
+
+    parser.add_argument('-p', '--parameter',
+        action='append', dest='parameters', default=[], metavar='NAME=VALUES',
+        help='comma separated values to sweep for a parameter')
+
+    parser.add_argument('-n', '--runs',
+        action='store', dest='runs', default=100, type=int,
+        help='number of runs for each parameter point')
+
+    parser.add_argument('--policy',
+        action='store', dest='policy', default='greedy',
+        help='policy name, or the dotted path of a policy class, with :ARGUMENT '
+            'for a policy taking one (such as scripted:FILE)')
+
+    parser.add_argument('--seed',
+        action='store', dest='seed', default=0, type=int,
+        help='seed of the first run at each point')
+
+    parser.add_argument('--reaction-time',
+        action='store', dest='reaction_time', default=0.5, type=float,
+        metavar='SECONDS', help='time between the actions of the policy')
+
+    parser.add_argument('--max-time',
+        action='store', dest='max_time', default=600.0, type=float,
+        metavar='SECONDS', help='time after which a run is cut short')
+
+    parser.add_argument('--tick-rate',
+        action='store', dest='tick_rate', default=None, type=float,
+        metavar='HZ', help='ticks per second of the simulation (default: the game rate)')
+
+    parser.add_argument('-j', '--workers',
+        action='store', dest='workers', default=None, type=int,
+        help='number of worker processes (default: one per core)')
+
+    parser.add_argument('-o', '--output',
+        action='store', dest='output', default='sweep.jsonl',
+        help='result file to write')
+
+    arguments = parser.parse_args(arguments)
+    if arguments.runs < 1:
+        parser.error('the number of runs must be at least 1')
+    grid_parameters = {}
+    for parameter in arguments.parameters:
+        name, _, values = parameter.partition('=')
+        if not values:
+            parser.error(f'no values given for parameter: {name!r}')
+        grid_parameters[name.strip()] = [parse_value(value.strip()) for value in values.split(',')]
+    arguments.grid = make_grid(grid_parameters)
+    return arguments
+
+def main(arguments=None):
+    '''Run a sweep from the command line.
+
+    '''
+    if not HEADLESS:
+        sys.exit('the sweep tool must be run with APPLIB_HEADLESS=1 set')
+    arguments = parse_arguments(arguments)
+    records = []
+    done = 0
+    total = len(arguments.grid) * arguments.runs
+    with open(arguments.output, 'w') as result_file:
+        for record in run_sweep(arguments.level, arguments.grid, arguments.runs,
+                policy_name=arguments.policy, seed=arguments.seed,
+                reaction_time=arguments.reaction_time, max_time=arguments.max_time,
+                workers=arguments.workers, tick_rate=arguments.tick_rate):
+            result_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            result_file.flush()
+            records.append(record)
+            done += len(record['won'])
+            print(f'{done}/{total} runs', file=sys.stderr)
+    for summary in summarise(records):
+        print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    # Use the importable module so that the workers can find `run_chunk`.
+    from applib.tools import sweep
+    sweep.main()
@@ -18,5 +18,8 @@ setup(
             'pyinstaller',
             'pytest',
         ],
+        'simulation': [
+            'numpy',
+        ],
     },
 )